@@ -1,4 +1,3 @@
-import sys
 import os
 import re
 import io
@@ -13,8 +12,7 @@ from prefect.cache_policies import NONE
 from prefect.artifacts import create_table_artifact
 from prefect.client.schemas.schedules import CronSchedule
 
-# Imports das conexões compartilhadas
-sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+# Imports das conexões compartilhadas (raiz do projeto no PYTHONPATH)
 from shared.connections.s3 import connect_s3, read_csv_from_s3, get_file_metadata
 from shared.connections.snowflake import connect_snowflake, close_snowflake_connection
 from shared.alerts import send_flow_success_alert, send_flow_error_alert
@@ -565,7 +563,7 @@ def besistemas_to_snowflake(
             database=snowflake_database,
             schema=snowflake_schema,
             role=snowflake_role,
-            insecure_mode=True
+            ocsp_fail_open=True
         )
 
         # Manifesto
@@ -12,20 +12,16 @@ from prefect.artifacts import create_table_artifact
 from prefect.blocks.system import Secret
 from prefect.client.schemas.schedules import CronSchedule
 
-# Imports dos módulos de conexão
-import sys
-
-sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
-
-from shared.connections.deconve import (  # noqa: E402
+# Imports dos módulos compartilhados (raiz do projeto no PYTHONPATH)
+from shared.connections.deconve import (
     authenticate_deconve, get_units, get_unit_details, get_video_details
 )
-from shared.connections.snowflake import (  # noqa: E402
+from shared.connections.snowflake import (
     connect_snowflake, create_table_if_not_exists,
     merge_csv_to_snowflake, close_snowflake_connection,
     DECONVE_TABLES_SCHEMAS
 )
-from shared.alerts import (  # noqa: E402
+from shared.alerts import (
     send_flow_success_alert, send_flow_error_alert
 )
 
@@ -353,7 +349,7 @@ def deconve_camera_to_snowflake(
                 role=snowflake_role,
                 private_key_passphrase=snowflake_private_key_passphrase,
                 timeout=60,
-                insecure_mode=True
+                ocsp_fail_open=True
             )
 
             # 6. Obtém schema da tabela
@@ -367,7 +363,8 @@ def deconve_camera_to_snowflake(
                 snowflake_conn,
                 table_name,
                 table_schema["columns"],
-                primary_keys
+                primary_keys,
+                columns_ddl=table_schema["columns_ddl"]
             )
 
             # 8. Faz MERGE (UPSERT) no Snowflake
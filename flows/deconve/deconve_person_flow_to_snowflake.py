@@ -3,35 +3,36 @@ import csv
 import time
 import tempfile
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Union
 from dotenv import load_dotenv
 from prefect import flow, task
 from prefect.logging import get_run_logger
 from prefect.cache_policies import NONE as NO_CACHE
+from prefect.task_runners import ThreadPoolTaskRunner
 from prefect.artifacts import create_table_artifact
 from prefect.blocks.system import Secret
 from prefect.client.schemas.schedules import CronSchedule
 
-# Imports dos módulos de conexão
-import sys
-
-sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
-
-from shared.connections.deconve import (  # noqa: E402
+# Imports dos módulos compartilhados (raiz do projeto no PYTHONPATH)
+from shared.connections.deconve import (
     authenticate_deconve, get_units, get_unit_details, get_people_counter_report
 )
-from shared.connections.snowflake import (  # noqa: E402
+from shared.connections.snowflake import (
     connect_snowflake, create_table_if_not_exists,
     merge_csv_to_snowflake, close_snowflake_connection,
     DECONVE_TABLES_SCHEMAS
 )
-from shared.alerts import (  # noqa: E402
+from shared.alerts import (
     send_flow_success_alert, send_flow_error_alert
 )
 
 # Carrega variáveis de ambiente
 load_dotenv()
 
+# Câmeras consultadas simultaneamente (workers do task runner do flow; limita a
+# carga na API Deconve)
+REPORT_MAX_WORKERS = 8
+
 
 def calculate_date_range(days_back: int = 3):
     """
@@ -167,6 +168,50 @@ def fetch_people_counter_data_with_pagination(
     return all_items
 
 
+def fetch_reports_for_cameras(
+        access_token: str,
+        camera_ids: List[str],
+        start_date: str,
+        end_date: str,
+        group_by: str = "hour"
+) -> Dict[str, Union[List[Dict[str, Any]], Exception]]:
+    """
+    Busca os relatórios de person flow de várias câmeras em paralelo
+
+    Cada câmera vira uma task run (submit no task runner do flow, até
+    REPORT_MAX_WORKERS simultâneas), com estado próprio no Prefect.
+
+    Args:
+        access_token: Token de acesso
+        camera_ids: Lista de IDs das câmeras
+        start_date: Data inicial
+        end_date: Data final
+        group_by: Agrupamento
+
+    Returns:
+        Dict {camera_id: lista de registros}, ou a exceção se a câmera falhou
+    """
+    futures = {
+        camera_id: fetch_people_counter_data_with_pagination.submit(
+            access_token=access_token,
+            video_id=camera_id,
+            start_date=start_date,
+            end_date=end_date,
+            group_by=group_by
+        )
+        for camera_id in camera_ids
+    }
+
+    results = {}
+    for camera_id, future in futures.items():
+        try:
+            results[camera_id] = future.result()
+        except Exception as e:
+            results[camera_id] = e
+
+    return results
+
+
 def convert_utc_to_brasilia(utc_timestamp: str) -> str:
     """
     Converte timestamp UTC para horário de Brasília (UTC-3)
@@ -199,6 +244,9 @@ def process_cameras_and_save_csv(
     """
     Processa todas as câmeras e salva dados de person flow em CSV
 
+    Os relatórios são buscados em paralelo (fetch_reports_for_cameras) e gravados
+    no CSV na ordem original das câmeras.
+
     Args:
         access_token: Token de acesso
         camera_ids: Lista de IDs das câmeras
@@ -225,9 +273,18 @@ def process_cameras_and_save_csv(
         total_cameras = len(camera_ids)
         total_records = 0
 
-        logger.info(f"💾 Processando {total_cameras} câmera(s)...")
+        logger.info(f"💾 Processando {total_cameras} câmera(s) ({REPORT_MAX_WORKERS} em paralelo)...")
         logger.info(f"📅 Período: {start_date} a {end_date}")
 
+        # Busca os relatórios de todas as câmeras em paralelo (I/O de rede)
+        reports = fetch_reports_for_cameras(
+            access_token=access_token,
+            camera_ids=camera_ids,
+            start_date=start_date,
+            end_date=end_date,
+            group_by=group_by
+        )
+
         # Escreve arquivo CSV
         with open(output_path, 'w', newline='', encoding='utf-8') as csvfile:
             writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
@@ -240,14 +297,10 @@ def process_cameras_and_save_csv(
                 logger.info(f"\n📹 [{idx}/{total_cameras}] Câmera: {camera_id[:8]}...")
 
                 try:
-                    # Busca dados com paginação
-                    items = fetch_people_counter_data_with_pagination(
-                        access_token=access_token,
-                        video_id=camera_id,
-                        start_date=start_date,
-                        end_date=end_date,
-                        group_by=group_by
-                    )
+                    # Dados já buscados (com paginação) em paralelo
+                    items = reports[camera_id]
+                    if isinstance(items, Exception):
+                        raise items
 
                     # Escreve registros no CSV
                     for item in items:
@@ -293,7 +346,7 @@ def process_cameras_and_save_csv(
         raise
 
 
-@flow(log_prints=True, name="deconve-person-flow-to-snowflake")
+@flow(log_prints=True, name="deconve-person-flow-to-snowflake", task_runner=ThreadPoolTaskRunner(max_workers=REPORT_MAX_WORKERS))
 def deconve_person_flow_to_snowflake(
         # Deconve params
         api_key: Optional[str] = None,
@@ -463,7 +516,7 @@ def deconve_person_flow_to_snowflake(
                 role=snowflake_role,
                 private_key_passphrase=snowflake_private_key_passphrase,
                 timeout=60,
-                insecure_mode=True
+                ocsp_fail_open=True
             )
 
             # 8. Obtém schema da tabela
@@ -477,7 +530,8 @@ def deconve_person_flow_to_snowflake(
                 snowflake_conn,
                 table_name,
                 table_schema["columns"],
-                primary_keys
+                primary_keys,
+                columns_ddl=table_schema["columns_ddl"]
             )
 
             # 10. Faz MERGE (UPSERT) no Snowflake
@@ -9,21 +9,17 @@ from prefect.cache_policies import NONE as NO_CACHE
 from prefect.artifacts import create_table_artifact
 from prefect.client.schemas.schedules import CronSchedule
 
-# Imports dos módulos de conexão
-import sys
-
-sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
-
-from shared.connections.sftp import (  # noqa: E402
+# Imports dos módulos compartilhados (raiz do projeto no PYTHONPATH)
+from shared.connections.sftp import (
     connect_sftp, get_latest_file, download_csv_from_sftp,
     normalize_csv_header, close_sftp_connection
 )
-from shared.connections.snowflake import (  # noqa: E402
+from shared.connections.snowflake import (
     connect_snowflake, create_table_if_not_exists,
     insert_csv_file_replace, close_snowflake_connection,
-    SALESFORCE_TABLES_SCHEMAS
+    read_csv_header, SALESFORCE_TABLES_SCHEMAS
 )
-from shared.alerts import (  # noqa: E402
+from shared.alerts import (
     send_flow_success_alert, send_flow_error_alert
 )
 
@@ -99,23 +95,9 @@ def process_sftp(
     # 2. Baixa CSV (sem carregar em memória)
     csv_info = download_csv_from_sftp(sftp_client, file_info["full_path"])
 
-    if csv_info["num_records"] == 0:
-        logger.warning(
-            f"⚠️ Arquivo vazio: {stream_name} "
-            f"(fonte: {file_info['filename']}, modificado: {file_info['modified_datetime']})"
-        )
-        return {
-            "stream_name": stream_name,
-            "status": "empty",
-            "rows_loaded": 0,
-            "bytes_processed": 0
-        }
-
-    # 3. Cria mapeamento de colunas (CamelCase -> snake_case)
-    import csv
-    with open(csv_info["file_path"], 'r', encoding=csv_info["encoding"]) as f:
-        reader = csv.reader(f)
-        original_columns = next(reader)
+    # 3. Cria mapeamento de colunas (CamelCase -> snake_case), lendo só o
+    # primeiro bloco do arquivo
+    original_columns = [col for col in read_csv_header(csv_info["file_path"], csv_info["encoding"]) if col]
 
     column_mapping = {}
     for col in original_columns:
@@ -126,13 +108,28 @@ def process_sftp(
 
     logger.info(f"📝 Mapeamento: {len(column_mapping)} colunas")
 
-    # 4. Normaliza cabeçalho do CSV
+    # 4. Normaliza cabeçalho do CSV (e conta os registros na mesma passada)
     logger.info("🔄 Normalizando cabeçalho para snake_case...")
-    normalized_csv_path = normalize_csv_header(
-        csv_info["file_path"],
-        csv_info["encoding"],
-        column_mapping
-    )
+    normalized_csv_path, num_records = csv_info["file_path"], 0
+    if original_columns:
+        normalized_csv_path, num_records = normalize_csv_header(
+            csv_info["file_path"],
+            csv_info["encoding"],
+            column_mapping
+        )
+
+    if num_records == 0:
+        logger.warning(
+            f"⚠️ Arquivo vazio: {stream_name} "
+            f"(fonte: {file_info['filename']}, modificado: {file_info['modified_datetime']})"
+        )
+        os.unlink(normalized_csv_path)
+        return {
+            "stream_name": stream_name,
+            "status": "empty",
+            "rows_loaded": 0,
+            "bytes_processed": 0
+        }
 
     # 5. Obtém schema da tabela Snowflake
     table_schema = SALESFORCE_TABLES_SCHEMAS[stream_name]
@@ -143,11 +140,12 @@ def process_sftp(
         snowflake_conn,
         table_name,
         table_schema["columns"],
-        table_schema["primary_key"]
+        table_schema["primary_key"],
+        columns_ddl=table_schema["columns_ddl"]
     )
 
     # 7. Carrega CSV direto no Snowflake (PUT + COPY INTO)
-    logger.info(f"⚡ Carregando {csv_info['num_records']} registros em {table_name}...")
+    logger.info(f"⚡ Carregando {num_records} registros em {table_name}...")
 
     result = insert_csv_file_replace(
         snowflake_conn,
@@ -271,7 +269,7 @@ def salesforce_to_snowflake(  # noqa: C901
             role=snowflake_role,
             private_key_passphrase=snowflake_private_key_passphrase,
             timeout=60,
-            insecure_mode=True
+            ocsp_fail_open=True
         )
 
         # 4. Processa cada stream
@@ -1,6 +1,9 @@
 from typing import Optional, Dict, Any
+import orjson
 import urllib3
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from prefect import get_run_logger
 
 # Desabilita warnings de SSL
@@ -12,6 +15,9 @@ class WeatherAPIClient:
 
     BASE_URL = "https://api.hgbrasil.com/weather"
     TIMEOUT = 10  # segundos
+    MAX_RETRIES = 3
+    RETRY_BACKOFF = 0.5
+    RETRY_STATUS = (429, 500, 502, 503, 504)
 
     def __init__(self, api_key: str):
         """
@@ -22,6 +28,20 @@ class WeatherAPIClient:
         """
         self.api_key = api_key
         self.logger = get_run_logger()
+        self.session = self._create_session()
+
+    def _create_session(self) -> requests.Session:
+        """Cria sessão HTTP com keep-alive e retry automático, reutilizada entre cidades."""
+        retry = Retry(
+            total=self.MAX_RETRIES,
+            backoff_factor=self.RETRY_BACKOFF,
+            status_forcelist=self.RETRY_STATUS,
+            raise_on_status=False,
+            allowed_methods=["GET"]
+        )
+        session = requests.Session()
+        session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry))
+        return session
 
     def fetch_weather(self, city_name: str) -> Optional[Dict[str, Any]]:
         """
@@ -41,10 +61,10 @@ class WeatherAPIClient:
                 'city_name': city_name
             }
 
-            response = requests.get(self.BASE_URL, params=params, verify=True, timeout=self.TIMEOUT)
+            response = self.session.get(self.BASE_URL, params=params, verify=True, timeout=self.TIMEOUT)
 
             if response.status_code == 200:
-                data = response.json()
+                data = orjson.loads(response.content)
                 self.logger.info(f"   ✓ Resposta recebida para {city_name}")
                 return data
             else:
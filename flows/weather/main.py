@@ -1,6 +1,5 @@
-import time
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 
 import pandas as pd
 from dotenv import load_dotenv
@@ -23,6 +22,8 @@ load_dotenv()
 # Snowflake
 DATABASE = "AJ_DATALAKEHOUSE_RPA"
 SCHEMA = "BRONZE"
+CURRENT_TABLE = "BRZ_CLIMA_TEMPO"
+FORECAST_TABLE = "BRZ_CLIMA_TEMPO_PREVISAO"
 
 # Mapeamento de cidades com IDs da tabela AJ_DATALAKEHOUSE_RPA.SILVER.DIM_CIDADE
 CIDADES = [
@@ -50,7 +51,7 @@ WEATHER_COLUMNS = [
 #
 # TABELA 2: BRZ_CLIMA_TEMPO_PREVISAO (Previsão - FULL REFRESH)
 #   - Armazena os 15 dias de previsão futura
-#   - TRUNCATE + INSERT a cada execução
+#   - INSERT em staging + ALTER TABLE ... SWAP WITH a cada execução (sem janela vazia)
 #   - Sempre tem a previsão mais atualizada
 #   - Dados previstos pela API
 
@@ -92,13 +93,15 @@ def fetch_weather_data(client: WeatherAPIClient, cidade: Dict[str, Any]) -> Opti
 
 
 @task(name="process_weather_data", log_prints=True, cache_policy=NONE)
-def process_weather_data(weather_responses: List[tuple], only_first: bool = False) -> pd.DataFrame:
+def process_weather_data(weather_responses: List[tuple]) -> pd.DataFrame:
     """
-    Processa dados climáticos para Snowflake.
+    Processa dados climáticos para Snowflake (todos os dias de previsão).
+
+    O clima atual (1º dia de cada cidade) é derivado destes mesmos registros
+    em load_weather_data, sem reprocessar as respostas da API.
 
     Args:
         weather_responses: Lista de tuplas (cidade_id, WeatherAPIResponse)
-        only_first: True para clima atual (1º dia), False para todos os dias
 
     Returns:
         DataFrame pronto para inserção
@@ -107,70 +110,97 @@ def process_weather_data(weather_responses: List[tuple], only_first: bool = Fals
     records = []
 
     for cidade_id, api_response in weather_responses:
-        # Pega apenas primeiro ou todos os dias de previsão
-        forecast_days = api_response.results.forecast[:1] if only_first else api_response.results.forecast
-
-        for forecast_day in forecast_days:
+        for forecast_day in api_response.results.forecast:
             row = transform_to_snowflake_row(cidade_id, api_response.results, forecast_day)
             records.append(row)
 
     df = pd.DataFrame(records)
-    tipo = "ATUAL" if only_first else "PREVISÃO"
-    logger.info(f"✅ Processados {len(df)} registros de {tipo}")
+
+    # DT_PREVISAO (não vem de transform_to_snowflake_row): datas convertidas de uma
+    # vez (parser C do pandas, com cache de strings repetidas)
+    if not df.empty:
+        df['DT_PREVISAO'] = pd.to_datetime(df['DS_DATA_COMPLETA'], format='%d/%m/%Y', cache=True).dt.date
+
+    logger.info(f"✅ Processados {len(df)} registros de PREVISÃO")
 
     return df
 
 
-@task(name="insert_weather_data", log_prints=True, cache_policy=NONE)
-def insert_weather_data(conn, table_name: str, df: pd.DataFrame, truncate: bool = False) -> int:
+@task(name="load_weather_data", log_prints=True, cache_policy=NONE)
+def load_weather_data(conn, df: pd.DataFrame) -> Tuple[int, int]:
     """
-    Insere dados climáticos no Snowflake.
+    Carrega clima atual e previsão no Snowflake a partir de um único upload.
+
+    Processo:
+    1. Cria staging de BRZ_CLIMA_TEMPO_PREVISAO (mesma estrutura e grants)
+    2. Envia todos os dias de previsão uma única vez para a staging
+    3. INSERT ... SELECT do 1º dia de cada cidade da staging em BRZ_CLIMA_TEMPO (APPEND)
+    4. COMMIT único das duas cargas (BEGIN explícito; ROLLBACK em caso de erro)
+    5. ALTER TABLE ... SWAP WITH para publicar a nova previsão (FULL REFRESH)
 
     Args:
         conn: Conexão Snowflake
-        table_name: Nome da tabela (BRZ_CLIMA_TEMPO ou BRZ_CLIMA_TEMPO_PREVISAO)
-        df: DataFrame com dados a inserir
-        truncate: Se True, executa TRUNCATE antes do INSERT
+        df: DataFrame com todos os dias de previsão (process_weather_data)
 
     Returns:
-        Número de registros inseridos
+        Tupla (registros de clima atual, registros de previsão)
     """
     logger = get_run_logger()
 
     if df.empty:
-        logger.info(f"Nenhum dado para inserir em {table_name}")
-        return 0
+        logger.info("Nenhum dado para inserir")
+        return 0, 0
 
     cursor = conn.cursor()
-    full_table = f"{DATABASE}.{SCHEMA}.{table_name}"
+    current_table = f"{DATABASE}.{SCHEMA}.{CURRENT_TABLE}"
+    forecast_table = f"{DATABASE}.{SCHEMA}.{FORECAST_TABLE}"
+    stage_table = f"{forecast_table}_STAGE"
+    columns_list = ", ".join(WEATHER_COLUMNS)
 
     try:
-        # TRUNCATE se solicitado
-        if truncate:
-            logger.info(f"🗑️  Limpando dados anteriores de {full_table}...")
-            cursor.execute(f"TRUNCATE TABLE {full_table}")
-            conn.commit()
-            logger.info("✅ Tabela truncada")
+        # 1. Staging com a mesma estrutura e grants da tabela de previsão
+        logger.info(f"🏗️  Criando staging {stage_table}...")
+        cursor.execute(f"CREATE OR REPLACE TABLE {stage_table} LIKE {forecast_table} COPY GRANTS")
+
+        # Transação explícita: as duas cargas são confirmadas (ou desfeitas) juntas,
+        # mesmo com autocommit ativo na conexão
+        cursor.execute("BEGIN")
 
-        # INSERT
-        strategy = "FULL REFRESH" if truncate else "APPEND"
-        logger.info(f"📊 Inserindo {len(df)} registros em {full_table} ({strategy})...")
+        # 2. Upload único de todos os dias de previsão
+        logger.info(f"📊 Inserindo {len(df)} registros em {stage_table}...")
 
-        columns_list = ", ".join(WEATHER_COLUMNS)
-        placeholders = ", ".join(["%s"] * len(WEATHER_COLUMNS))
-        insert_sql = f"INSERT INTO {full_table} ({columns_list}) VALUES ({placeholders})"
+        records = list(df[WEATHER_COLUMNS].itertuples(index=False, name=None))
 
-        records = [tuple(row[col] for col in WEATHER_COLUMNS) for _, row in df.iterrows()]
+        # INSERT multi-row (VALUES (...), (...), ...) com bind único: um round-trip para todo o lote
+        row_placeholders = "(" + ", ".join(["%s"] * len(WEATHER_COLUMNS)) + ")"
+        insert_sql = f"INSERT INTO {stage_table} ({columns_list}) VALUES {', '.join([row_placeholders] * len(records))}"
 
-        cursor.executemany(insert_sql, records)
-        rows_inserted = cursor.rowcount
+        cursor.execute(insert_sql, [value for record in records for value in record])
+        forecast_inserted = cursor.rowcount
+
+        # 3. Clima atual derivado da staging no servidor (sem novo upload)
+        cursor.execute(f"""
+            INSERT INTO {current_table} ({columns_list})
+            SELECT {columns_list}
+            FROM {stage_table}
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY ID_CIDADE ORDER BY DT_PREVISAO) = 1
+        """)
+        current_inserted = cursor.rowcount
+
+        # 4. Commit único das duas cargas
         conn.commit()
+        logger.info(f"✅ {current_inserted} registros inseridos em {current_table} (APPEND)")
+
+        # 5. Troca atômica staging <-> previsão e descarta os dados antigos
+        cursor.execute(f"ALTER TABLE {forecast_table} SWAP WITH {stage_table}")
+        cursor.execute(f"DROP TABLE IF EXISTS {stage_table}")
+        logger.info(f"🔄 {forecast_inserted} registros publicados em {forecast_table} (FULL REFRESH via SWAP)")
 
-        logger.info(f"✅ {rows_inserted} registros inseridos com sucesso")
-        return rows_inserted
+        return current_inserted, forecast_inserted
 
     except Exception as e:
         logger.error(f"❌ Erro ao inserir dados: {e}")
+        conn.rollback()
         raise
     finally:
         cursor.close()
@@ -201,7 +231,7 @@ def main():
     logger.info("🌤️  CLIMA: API HGBrasil → SNOWFLAKE")
     logger.info("=" * 80)
 
-    # Carrega API Key e cria client
+    # Carrega API Key e cria client (sessão HTTP única com retry/backoff para todas as cidades)
     api_key = load_api_key()
     client = WeatherAPIClient(api_key)
 
@@ -216,10 +246,6 @@ def main():
         if weather_data:
             weather_data_list.append(weather_data)
 
-        # Pausa de 2 segundos entre requisições (evita sobrecarga)
-        if i < len(CIDADES):
-            time.sleep(2)
-
     if not weather_data_list:
         logger.error("❌ Nenhum dado coletado. Encerrando.")
         raise Exception("Falha ao coletar dados climáticos de todas as cidades")
@@ -227,13 +253,9 @@ def main():
     logger.info(f"✅ Dados coletados de {len(weather_data_list)}/{len(CIDADES)} cidades")
 
     with snowflake_connection(database=DATABASE, schema=SCHEMA) as conn:
-        # Processa e insere clima ATUAL (apenas 1º dia)
-        df_current = process_weather_data(weather_data_list, only_first=True)
-        current_inserted = insert_weather_data(conn, "BRZ_CLIMA_TEMPO", df_current, truncate=False)
-
-        # Processa e insere PREVISÃO (todos os 15 dias)
-        df_forecast = process_weather_data(weather_data_list, only_first=False)
-        forecast_inserted = insert_weather_data(conn, "BRZ_CLIMA_TEMPO_PREVISAO", df_forecast, truncate=True)
+        # Processa PREVISÃO (todos os 15 dias) e carrega clima ATUAL + PREVISÃO com um único upload
+        df_forecast = process_weather_data(weather_data_list)
+        current_inserted, forecast_inserted = load_weather_data(conn, df_forecast)
 
     # Resumo
     end_time = datetime.now()
@@ -1,6 +1,5 @@
-from datetime import datetime
 from typing import Optional, List, Dict, Any
-from pydantic import BaseModel, field_validator
+from pydantic import BaseModel, model_validator
 from shared.utils import get_datetime_brasilia
 
 
@@ -37,23 +36,25 @@ class WeatherResults(BaseModel):
     longitude: Optional[str] = None
     forecast: List[ForecastDay]
 
-    @field_validator('latitude', mode='before')
+    @model_validator(mode='before')
     @classmethod
-    def validate_latitude(cls, v, info):
-        """Aceita 'latitude' ou 'lat', converte float para string."""
-        if v is not None:
-            return str(v)
-        lat = info.data.get('lat')
-        return str(lat) if lat is not None else None
-
-    @field_validator('longitude', mode='before')
-    @classmethod
-    def validate_longitude(cls, v, info):
-        """Aceita 'longitude' ou 'lon', converte float para string."""
-        if v is not None:
-            return str(v)
-        lon = info.data.get('lon')
-        return str(lon) if lon is not None else None
+    def normalize_coordinates(cls, data: Any) -> Any:
+        """Aceita 'latitude'/'lat' e 'longitude'/'lon' em uma única passada, convertendo float para string."""
+        if not isinstance(data, dict):
+            return data
+
+        lat = data.get('latitude')
+        if lat is None:
+            lat = data.get('lat')
+        lon = data.get('longitude')
+        if lon is None:
+            lon = data.get('lon')
+
+        return {
+            **data,
+            'latitude': str(lat) if lat is not None else None,
+            'longitude': str(lon) if lon is not None else None
+        }
 
 
 class WeatherAPIResponse(BaseModel):
@@ -93,23 +94,23 @@ def transform_to_snowflake_row(cidade_id: int, results: WeatherResults, forecast
     """
     Transforma dados da API para formato Snowflake.
 
+    Não inclui DT_PREVISAO: a data é derivada de DS_DATA_COMPLETA de uma vez,
+    para todas as linhas, em process_weather_data (flows/weather/main.py).
+
     Args:
         cidade_id: ID da cidade
         results: Resultados da API (dados atuais)
         forecast_day: Dia de previsão
 
     Returns:
-        Dict pronto para inserção no Snowflake
+        Dict com as colunas vindas da API (todas as de WEATHER_COLUMNS exceto DT_PREVISAO)
     """
-    forecast_date = datetime.strptime(forecast_day.full_date, '%d/%m/%Y').date()
-
     return {
         'ID_CIDADE': cidade_id,
         'NR_LATITUDE': results.latitude,
         'NR_LONGITUDE': results.longitude,
         'NR_TEMPERATURA_ATUAL': results.temp,
         'NR_UMIDADE_ATUAL': results.humidity,
-        'DT_PREVISAO': forecast_date,
         'DS_DATA_FORMATADA': forecast_day.date,
         'DS_DATA_COMPLETA': forecast_day.full_date,
         'DS_DIA_SEMANA': forecast_day.weekday,
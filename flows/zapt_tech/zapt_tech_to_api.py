@@ -1,23 +1,43 @@
 import os
+import gzip
 import time
-import json
-from typing import Optional, List, Dict, Any
+import random
+import logging
+import hashlib
+import reprlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime
+from functools import lru_cache
+from itertools import chain, islice
+from typing import Optional, List, Dict, Any, Iterable, Iterator, BinaryIO, Tuple
+
+import numpy as np
+import orjson
+import pyarrow as pa
+import pyarrow.parquet as pq
+import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+from psycopg2.pool import ThreadedConnectionPool
 from prefect import flow, task
+from prefect.blocks.system import Secret
+from prefect.context import get_run_context
 from prefect.logging import get_run_logger
 from prefect.cache_policies import NONE as NO_CACHE
+from prefect.task_runners import ThreadPoolTaskRunner
 from prefect.artifacts import create_table_artifact, create_markdown_artifact
 from prefect.client.schemas.schedules import CronSchedule
 
-# Imports dos módulos
-import sys
-sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
-
-from shared.connections.postgresql import (  # noqa: E402
-    execute_query, close_postgresql_connection, format_query_with_params
+# Imports dos módulos compartilhados (raiz do projeto no PYTHONPATH)
+from shared.connections.postgresql import (
+    iter_query_batches, format_query_with_params
 )
-from shared.alerts import (  # noqa: E402
+from shared.alerts import (
     send_flow_success_alert, send_flow_error_alert
 )
 
@@ -52,14 +72,26 @@ load_dotenv()
 # ─────────────────────────────────────────────────────────────────────────────
 # Siglas válidas dos shoppings
 # ─────────────────────────────────────────────────────────────────────────────
-VALID_SHOPPING_SIGLAS = [
+VALID_SHOPPING_SIGLAS = (
     "NK",
     "BS",
     "GS",
     "NR",
     "CS",
     "NS"
-]
+)
+
+# Pré-computados: busca O(1) na validação e lista formatada para mensagens/logs
+_VALID_SHOPPING_SIGLAS_SET = frozenset(VALID_SHOPPING_SIGLAS)
+_VALID_SHOPPING_SIGLAS_STR = ", ".join(VALID_SHOPPING_SIGLAS)
+
+# Validadas uma única vez no import: o flow itera a constante sem revalidar
+if len(_VALID_SHOPPING_SIGLAS_SET) != len(VALID_SHOPPING_SIGLAS):
+    raise ValueError(f"VALID_SHOPPING_SIGLAS contém siglas duplicadas: {_VALID_SHOPPING_SIGLAS_STR}")
+for _sigla in VALID_SHOPPING_SIGLAS:
+    if not (len(_sigla) == 2 and _sigla.isalpha() and _sigla.isupper()):
+        raise ValueError(f"Sigla de shopping mal formatada em VALID_SHOPPING_SIGLAS: '{_sigla}'")
+del _sigla
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Organization ID do Zapt Tech
@@ -71,6 +103,104 @@ ZAPT_TECH_ORGANIZATION_ID = 6291090961989632
 # ─────────────────────────────────────────────────────────────────────────────
 ZAPT_TECH_API_URL = "https://us-central1-zapt-backend.cloudfunctions.net/saveBulkData"
 
+# ─────────────────────────────────────────────────────────────────────────────
+# Envio para API: blocos paralelos; só o bloco que falhou (5xx/rede) é reenviado
+# ─────────────────────────────────────────────────────────────────────────────
+API_CHUNK_SIZE = 1000
+API_MAX_WORKERS = 3
+API_MAX_RETRIES = 3
+API_RETRY_BACKOFF = 0.5
+API_RETRY_JITTER = 0.5
+# Repetidos pela sessão HTTP (respeitando Retry-After): o POST não foi processado
+API_RETRY_STATUS = (429,)
+API_TIMEOUT = (5, 300)  # (conexão, leitura) em segundos
+
+# Corpos acima deste tamanho vão com Content-Encoding: gzip (quando gzip_body=True)
+API_GZIP_MIN_BYTES = 64 * 1024
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Linhas lidas por lote do cursor server-side do PostgreSQL
+# ─────────────────────────────────────────────────────────────────────────────
+QUERY_BATCH_SIZE = 5000
+
+# Lotes a partir deste tamanho convertem as colunas float via NumPy (uma passada em C)
+NUMPY_COERCE_MIN_ROWS = 500
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Pool de conexões PostgreSQL (criado sob demanda, compartilhado no processo)
+# Uma conexão por shopping: todas as queries rodam ao mesmo tempo e a duração
+# total fica próxima da query mais lenta (não da soma)
+# ─────────────────────────────────────────────────────────────────────────────
+PG_POOL_MIN_CONN = 1
+PG_POOL_MAX_CONN = len(VALID_SHOPPING_SIGLAS)
+
+_PG_POOL: Optional[ThreadedConnectionPool] = None
+_PG_POOL_LOCK = threading.Lock()
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Índices necessários para a query padrão (filtros por shopping/competência)
+# Sem eles as tabelas fato são lidas com seq scan a cada shopping.
+# Criados só com ensure_indexes=True no flow (por padrão servem de documentação).
+# ─────────────────────────────────────────────────────────────────────────────
+REQUIRED_INDEXES = {
+    "idx_focl_shop_comp_tipo":
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_focl_shop_comp_tipo "
+        "ON fato_ocupacao_contrato_luc (id_shopping, dt_competencia, id_tipo, id_luc) "
+        "INCLUDE (qt_metragem, id_contrato)",
+    "idx_ffat_shop_ref_conta":
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_ffat_shop_ref_conta "
+        "ON fato_faturamento (id_shopping, dt_referencia, id_conta) "
+        "INCLUDE (id_contrato, id_luc, dt_competencia, vl_faturado)",
+    "idx_fven_shop_dt":
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_fven_shop_dt "
+        "ON fato_venda (id_shopping, dt_venda) "
+        "INCLUDE (id_contrato, id_luc, dt_competencia, vl_informado_lojista)",
+}
+
+# Estado de um índice (None = não existe; False = INVALID, ex: build CONCURRENTLY
+# que falhou ou foi cancelado e que IF NOT EXISTS não reconstruiria)
+_INDEX_VALID_SQL = "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)"
+
+_INDEXES_ENSURED = False
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Saída local e cache de resultados por (shopping, competência)
+# ─────────────────────────────────────────────────────────────────────────────
+OUTPUT_DIR = "flows/zapt_tech/output"
+QUERY_CACHE_DIR = os.path.join(OUTPUT_DIR, "cache")
+# Cache opt-in (0 = desativado): re-execuções manuais costumam vir depois de
+# corrigir os dados de origem e precisam consultar o banco de novo
+QUERY_CACHE_TTL_HOURS = 0
+
+# Buffer de escrita dos arquivos locais (64 KB: menos syscalls por item gravado).
+# Os arquivos NÃO recebem os.fsync: a consistência vem do temporário + os.replace.
+# OUTPUT_DIR deve ficar em disco local (não em montagem NFS/sync), senão cada
+# escrita pode bloquear até o flush remoto.
+WRITE_BUFFER_SIZE = 64 * 1024
+
+# Itens exibidos na amostra do artifact (o JSON completo fica no arquivo latest)
+ARTIFACT_PREVIEW_ITEMS = 5
+
+ARTIFACT_MARKDOWN_TEMPLATE = """
+# 📊 Zapt Tech - Dados Consolidados
+
+**Total de registros:** {items_count:,}
+**Tamanho (Parquet):** {file_size_mb:.2f} MB
+**Shopping:** {sigla_shopping}
+**JSON completo:** `{latest_filepath}`
+
+---
+
+## 📋 Amostra ({preview_count} de {items_count:,} registros)
+
+```json
+{preview_json}
+```
+"""
+
+# Nível do gzip para arquivos .gz (1 = mais rápido; dados tabulares já comprimem bem)
+GZIP_COMPRESS_LEVEL = 1
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Schema dos dados conforme especificação Zapt Tech
 # ─────────────────────────────────────────────────────────────────────────────
@@ -130,7 +260,9 @@ ZAPT_TECH_SCHEMA = {
 # SQL QUERY PADRÃO - Editável via parâmetro na interface do Prefect
 # ════════════════════════════════════════════════════════════════════════════════
 #
-# IMPORTANTE: Use {sigla_shopping} como placeholder para a sigla do shopping
+# IMPORTANTE: Use %(sigla_shopping)s como placeholder para a sigla do shopping
+# (parâmetro vinculado pelo psycopg2, sem aspas). Literais com % devem ser escritos como %%.
+# O formato legado '{sigla_shopping}' (substituição de texto) ainda é aceito.
 # Siglas válidas: NK, BS, GS, NR, CS, NS
 #
 # Esta query retorna:
@@ -140,6 +272,8 @@ ZAPT_TECH_SCHEMA = {
 #
 # ════════════════════════════════════════════════════════════════════════════════
 
+LEGACY_SIGLA_PLACEHOLDER = "{sigla_shopping}"
+
 DEFAULT_SQL_QUERY = """-- ============================================================================
 -- CTE: COMPETENCIA - Calcula período de análise (últimos 12 meses)
 -- ============================================================================
@@ -178,12 +312,14 @@ luc as  (
     where luc.id_status = 'A'
     and luc.ds_tipo_luc <> 'QUIOSQUE'
     and luc.dt_desativacao is null
-    and id_shopping  = '{sigla_shopping}'
+    and id_shopping  = %(sigla_shopping)s
 ),
 
 -- ============================================================================
 -- CTE: OCUPACAO - Lojas ocupadas na competência atual
 -- ============================================================================
+-- abl = metragem total do contrato na competência (todas as LUCs e tipos),
+-- calculada com SUM() OVER em uma única passada (sem subquery correlacionada)
 ocupacao as (
     select     ocup.id_shopping
             ,ocup.id_contrato
@@ -192,24 +328,24 @@ ocupacao as (
             ,ocup.ds_subtipo_luc
             ,luc.vitrine
             ,to_char(dvc.dt_fim_formal, 'DD/MM/YYYY') as vencimento
-            ,(
-                select SUM(ocup_sub.qt_metragem)
-                    from fato_ocupacao_contrato_luc ocup_sub
-                    where ocup_sub.id_shopping    = ocup.id_shopping
-                    and ocup_sub.id_contrato     = ocup.id_contrato
-                    and ocup_sub.dt_competencia = ocup.dt_competencia
-            ) abl
-    from fato_ocupacao_contrato_luc ocup
+            ,ocup.abl
+    from (
+        select     ocup_all.*
+                ,SUM(ocup_all.qt_metragem) over (
+                    partition by ocup_all.id_shopping, ocup_all.id_contrato, ocup_all.dt_competencia
+                ) as abl
+        from fato_ocupacao_contrato_luc ocup_all
+        where ocup_all.dt_competencia = (select competencia_atual from competencia)
+            and ocup_all.id_shopping  = %(sigla_shopping)s
+    ) ocup
     inner join luc luc
         on luc.id_shopping         = ocup.id_shopping
         and luc.id_luc              = ocup.id_luc
     inner join dim_vs_contrato dvc
         on dvc.id_contrato = ocup.id_contrato
         and dvc.id_shopping = ocup.id_shopping
-    where ocup.dt_competencia    = (select competencia_atual from competencia)
-        and ocup.id_tipo      = 'P'
-        and ocup.id_shopping = '{sigla_shopping}'
-    group by 1, 2, 3, 4, 5, 6, 7
+    where ocup.id_tipo      = 'P'
+    group by 1, 2, 3, 4, 5, 6, 7, 8
 ),
 
 -- ============================================================================
@@ -225,7 +361,7 @@ vendas as (
     inner join competencia comp
         on ven.dt_venda  >= comp.data_inicial
         and ven.dt_venda <= comp.data_final
-        and ven.id_shopping = '{sigla_shopping}'
+        and ven.id_shopping = %(sigla_shopping)s
     group by 1, 2, 3, 4
 ),
 
@@ -240,7 +376,7 @@ media_vendas as (
         COUNT(distinct dt_competencia) as qtd_competencias,
         ROUND(SUM(venda_total) / COUNT(distinct dt_competencia), 2) as media_venda
     from vendas
-    where id_shopping = '{sigla_shopping}'
+    where id_shopping = %(sigla_shopping)s
     group by 1, 2, 3
 ),
 
@@ -258,7 +394,7 @@ faturamento as (
     inner join competencia com
         on fat.dt_referencia  >= com.data_inicial
         and fat.dt_referencia <= com.data_final
-        and fat.id_shopping = '{sigla_shopping}'
+        and fat.id_shopping = %(sigla_shopping)s
     group by 1, 2, 3, 4, 5
 ),
 
@@ -275,7 +411,30 @@ total_competencia as (
     inner join competencia com
         on fat.dt_referencia  >= com.data_inicial
         and fat.dt_referencia <= com.data_final
-    where fat.id_shopping = '{sigla_shopping}'
+    where fat.id_shopping = %(sigla_shopping)s
+    group by 1, 2, 3
+),
+
+-- ============================================================================
+-- CTE: FAT_PIVOT - Médias mensais de faturamento por grupo de contas
+-- ============================================================================
+-- Uma linha por loja com cada grupo de contas já somado: os filtros de id_conta
+-- são avaliados uma vez por linha de faturamento, e não por linha do join principal
+fat_pivot as (
+    select     fat.id_shopping
+            ,fat.id_contrato
+            ,fat.id_luc
+            ,sum(fat.faturamento / totcomp.qtd_competencias) filter (where fat.id_conta in ('200102', '200105', '300106', '200117', '200139')) as amm
+            ,sum(fat.faturamento / totcomp.qtd_competencias) filter (where fat.id_conta in ('300104', '300105')) as aluguel_variavel
+            ,sum(fat.faturamento / totcomp.qtd_competencias) filter (where fat.id_conta in ('200001', '200015')) as condominio
+            ,sum(fat.faturamento / totcomp.qtd_competencias) filter (where fat.id_conta in ('300001', '300006')) as fundo_promocao
+            ,sum(fat.faturamento / totcomp.qtd_competencias) filter (where fat.id_conta in ('200004','300101','300107','200104','200123','200124','200119','200120','200102','200117','300104','200002','200052','400001','200019','200001','400010','600010','300002','300001','200020','200029','300102','200140','200125','200121','200122','200139','300105','200028','200015','300007','200105','200024','200037','200027','200031','300006','200041','200034','200033','200032','200040','200030','200003','200009','300020','200021','300106','200005','200013','200050','200016','200158','300005','200110','200113','200160','200114','200109','200159','200162','200018','200115','300011','300003','300021','200108','200035','200012','200011','200008','200014','200023','200022','600001','600002','200006','200007','200116','200025')) as faturamento_total
+            ,sum(fat.faturamento / totcomp.qtd_competencias) filter (where fat.id_conta in ('3001001', '300102', '300104', '300105')) as co_percentual
+    from faturamento fat
+    inner join total_competencia totcomp
+        on fat.id_shopping         = totcomp.id_shopping
+        and fat.id_contrato        = totcomp.id_contrato
+        and fat.id_luc             = totcomp.id_luc
     group by 1, 2, 3
 )
 
@@ -293,44 +452,26 @@ select     ocup.id_shopping                                as shopping
         ,con.ds_atividade                                as atividade
         ,ocup.id_contrato                                as contrato
         ,ocup.vencimento                                as vencimento
-        ,concat(
-            substring(ocup.dt_competencia, 5, 2), '/', substring(ocup.dt_competencia, 1, 4)
-            )                                            as competencia
+        ,ocup.dt_competencia                            as competencia
         ,ven.media_venda                                as media_venda
         ,case when ocup.abl = 0 then 0
             else round(ven.media_venda / ocup.abl, 2)
         end                                                as venda_m2
-        ,round(
-            sum(fat.faturamento / totcomp.qtd_competencias) filter (where fat.id_conta in ('200102', '200105', '300106', '200117', '200139')), 2)
-                                                        as amm
+        ,round(sum(fp.amm), 2)                            as amm
         ,case when ocup.abl = 0 then 0
-            else round(sum(fat.faturamento / totcomp.qtd_competencias) filter (where fat.id_conta in ('200102', '200105', '300106', '200117', '200139')) / ocup.abl, 2)
+            else round(sum(fp.amm) / ocup.abl, 2)
         end                                                as amm_m2
-        ,round(
-            sum(fat.faturamento / totcomp.qtd_competencias) filter (where fat.id_conta in ('300104', '300105')), 2)
-                                                        as aluguel_variavel
-        ,round(
-            sum(fat.faturamento / totcomp.qtd_competencias) filter (where fat.id_conta in ('200001', '200015')), 2)
-                                                        as condominio
+        ,round(sum(fp.aluguel_variavel), 2)                as aluguel_variavel
+        ,round(sum(fp.condominio), 2)                    as condominio
         ,case when ocup.abl = 0 then 0
-            else round(
-                    sum(fat.faturamento / totcomp.qtd_competencias) filter (where fat.id_conta in ('200001', '200015')) / ocup.abl, 2)
+            else round(sum(fp.condominio) / ocup.abl, 2)
         end                                                as condominio_m2
-        ,round(
-            sum(fat.faturamento / totcomp.qtd_competencias) filter (where fat.id_conta in ('300001', '300006')),2)
-                                                        as fundo_promocao
+        ,round(sum(fp.fundo_promocao), 2)                as fundo_promocao
         ,case when ocup.abl = 0 then 0
-            else round(
-                    sum(fat.faturamento / totcomp.qtd_competencias) filter (where fat.id_conta in ('300001', '300006')) / ocup.abl, 2)
+            else round(sum(fp.fundo_promocao) / ocup.abl, 2)
         end                                                as fundo_promocao_m2
-        ,round(
-            sum(fat.faturamento / totcomp.qtd_competencias) filter (where fat.id_conta in ('200004','300101','300107','200104','200123','200124','200119','200120','200102','200117','300104','200002','200052','400001','200019','200001','400010','600010','300002','300001','200020','200029','300102','200140','200125','200121','200122','200139','300105','200028','200015','300007','200105','200024','200037','200027','200031','300006','200041','200034','200033','200032','200040','200030','200003','200009','300020','200021','300106','200005','200013','200050','200016','200158','300005','200110','200113','200160','200114','200109','200159','200162','200018','200115','300011','300003','300021','200108','200035','200012','200011','200008','200014','200023','200022','600001','600002','200006','200007','200116','200025')), 2)
-                                                        as faturamento_total
-        ,greatest(
-          round(
-            sum(fat.faturamento / totcomp.qtd_competencias)    filter (where fat.id_conta in ('3001001', '300102', '300104', '300105')), 2),
-            0)
-                                                        as CO_percentual
+        ,round(sum(fp.faturamento_total), 2)            as faturamento_total
+        ,greatest(round(sum(fp.co_percentual), 2), 0)    as CO_percentual
         ,con.ds_tipo_contrato                            as tipo_contrato
         ,null                                             as cdu_m2
         ,'LOCADO'                                        as status
@@ -342,14 +483,10 @@ full outer join media_vendas ven
     on ven.id_shopping         = ocup.id_shopping
     and ven.id_contrato     = ocup.id_contrato
     and ven.id_luc             = ocup.id_luc
-inner join faturamento fat
-    on fat.id_shopping         = ocup.id_shopping
-    and fat.id_contrato        = ocup.id_contrato
-    and fat.id_luc             = ocup.id_luc
-inner join total_competencia totcomp
-    on fat.id_shopping         = totcomp.id_shopping
-    and fat.id_contrato        = totcomp.id_contrato
-    and fat.id_luc             = totcomp.id_luc
+inner join fat_pivot fp
+    on fp.id_shopping          = ocup.id_shopping
+    and fp.id_contrato         = ocup.id_contrato
+    and fp.id_luc              = ocup.id_luc
 inner join luc luc
     on ocup.id_shopping        = luc.id_shopping
     and ocup.id_luc            = luc.id_luc
@@ -397,9 +534,7 @@ from (
             ,luc.ds_subtipo_luc                                as segmento
             ,luc.ds_nivel                                     as piso
             ,ocup3.id_contrato                                as contrato
-            ,concat(
-            substring(ocup2.dt_competencia, 5, 2), '/', substring(ocup2.dt_competencia, 1, 4)
-            )                    as competencia
+            ,ocup2.dt_competencia                            as competencia
     from
     (
         select    ocup.id_shopping
@@ -490,10 +625,310 @@ group by 1, 2, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22
 """
 
 
+# Opções do orjson para os itens gravados nos arquivos locais (um item compacto por linha)
+ORJSON_ITEM_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+# Schema e organizationId serializados uma única vez no import e reaproveitados
+# no arquivo JSON, nos metadados Parquet, nos POSTs e na chave do cache
+_ZAPT_TECH_SCHEMA_BYTES = orjson.dumps(ZAPT_TECH_SCHEMA)
+_ZAPT_TECH_ORG_BYTES = b'"organizationId":%d' % ZAPT_TECH_ORGANIZATION_ID
+_ZAPT_TECH_PAYLOAD_HEADER = b'{' + _ZAPT_TECH_ORG_BYTES + b',"schema":' + _ZAPT_TECH_SCHEMA_BYTES + b',"items":'
+_ZAPT_TECH_SCHEMA_HASH = hashlib.sha1(_ZAPT_TECH_SCHEMA_BYTES).digest()
+
+
+def _orjson_default(value: Any) -> Any:
+    """Fallback do orjson para tipos não nativos (ex: Decimal do psycopg2)"""
+    if hasattr(value, '__float__'):
+        return float(value)
+    return str(value)
+
+
+def _safe_float(value: Any) -> Any:
+    """Converte para float (ex: Decimal), mantendo como string se não for numérico"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def _coerce_other(value: Any) -> Any:
+    """Coerção para colunas fora do schema: numéricos viram float, demais viram string"""
+    if isinstance(value, str):
+        return value
+    if hasattr(value, '__float__'):
+        return _safe_float(value)
+    return str(value)
+
+
+def _format_competencia(value: Any) -> str:
+    """Formata a competência YYYYMM (como vem do banco) para MM/YYYY; outros formatos passam direto"""
+    raw = str(value)
+    if len(raw) == 6 and raw.isdigit():
+        return f"{raw[4:6]}/{raw[0:4]}"
+    return raw
+
+
+# Tabela de coerção pré-computada a partir do schema: {campo: função}
+_FIELD_COERCERS = {
+    field["name"]: (_safe_float if field["type"] == "float" else str)
+    for field in ZAPT_TECH_SCHEMA["fields"]
+}
+_FIELD_COERCERS["competencia"] = _format_competencia
+
+# Schema Arrow do histórico Parquet (colunas tipadas conforme o schema Zapt Tech).
+# organizationId e schema vão nos metadados do arquivo, que fica autocontido.
+PARQUET_SCHEMA = pa.schema(
+    [
+        (field["name"], pa.float64() if field["type"] == "float" else pa.string())
+        for field in ZAPT_TECH_SCHEMA["fields"]
+    ],
+    metadata={
+        b"organizationId": str(ZAPT_TECH_ORGANIZATION_ID).encode(),
+        b"schema": _ZAPT_TECH_SCHEMA_BYTES
+    }
+)
+
+
+_FLOAT_FIELDS = tuple(
+    field["name"] for field in ZAPT_TECH_SCHEMA["fields"] if field["type"] == "float"
+)
+
+
+def _coerce_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Converte uma linha da query para o formato da API (None é preservado)"""
+    return {
+        key: None if value is None else _FIELD_COERCERS.get(key, _coerce_other)(value)
+        for key, value in row.items()
+    }
+
+
+def _coerce_batch(batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Converte um lote de linhas da query para o formato da API
+
+    Em lotes grandes, as colunas float do schema são convertidas de uma vez com
+    NumPy (Decimal/None -> float64/NaN) em vez de célula a célula; NaN volta a ser
+    None. Se alguma coluna float tiver valor não numérico, usa a conversão por linha.
+
+    Args:
+        batch: Linhas retornadas pelo cursor (dicionários)
+
+    Returns:
+        Lista de itens no formato da API Zapt Tech
+    """
+    if len(batch) < NUMPY_COERCE_MIN_ROWS:
+        return [_coerce_row(row) for row in batch]
+
+    columns = batch[0].keys()
+    float_columns = {}
+
+    try:
+        for field in _FLOAT_FIELDS:
+            if field not in columns:
+                continue
+            values = np.array([row[field] for row in batch], dtype=np.float64)
+            converted = values.astype(object)
+            converted[np.isnan(values)] = None
+            float_columns[field] = converted.tolist()
+    except (TypeError, ValueError):
+        return [_coerce_row(row) for row in batch]
+
+    items = []
+    for index, row in enumerate(batch):
+        item = {}
+        for key, value in row.items():
+            column = float_columns.get(key)
+            if column is not None:
+                item[key] = column[index]
+            else:
+                item[key] = None if value is None else _FIELD_COERCERS.get(key, _coerce_other)(value)
+        items.append(item)
+
+    return items
+
+
+@dataclass(frozen=True)
+class PgCreds:
+    """Credenciais PostgreSQL do Zapt Tech (carregadas dos Secret blocks)"""
+    host: str
+    port: int
+    database: str
+    user: str
+    password: str
+    schema: str
+
+
+@lru_cache(maxsize=32)
+def _load_secret_value(secret_name: str) -> str:
+    """Carrega o valor de um Secret block uma única vez por processo"""
+    return Secret.load(secret_name).get()
+
+
+@lru_cache(maxsize=1)
+def _load_pg_creds() -> PgCreds:
+    """
+    Carrega as credenciais PostgreSQL dos Secret blocks zapt-tech-postgres-*
+
+    Memoizado: shoppings seguintes e retries reutilizam os valores sem novas
+    chamadas à API do Prefect.
+
+    Returns:
+        PgCreds imutável
+    """
+    logger = get_run_logger()
+    logger.info("📦 Carregando credenciais PostgreSQL via Secret blocks...")
+
+    return PgCreds(
+        host=_load_secret_value("zapt-tech-postgres-host"),
+        port=int(_load_secret_value("zapt-tech-postgres-port")),
+        database=_load_secret_value("zapt-tech-postgres-database"),
+        user=_load_secret_value("zapt-tech-postgres-user"),
+        password=_load_secret_value("zapt-tech-postgres-password"),
+        schema=_load_secret_value("zapt-tech-postgres-schema")
+    )
+
+
+def _get_pg_pool() -> ThreadedConnectionPool:
+    """
+    Retorna o pool de conexões PostgreSQL do processo, criando-o na primeira chamada
+
+    As conexões são reaproveitadas entre shoppings e retries.
+
+    Returns:
+        ThreadedConnectionPool compartilhado
+    """
+    global _PG_POOL
+
+    with _PG_POOL_LOCK:
+        if _PG_POOL is None:
+            logger = get_run_logger()
+            creds = _load_pg_creds()
+
+            _PG_POOL = ThreadedConnectionPool(
+                minconn=PG_POOL_MIN_CONN,
+                maxconn=PG_POOL_MAX_CONN,
+                host=creds.host,
+                port=creds.port,
+                database=creds.database,
+                user=creds.user,
+                password=creds.password,
+                options=f"-c search_path={creds.schema}"
+            )
+
+            logger.info("✅ Pool PostgreSQL criado: %s:%s/%s (máx. %s conexões)", creds.host, creds.port, creds.database, PG_POOL_MAX_CONN)
+
+        return _PG_POOL
+
+
+def get_competencia_atual(reference_date: Optional[date] = None) -> str:
+    """
+    Calcula a competência atual (YYYYMM) com a mesma regra da CTE competencia
+
+    Até o dia 10 a competência é a de dois meses atrás; depois, a do mês anterior.
+
+    Args:
+        reference_date: Data de referência (padrão: hoje no relógio local; para
+            casar com a query, passe o CURRENT_DATE do banco)
+
+    Returns:
+        Competência no formato YYYYMM
+    """
+    reference_date = reference_date or date.today()
+    months_back = 2 if reference_date.day <= 10 else 1
+
+    month_index = reference_date.year * 12 + (reference_date.month - 1) - months_back
+    return f"{month_index // 12:04d}{month_index % 12 + 1:02d}"
+
+
+def _query_cache_path(cache_dir: str, sql_query: str, sigla_shopping: str, competencia: str) -> str:
+    """
+    Caminho do cache Parquet de um shopping/competência
+
+    Inclui um hash curto da query e do schema: alterar o SQL (parâmetro do flow)
+    ou o schema Zapt Tech invalida o cache.
+    """
+    query_hash = hashlib.sha1(_ZAPT_TECH_SCHEMA_HASH + sql_query.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(cache_dir, f"zapt_tech_{sigla_shopping}_{competencia}_{query_hash}.parquet")
+
+
+def _read_query_cache(cache_path: str, ttl_hours: float) -> Optional[List[Dict[str, Any]]]:
+    """
+    Lê o cache Parquet se existir e estiver dentro do TTL
+
+    Returns:
+        Itens em cache, ou None se ausente/expirado/ilegível
+    """
+    if ttl_hours <= 0 or not os.path.exists(cache_path):
+        return None
+
+    age_hours = (time.time() - os.path.getmtime(cache_path)) / 3600
+    if age_hours > ttl_hours:
+        return None
+
+    try:
+        return pq.read_table(cache_path).to_pylist()
+    except Exception:
+        return None
+
+
+def _write_query_cache(cache_path: str, items: List[Dict[str, Any]]) -> None:
+    """Grava os itens em Parquet (zstd), via arquivo temporário + rename atômico"""
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+
+    tmp_path = f"{cache_path}.tmp"
+    pq.write_table(pa.Table.from_pylist(items), tmp_path, compression="zstd")
+    os.replace(tmp_path, cache_path)
+
+
+def _check_query_cache(
+        logger,
+        conn,
+        sql_query: str,
+        sigla_shopping: str,
+        cache_dir: str,
+        ttl_hours: float
+) -> Tuple[Optional[str], Optional[List[Dict[str, Any]]]]:
+    """
+    Verifica o cache do shopping na competência atual
+
+    A competência vem do CURRENT_DATE do banco (mesmo relógio da CTE competencia
+    da query), não da data do worker, que pode divergir perto da meia-noite/dia 10.
+
+    Returns:
+        Tupla (caminho do cache ou None se desativado, itens em cache ou None)
+    """
+    if ttl_hours <= 0:
+        return None, None
+
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT CURRENT_DATE")
+        competencia = get_competencia_atual(cursor.fetchone()[0])
+    cache_path = _query_cache_path(cache_dir, sql_query, sigla_shopping, competencia)
+
+    cached_items = _read_query_cache(cache_path, ttl_hours)
+    if cached_items is not None:
+        logger.info("♻️ Cache válido (%s): %d registros de %s", competencia, len(cached_items), cache_path)
+    return cache_path, cached_items
+
+
+def _update_query_cache(logger, cache_path: Optional[str], items: List[Dict[str, Any]]) -> None:
+    """Atualiza o cache (resultado vazio não é cacheado: pode ser carga ainda pendente)"""
+    if not cache_path or not items:
+        return
+    try:
+        _write_query_cache(cache_path, items)
+        logger.info("💾 Cache atualizado: %s", cache_path)
+    except Exception as cache_error:
+        logger.warning("⚠️ Erro ao gravar cache: %s", cache_error)
+
+
 def validate_shopping_sigla(sigla: str) -> bool:
     """
     Valida se a sigla do shopping é válida
 
+    Uso para siglas vindas de entrada externa; as de VALID_SHOPPING_SIGLAS já
+    são validadas no import do módulo.
+
     Args:
         sigla: Sigla do shopping
 
@@ -503,24 +938,107 @@ def validate_shopping_sigla(sigla: str) -> bool:
     Raises:
         ValueError: Se sigla inválida
     """
-    if sigla not in VALID_SHOPPING_SIGLAS:
-        valid_list = ", ".join(VALID_SHOPPING_SIGLAS)
+    if sigla not in _VALID_SHOPPING_SIGLAS_SET:
         raise ValueError(
             f"Sigla de shopping inválida: '{sigla}'. "
-            f"Siglas válidas: {valid_list}"
+            f"Siglas válidas: {_VALID_SHOPPING_SIGLAS_STR}"
         )
     return True
 
 
+def write_payload_stream(items: Iterable[Dict[str, Any]], fp: BinaryIO) -> int:
+    """
+    Grava o payload Zapt Tech em fp, serializando um item por vez
+
+    Produz o mesmo JSON {"organizationId", "schema", "items"} sem montar o
+    documento inteiro em memória: o buffer máximo é o de um único item.
+
+    Args:
+        items: Itens no formato da API (lista ou qualquer iterável)
+        fp: Arquivo aberto em modo binário
+
+    Returns:
+        Quantidade de itens gravados
+    """
+    fp.write(_ZAPT_TECH_PAYLOAD_HEADER)
+    fp.write(b'[')
+
+    count = 0
+    for item in items:
+        fp.write(b'\n' if count == 0 else b',\n')
+        fp.write(orjson.dumps(item, default=_orjson_default, option=ORJSON_ITEM_OPTIONS))
+        count += 1
+
+    fp.write(b'\n]}\n')
+    return count
+
+
+def write_payload_file(filepath: str, items: Iterable[Dict[str, Any]]) -> int:
+    """
+    Grava o payload em filepath de forma atômica (temporário + os.replace)
+
+    A escrita usa buffer de WRITE_BUFFER_SIZE; leitores do arquivo nunca veem
+    um JSON pela metade, e uma falha no meio preserva a versão anterior.
+    Caminhos terminados em .gz são comprimidos com gzip (GZIP_COMPRESS_LEVEL).
+
+    Args:
+        filepath: Caminho final do arquivo JSON (.json ou .json.gz)
+        items: Itens no formato da API
+
+    Returns:
+        Quantidade de itens gravados
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(filepath) or ".", suffix=".tmp")
+
+    try:
+        with os.fdopen(fd, 'wb', buffering=WRITE_BUFFER_SIZE) as f:
+            if filepath.endswith(".gz"):
+                with gzip.GzipFile(fileobj=f, mode='wb', compresslevel=GZIP_COMPRESS_LEVEL) as gz:
+                    count = write_payload_stream(items, gz)
+            else:
+                count = write_payload_stream(items, f)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return count
+
+
+def write_parquet_file(filepath: str, item_batches: List[List[Dict[str, Any]]]) -> None:
+    """
+    Grava os lotes de itens em Parquet+zstd de forma atômica (temporário + os.replace)
+
+    Cada lote vira um row group; o arquivo só aparece no destino quando completo.
+
+    Args:
+        filepath: Caminho final do arquivo Parquet
+        item_batches: Lotes de itens no formato da API
+    """
+    tmp_path = f"{filepath}.tmp"
+
+    try:
+        with pq.ParquetWriter(tmp_path, PARQUET_SCHEMA, compression="zstd", compression_level=3) as writer:
+            for batch in item_batches:
+                if batch:
+                    writer.write_table(pa.Table.from_pylist(batch, schema=PARQUET_SCHEMA))
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
 def format_data_for_zapt_tech_api(
-        data: List[Dict[str, Any]],
+        items: List[Dict[str, Any]],
         sigla_shopping: str
 ) -> Dict[str, Any]:
     """
     Formata os dados no formato esperado pela API Zapt Tech
 
     Args:
-        data: Lista de dicionários com os resultados da query
+        items: Lista de itens já convertidos (execute_query_from_postgres)
         sigla_shopping: Sigla do shopping
 
     Returns:
@@ -528,30 +1046,6 @@ def format_data_for_zapt_tech_api(
     """
     logger = get_run_logger()
 
-    # Converte os resultados para o formato esperado
-    items = []
-    for row in data:
-        # Converte valores None para string ou mantém o tipo
-        item = {}
-        for key, value in row.items():
-            # Converte None para null explicitamente
-            if value is None:
-                item[key] = None
-            # Converte Decimal para float
-            elif hasattr(value, '__float__'):
-                try:
-                    item[key] = float(value)
-                except:
-                    item[key] = str(value)
-            # Mantém strings
-            elif isinstance(value, str):
-                item[key] = value
-            # Converte outros tipos para string
-            else:
-                item[key] = str(value) if value is not None else None
-
-        items.append(item)
-
     # Monta o payload no formato esperado
     payload = {
         "organizationId": ZAPT_TECH_ORGANIZATION_ID,
@@ -559,101 +1053,186 @@ def format_data_for_zapt_tech_api(
         "items": items
     }
 
-    logger.info(f"📦 Payload formatado:")
-    logger.info(f"   🏢 Organization ID: {ZAPT_TECH_ORGANIZATION_ID}")
-    logger.info(f"   📋 Schema: {ZAPT_TECH_SCHEMA['name']}")
-    logger.info(f"   📊 Items: {len(items)}")
-    logger.info(f"   🏬 Shopping: {sigla_shopping}")
+    logger.info("📦 Payload formatado:")
+    logger.info("   🏢 Organization ID: %s", ZAPT_TECH_ORGANIZATION_ID)
+    logger.info("   📋 Schema: %s", ZAPT_TECH_SCHEMA['name'])
+    logger.info("   📊 Items: %s", len(items))
+    logger.info("   🏬 Shopping: %s", sigla_shopping)
 
     return payload
 
 
+@task(cache_policy=NO_CACHE)
+def ensure_required_indexes() -> int:
+    """
+    Garante os índices de REQUIRED_INDEXES no PostgreSQL (uma vez por processo)
+
+    Usa CREATE INDEX CONCURRENTLY IF NOT EXISTS (em autocommit, sem bloquear
+    escritas). Índice deixado INVALID por um build interrompido é removido e
+    recriado; só contam como garantidos os que terminam válidos (pg_index.indisvalid).
+    Falhas (ex: usuário sem permissão) são apenas registradas: a query continua
+    funcionando, só que sem os index-only scans.
+
+    Returns:
+        Quantidade de índices válidos ao final
+    """
+    global _INDEXES_ENSURED
+
+    logger = get_run_logger()
+
+    if _INDEXES_ENSURED:
+        logger.info("📇 Índices já verificados neste processo")
+        return 0
+
+    pool = _get_pg_pool()
+    conn = pool.getconn()
+    valid = 0
+
+    def index_state(cursor, index_name: str) -> Optional[bool]:
+        cursor.execute(_INDEX_VALID_SQL, (index_name,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    try:
+        # CREATE/DROP INDEX CONCURRENTLY não podem rodar dentro de transação
+        conn.autocommit = True
+
+        with conn.cursor() as cursor:
+            for index_name, index_sql in REQUIRED_INDEXES.items():
+                try:
+                    if index_state(cursor, index_name) is False:
+                        logger.warning("⚠️ Índice %s INVALID (build interrompido): recriando", index_name)
+                        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}")
+
+                    cursor.execute(index_sql)
+
+                    if index_state(cursor, index_name):
+                        valid += 1
+                    else:
+                        logger.warning("⚠️ Índice %s não ficou válido", index_name)
+                except Exception as index_error:
+                    logger.warning("⚠️ Não foi possível garantir índice %s: %s", index_name, index_error)
+
+        logger.info("📇 Índices válidos: %s/%s", valid, len(REQUIRED_INDEXES))
+        # Com algum índice faltando/inválido, a próxima execução tenta de novo
+        _INDEXES_ENSURED = valid == len(REQUIRED_INDEXES)
+        return valid
+
+    finally:
+        conn.autocommit = False
+        pool.putconn(conn)
+
+
 @task(cache_policy=NO_CACHE, retries=2, retry_delay_seconds=30)
 def execute_query_from_postgres(
         sql_query: str,
-        sigla_shopping: str
+        sigla_shopping: str,
+        cache_ttl_hours: float = QUERY_CACHE_TTL_HOURS,
+        cache_dir: str = QUERY_CACHE_DIR
 ) -> List[Dict[str, Any]]:
     """
     Conecta no PostgreSQL usando blocks nativos (Secret/String) e executa a query
 
+    Os resultados são lidos em lotes via cursor server-side e convertidos para o
+    formato da API à medida que chegam, sem manter as linhas brutas em memória.
+
+    Opcionalmente (cache_ttl_hours > 0) o resultado do shopping na competência
+    atual é mantido em cache Parquet: re-execuções na mesma janela não consultam o
+    banco. Desativado por padrão, já que o cache só expira por idade.
+
     Args:
         sql_query: Query SQL a ser executada
         sigla_shopping: Sigla do shopping para substituir na query
+        cache_ttl_hours: Validade do cache em horas (default: 0, cache desativado)
+        cache_dir: Diretório dos arquivos de cache
 
     Returns:
-        Lista de dicionários com os resultados
+        Lista de itens no formato da API Zapt Tech
     """
     logger = get_run_logger()
+    pool = None
+    conn = None
 
     try:
-        # Carrega credenciais usando APENAS Secret
-        from prefect.blocks.system import Secret
-
-        logger.info(f"📦 Carregando credenciais PostgreSQL via Secret blocks...")
-
-        # Carrega credenciais individuais (TODOS Secret)
-        host = Secret.load("zapt-tech-postgres-host").get()
-        port = int(Secret.load("zapt-tech-postgres-port").get())
-        database = Secret.load("zapt-tech-postgres-database").get()
-        user = Secret.load("zapt-tech-postgres-user").get()
-        password = Secret.load("zapt-tech-postgres-password").get()
-        schema = Secret.load("zapt-tech-postgres-schema").get()
-
-        logger.info(f"✅ Credenciais carregadas: {host}:{port}/{database}")
-        logger.info(f"🏬 Shopping: {sigla_shopping}")
-
-        # Substitui placeholders na query
-        formatted_query = format_query_with_params(sql_query, sigla_shopping=sigla_shopping)
-
-        logger.info(f"📝 Query formatada (primeiros 300 caracteres):")
-        logger.info(f"{formatted_query[:300]}...")
-
-        # Conecta no banco usando psycopg2
-        import psycopg2
-        conn = psycopg2.connect(
-            host=host,
-            port=port,
-            database=database,
-            user=user,
-            password=password,
-            options=f"-c search_path={schema}"
+        logger.info("🏬 Shopping: %s", sigla_shopping)
+
+        # Obtém conexão do pool do processo (sem novo handshake a cada shopping)
+        pool = _get_pg_pool()
+        conn = pool.getconn()
+
+        # Verifica cache do shopping na competência atual
+        cache_path, cached_items = _check_query_cache(
+            logger, conn, sql_query, sigla_shopping, cache_dir, cache_ttl_hours
         )
+        if cached_items is not None:
+            pool.putconn(conn)
+            conn = None
+            return cached_items
+
+        # Sigla vinculada como parâmetro (%(sigla_shopping)s): o texto da query é o mesmo
+        # para todos os shoppings. Queries no formato legado {sigla_shopping} são formatadas.
+        if LEGACY_SIGLA_PLACEHOLDER in sql_query:
+            formatted_query = format_query_with_params(sql_query, sigla_shopping=sigla_shopping)
+            query_params = None
+        else:
+            formatted_query = sql_query
+            query_params = {"sigla_shopping": sigla_shopping}
+
+        # Prévia da query apenas em DEBUG (evita fatiar a query inteira a cada execução)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("📝 Query (primeiros 300 caracteres):\n%s...", formatted_query[:300])
 
         # Executa a query
         logger.info("⚡ Executando query no PostgreSQL...")
         start_time = time.time()
 
-        results = execute_query(conn, formatted_query)
+        items = []
+        for batch in iter_query_batches(conn, formatted_query, query_params, batch_size=QUERY_BATCH_SIZE, cursor_name="zapt_tech_stream"):
+            items.extend(_coerce_batch(batch))
 
         execution_time = time.time() - start_time
 
-        logger.info(f"✅ Query executada com sucesso!")
-        logger.info(f"   📊 Registros retornados: {len(results):,}")
-        logger.info(f"   ⏱️ Tempo de execução: {execution_time:.2f}s")
+        logger.info("✅ Query executada com sucesso!")
+        logger.info("   📊 Registros retornados: %d", len(items))
+        logger.info("   ⏱️ Tempo de execução: %.2fs", execution_time)
+
+        # Devolve a conexão ao pool (o pool faz rollback da transação de leitura)
+        pool.putconn(conn)
+        conn = None
 
-        # Fecha conexão
-        close_postgresql_connection(conn)
+        _update_query_cache(logger, cache_path, items)
 
-        return results
+        return items
 
     except Exception as e:
-        logger.error(f"❌ Erro ao executar query: {str(e)}")
+        logger.error("❌ Erro ao executar query: %s", e)
+        # Conexão possivelmente inválida: descarta em vez de devolver ao pool
+        if pool and conn:
+            pool.putconn(conn, close=True)
         raise
 
 
 @task(cache_policy=NO_CACHE)
 def save_results_to_json(
-        payload: Dict[str, Any],
+        item_batches: List[List[Dict[str, Any]]],
         sigla_shopping: str,
-        output_dir: str = "flows/zapt_tech/output"
+        output_dir: str = OUTPUT_DIR,
+        gzip_latest: bool = False
 ) -> Dict[str, Any]:
     """
-    Salva payload formatado em arquivo JSON local
+    Salva payload formatado localmente
+
+    O histórico (arquivo com timestamp) é gravado em Parquet+zstd, bem menor que
+    JSON; o arquivo "latest" continua em JSON, pronto para envio à API.
+
+    Os itens chegam em lotes (um por shopping) e são gravados lote a lote, sem
+    concatenar tudo em uma única lista.
 
     Args:
-        payload: Payload formatado no padrão Zapt Tech (organizationId, schema, items)
+        item_batches: Lotes de itens no formato da API (ex: um por shopping)
         sigla_shopping: Sigla do shopping
         output_dir: Diretório de saída (padrão: flows/zapt_tech/output)
+        gzip_latest: Se deve gravar o latest comprimido (.json.gz)
 
     Returns:
         Informações sobre o arquivo salvo
@@ -662,26 +1241,23 @@ def save_results_to_json(
 
     try:
         # Cria diretório de output se não existir
-        import os
-        from datetime import datetime
-
         os.makedirs(output_dir, exist_ok=True)
 
-        items_count = len(payload.get("items", []))
-        logger.info(f"💾 Salvando {items_count:,} registros em arquivo JSON...")
-        logger.info(f"   🏢 Organization ID: {payload.get('organizationId')}")
-        logger.info(f"   📋 Schema: {payload.get('schema', {}).get('name')}")
-        logger.info(f"   🏬 Shopping: {sigla_shopping}")
+        items_count = sum(len(batch) for batch in item_batches)
+        logger.info("💾 Salvando %d registros (Parquet + JSON latest)...", items_count)
+        logger.info("   🏢 Organization ID: %s", ZAPT_TECH_ORGANIZATION_ID)
+        logger.info("   📋 Schema: %s", ZAPT_TECH_SCHEMA['name'])
+        logger.info("   🏬 Shopping: %s", sigla_shopping)
 
         # Nome do arquivo com timestamp
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"zapt_tech_{sigla_shopping}_{timestamp}.json"
+        filename = f"zapt_tech_{sigla_shopping}_{timestamp}.parquet"
         filepath = os.path.join(output_dir, filename)
 
-        # Salva JSON formatado (com indentação)
+        # Histórico colunar comprimido
         start_time = time.time()
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(payload, f, indent=2, ensure_ascii=False)
+
+        write_parquet_file(filepath, item_batches)
 
         save_time = time.time() - start_time
 
@@ -689,53 +1265,46 @@ def save_results_to_json(
         file_size = os.path.getsize(filepath)
         file_size_mb = file_size / (1024 * 1024)
 
-        logger.info(f"✅ Arquivo salvo com sucesso!")
-        logger.info(f"   📁 Arquivo: {filepath}")
-        logger.info(f"   📊 Tamanho: {file_size_mb:.2f} MB")
-        logger.info(f"   ⏱️ Tempo: {save_time:.2f}s")
+        logger.info("✅ Arquivo salvo com sucesso!")
+        logger.info("   📁 Arquivo: %s", filepath)
+        logger.info("   📊 Tamanho: %.2f MB", file_size_mb)
+        logger.info("   ⏱️ Tempo: %.2fs", save_time)
 
-        # Também salva um arquivo "latest" para acesso fácil
-        latest_filename = f"zapt_tech_{sigla_shopping}_latest.json"
+        # Arquivo "latest" em JSON (formato da API), serializado item a item
+        latest_filename = f"zapt_tech_{sigla_shopping}_latest.json" + (".gz" if gzip_latest else "")
         latest_filepath = os.path.join(output_dir, latest_filename)
 
-        with open(latest_filepath, 'w', encoding='utf-8') as f:
-            json.dump(payload, f, indent=2, ensure_ascii=False)
+        write_payload_file(latest_filepath, chain.from_iterable(item_batches))
 
-        logger.info(f"   📌 Cópia salva: {latest_filepath}")
+        logger.info("   📌 JSON latest: %s", latest_filepath)
 
-        # Cria artifact com JSON COMPLETO (sempre o mesmo nome = sobrescreve)
+        # Cria artifact com resumo + amostra dos itens (sempre o mesmo nome = sobrescreve)
         try:
-            from prefect.artifacts import create_markdown_artifact
-
-            # JSON COMPLETO formatado
-            full_json = json.dumps(payload, indent=2, ensure_ascii=False)
-
-            markdown_content = f"""
-# 📊 Zapt Tech - JSON Completo
-
-**Total de registros:** {items_count:,}
-**Tamanho:** {file_size_mb:.2f} MB
-**Shopping:** {sigla_shopping}
-
----
-
-## 📋 JSON Completo
-
-```json
-{full_json}
-```
-"""
+            # Amostra: apenas os primeiros ARTIFACT_PREVIEW_ITEMS itens são serializados
+            preview_items = list(islice(chain.from_iterable(item_batches), ARTIFACT_PREVIEW_ITEMS))
+            preview_json = orjson.dumps(
+                preview_items, default=_orjson_default, option=orjson.OPT_INDENT_2 | ORJSON_ITEM_OPTIONS
+            ).decode("utf-8")
+
+            markdown_content = ARTIFACT_MARKDOWN_TEMPLATE.format_map({
+                "items_count": items_count,
+                "file_size_mb": file_size_mb,
+                "sigla_shopping": sigla_shopping,
+                "latest_filepath": latest_filepath,
+                "preview_count": len(preview_items),
+                "preview_json": preview_json
+            })
 
             create_markdown_artifact(
                 key="zapt-tech-json-data",
                 markdown=markdown_content,
-                description=f"JSON Completo - {items_count:,} registros"
+                description=f"Resumo e amostra - {items_count:,} registros"
             )
 
-            logger.info("✅ Artifact criado com JSON completo")
+            logger.info("✅ Artifact criado com resumo e amostra")
 
         except Exception as artifact_error:
-            logger.warning(f"⚠️ Erro ao criar artifact: {artifact_error}")
+            logger.warning("⚠️ Erro ao criar artifact: %s", artifact_error)
 
         return {
             "status": "saved",
@@ -747,23 +1316,159 @@ def save_results_to_json(
         }
 
     except Exception as e:
-        logger.error(f"❌ Erro ao salvar arquivo: {str(e)}")
+        logger.error("❌ Erro ao salvar arquivo: %s", e)
         raise
 
 
-@task(cache_policy=NO_CACHE, retries=3, retry_delay_seconds=10)
+def _create_api_session(pool_size: int) -> requests.Session:
+    """
+    Cria sessão HTTP com pool de conexões e retry automático (falha de conexão/429)
+
+    Só repete o que o servidor não processou: erro ao conectar e HTTP 429 (o
+    retry respeita o header Retry-After e aplica backoff exponencial com
+    jitter). 5xx e timeout de leitura ficam com _post_chunk_with_retry, que
+    reenvia apenas o bloco que falhou.
+
+    Args:
+        pool_size: Conexões mantidas no pool (= envios simultâneos)
+
+    Returns:
+        requests.Session configurada
+    """
+    retry = Retry(
+        total=API_MAX_RETRIES,
+        read=0,
+        backoff_factor=API_RETRY_BACKOFF,
+        backoff_jitter=API_RETRY_JITTER,
+        status_forcelist=API_RETRY_STATUS,
+        allowed_methods=["POST"],
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _iter_item_chunks(items: List[Dict[str, Any]], chunk_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Divide a lista de itens em blocos de até chunk_size itens"""
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _payload_body_header(payload: Dict[str, Any]) -> bytes:
+    """
+    Início do corpo JSON de cada bloco: organizationId + schema + '"items":'
+
+    Usa os bytes pré-computados quando o payload usa os padrões; senão serializa
+    uma vez por envio (não a cada bloco).
+    """
+    organization_id = payload.get("organizationId")
+    schema = payload.get("schema")
+    if organization_id == ZAPT_TECH_ORGANIZATION_ID and schema == ZAPT_TECH_SCHEMA:
+        return _ZAPT_TECH_PAYLOAD_HEADER
+    return (
+        b'{"organizationId":' + orjson.dumps(organization_id)
+        + b',"schema":' + orjson.dumps(schema) + b',"items":'
+    )
+
+
+def _post_chunk(
+        session: requests.Session,
+        api_url: str,
+        headers: Dict[str, str],
+        body_header: bytes,
+        chunk: List[Dict[str, Any]],
+        gzip_body: bool = False
+) -> Dict[str, Any]:
+    """
+    Envia um bloco de itens para a API (POST)
+
+    O corpo é codificado com orjson (em vez do json= do requests); só os itens
+    são serializados. Com gzip_body, corpos maiores que API_GZIP_MIN_BYTES são
+    comprimidos.
+
+    Returns:
+        Dict com status_code e response (JSON, ou início do texto se não for JSON)
+    """
+    body = body_header + orjson.dumps(chunk, default=_orjson_default, option=ORJSON_ITEM_OPTIONS) + b'}'
+
+    if gzip_body and len(body) > API_GZIP_MIN_BYTES:
+        body = gzip.compress(body, compresslevel=GZIP_COMPRESS_LEVEL)
+        headers = {**headers, "Content-Encoding": "gzip"}
+
+    response = session.post(api_url, data=body, headers=headers, timeout=API_TIMEOUT)
+    response.raise_for_status()  # Lança exceção se status code não for 2xx
+
+    try:
+        response_data = orjson.loads(response.content)
+    except orjson.JSONDecodeError:
+        response_data = response.text[:200]
+
+    return {"status_code": response.status_code, "response": response_data}
+
+
+def _post_chunk_with_retry(
+        logger,
+        session: requests.Session,
+        api_url: str,
+        headers: Dict[str, str],
+        body_header: bytes,
+        chunk: List[Dict[str, Any]],
+        gzip_body: bool = False
+) -> Dict[str, Any]:
+    """
+    Envia um bloco, reenviando só ele em caso de 5xx ou erro de rede
+
+    Até API_MAX_RETRIES novas tentativas, com backoff exponencial e jitter.
+    Erros 4xx (exceto 429, já repetido pela sessão) não são repetidos.
+    """
+    for attempt in range(API_MAX_RETRIES + 1):
+        try:
+            return _post_chunk(session, api_url, headers, body_header, chunk, gzip_body)
+        except requests.RequestException as error:
+            status = error.response.status_code if error.response is not None else None
+            if attempt == API_MAX_RETRIES or (status is not None and status < 500):
+                raise
+            delay = API_RETRY_BACKOFF * 2 ** attempt + random.uniform(0, API_RETRY_JITTER)
+            logger.warning("⚠️ Bloco falhou (%s): nova tentativa em %.1fs", status or error, delay)
+            time.sleep(delay)
+
+
+@task(cache_policy=NO_CACHE)
 def send_results_to_api(
         api_url_block: str,
         api_key_block: str,
-        payload: Dict[str, Any]
+        payload: Dict[str, Any],
+        chunk_size: int = API_CHUNK_SIZE,
+        max_workers: int = API_MAX_WORKERS,
+        gzip_body: bool = False
 ) -> Dict[str, Any]:
     """
     Envia payload formatado para API usando blocks do Prefect
 
+    Os itens são divididos em blocos de chunk_size e enviados em paralelo
+    (max_workers POSTs simultâneos), cada bloco com organizationId e schema.
+    Com gzip_body, blocos maiores que API_GZIP_MIN_BYTES são comprimidos.
+
+    Sem retries na task: um retry reenviaria todos os blocos, inclusive os já
+    aceitos. Cada bloco que falha é reenviado sozinho (_post_chunk_with_retry).
+    Payload sem itens ainda envia uma requisição (com "items": []).
+
     Args:
         api_url_block: Nome do block String com URL da API
         api_key_block: Nome do block Secret com API Key (opcional)
         payload: Payload formatado no padrão Zapt Tech (organizationId, schema, items)
+        chunk_size: Itens por requisição
+        max_workers: Requisições simultâneas
+        gzip_body: Se deve comprimir corpos grandes (a API precisa aceitar Content-Encoding: gzip)
 
     Returns:
         Resposta da API
@@ -771,76 +1476,200 @@ def send_results_to_api(
     logger = get_run_logger()
 
     try:
-        # Carrega blocks usando APENAS Secret
-        from prefect.blocks.system import Secret
-
-        logger.info(f"📦 Carregando blocks da API...")
+        logger.info("📦 Carregando blocks da API...")
 
-        # Carrega URL da API (Secret)
-        api_url = Secret.load(api_url_block).get()
-        logger.info(f"🌐 API URL: {api_url}")
+        # Carrega URL da API (Secret, memoizado no processo)
+        api_url = _load_secret_value(api_url_block)
+        logger.info("🌐 API URL: %s", api_url)
 
         # Carrega API Key (opcional)
         try:
-            api_key = Secret.load(api_key_block).get()
-        except:
+            api_key = _load_secret_value(api_key_block)
+        except Exception:
             api_key = None
             logger.info("🔑 API Key não configurada (opcional)")
 
-        items_count = len(payload.get("items", []))
-        logger.info(f"📤 Enviando {items_count:,} registros para API...")
-        logger.info(f"   🏢 Organization ID: {payload.get('organizationId')}")
-        logger.info(f"   📋 Schema: {payload.get('schema', {}).get('name')}")
+        items = payload.get("items", [])
+        items_count = len(items)
+        # Sem itens: um único POST com "items": [] (mesmo comportamento do envio sem blocos)
+        chunks = list(_iter_item_chunks(items, chunk_size)) or [[]]
+
+        logger.info("📤 Enviando %d registros para API...", items_count)
+        logger.info("   🏢 Organization ID: %s", payload.get('organizationId'))
+        logger.info("   📋 Schema: %s", payload.get('schema', {}).get('name'))
+        logger.info("   📦 Blocos: %s x até %d itens (%s simultâneos)", len(chunks), chunk_size, max_workers)
 
         # Prepara headers
         headers = {"Content-Type": "application/json"}
         if api_key:
             headers["Authorization"] = f"Bearer {api_key}"
 
-        # Envia para API usando requests
-        import requests
+        session = _create_api_session(max_workers)
+        body_header = _payload_body_header(payload)
 
         start_time = time.time()
-        response = requests.post(
-            api_url,
-            json=payload,
-            headers=headers,
-            timeout=60
-        )
-        send_time = time.time() - start_time
 
-        response.raise_for_status()  # Lança exceção se status code não for 2xx
+        try:
+            # POSTs em paralelo; o log de cada bloco fica na thread da task, em ordem
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = [
+                    executor.submit(_post_chunk_with_retry, logger, session, api_url, headers, body_header, chunk, gzip_body)
+                    for chunk in chunks
+                ]
+                chunk_results = []
+                for index, (future, chunk) in enumerate(zip(futures, chunks), start=1):
+                    chunk_results.append(future.result())
+                    logger.info(
+                        "   ✅ Bloco %s/%s: %d itens (HTTP %s)",
+                        index, len(chunks), len(chunk), chunk_results[-1]["status_code"]
+                    )
+        finally:
+            session.close()
+
+        send_time = time.time() - start_time
 
-        logger.info(f"✅ Dados enviados com sucesso!")
-        logger.info(f"   📊 Status HTTP: {response.status_code}")
-        logger.info(f"   ⏱️ Tempo de envio: {send_time:.2f}s")
+        logger.info("✅ Dados enviados com sucesso!")
+        logger.info("   📊 Blocos enviados: %s", len(chunk_results))
+        logger.info("   ⏱️ Tempo de envio: %.2fs", send_time)
 
-        try:
-            response_data = response.json()
-            logger.info(f"   📥 Resposta: {json.dumps(response_data, indent=2)[:200]}...")
-        except:
-            response_data = response.text[:200]
-            logger.info(f"   📥 Resposta (texto): {response_data}...")
+        response_data = [result["response"] for result in chunk_results]
+        # reprlib limita o tamanho sem serializar a resposta inteira
+        logger.info("   📥 Resposta: %s", reprlib.repr(response_data))
 
         return {
-            "status_code": response.status_code,
+            "status_code": chunk_results[-1]["status_code"],
             "response": response_data,
             "send_time_seconds": send_time,
-            "items_sent": items_count
+            "items_sent": items_count,
+            "chunks_sent": len(chunk_results)
         }
 
     except Exception as e:
-        logger.error(f"❌ Erro ao enviar para API: {str(e)}")
+        logger.error("❌ Erro ao enviar para API: %s", e)
         raise
 
 
-@flow(log_prints=True, name="zapt-tech-all-shoppings")
+def _collect_shopping_results(logger, futures: Dict[str, Any]) -> Tuple[List[List[Dict[str, Any]]], List[Dict[str, Any]]]:
+    """
+    Aguarda a query de cada shopping (na ordem original) e formata os itens
+
+    Erro em um shopping é registrado no resumo sem interromper os demais.
+
+    Args:
+        logger: Logger do Prefect
+        futures: {sigla: future de execute_query_from_postgres}
+
+    Returns:
+        Tupla (lotes de itens dos shoppings com sucesso, resumo por shopping)
+    """
+    # Itens de cada shopping (um lote por shopping, sem concatenar em uma lista única)
+    item_batches = []
+    results_summary = []
+
+    for sigla, future in futures.items():
+        logger.info("\n" + "=" * 80)
+        logger.info("🏬 Processando shopping: %s", sigla)
+        logger.info("=" * 80)
+
+        try:
+            # Aguarda a query do shopping (itens já convertidos) e formata os dados
+            payload = format_data_for_zapt_tech_api(future.result(), sigla)
+
+            # Adiciona o lote do shopping ao consolidado
+            items = payload.get("items", [])
+            item_batches.append(items)
+
+            logger.info("✅ Shopping %s: %d registros coletados", sigla, len(items))
+            results_summary.append({
+                "shopping": sigla,
+                "status": "success",
+                "records": len(items)
+            })
+
+        except Exception as e:
+            logger.error("❌ Erro ao processar shopping %s: %s", sigla, e)
+            results_summary.append({
+                "shopping": sigla,
+                "status": "error",
+                "error": str(e)
+            })
+
+    return item_batches, results_summary
+
+
+def _send_consolidated_alert(
+        logger,
+        results_summary: List[Dict[str, Any]],
+        total_items: int,
+        duration: float,
+        api_url_block: str,
+        alert_group_id: Optional[str] = None
+) -> None:
+    """
+    Envia o alerta consolidado da execução: sucesso se todos os shoppings
+    foram processados, senão erro com o detalhe de cada shopping que falhou
+
+    Falha no envio do alerta só gera warning (não interrompe o flow).
+    """
+    errors = [r for r in results_summary if r['status'] == 'error']
+    success_count = len(results_summary) - len(errors)
+
+    try:
+        try:
+            context = get_run_context()
+            job_id = str(context.flow_run.id) if hasattr(context, 'flow_run') else None
+        except Exception:
+            job_id = None
+
+        if not errors:
+            # Todos os shoppings processados com sucesso
+            send_flow_success_alert(
+                flow_name="Zapt Tech - Todos Shoppings",
+                source="PostgreSQL",
+                destination=f"API ({api_url_block})",
+                summary={
+                    "shoppings_processed": success_count,
+                    "total_records": total_items,
+                    "shoppings": _VALID_SHOPPING_SIGLAS_STR
+                },
+                duration_seconds=duration,
+                job_id=job_id,
+                group_id=alert_group_id
+            )
+            logger.info("✅ Alerta consolidado de sucesso enviado")
+        else:
+            # Houve erros em alguns shoppings
+            errors_detail = "\n".join([
+                f"- {r['shopping']}: {r.get('error', 'Erro desconhecido')}"
+                for r in errors
+            ])
+
+            send_flow_error_alert(
+                flow_name="Zapt Tech - Todos Shoppings",
+                source="PostgreSQL",
+                destination=f"API ({api_url_block})",
+                error_message=f"{len(errors)} shopping(s) com erro:\n{errors_detail}",
+                duration_seconds=duration,
+                job_id=job_id,
+                group_id=alert_group_id
+            )
+            logger.info("✅ Alerta consolidado de erro enviado")
+
+    except Exception as alert_error:
+        logger.warning("⚠️ Erro ao enviar alerta consolidado: %s", alert_error)
+
+
+@flow(log_prints=True, name="zapt-tech-all-shoppings", task_runner=ThreadPoolTaskRunner(max_workers=PG_POOL_MAX_CONN))
 def zapt_tech_to_api_all_shoppings(
         sql_query: str = DEFAULT_SQL_QUERY,
         api_url_block: str = "zapt-tech-api-url",
         api_key_block: str = "zapt-tech-api-key",
         send_alerts: bool = True,
-        alert_group_id: Optional[str] = None
+        alert_group_id: Optional[str] = None,
+        ensure_indexes: bool = False,
+        cache_ttl_hours: float = QUERY_CACHE_TTL_HOURS,
+        cache_dir: str = QUERY_CACHE_DIR,
+        gzip_latest: bool = False
 ):
     """
     Flow Principal: Executa coleta para TODOS os shoppings e gera UM ÚNICO JSON
@@ -853,6 +1682,14 @@ def zapt_tech_to_api_all_shoppings(
         api_key_block: Nome do block Secret com API Key
         send_alerts: Se deve enviar alertas
         alert_group_id: ID do grupo para alertas
+        ensure_indexes: Se deve criar os índices de REQUIRED_INDEXES antes das queries
+            (CREATE INDEX CONCURRENTLY nas tabelas fato; a primeira execução do processo
+            aguarda os builds) (default: False)
+        cache_ttl_hours: Validade do cache de resultados por shopping/competência
+            (default: 0, desativado; o cache só expira por idade, não por mudança na origem)
+        cache_dir: Diretório dos resultados intermediários por shopping (Parquet); re-execuções
+            e retries dentro do TTL recarregam daqui em vez de consultar o banco
+        gzip_latest: Se deve gravar o JSON latest comprimido (.json.gz)
     """
     logger = get_run_logger()
     start_time = time.time()
@@ -860,145 +1697,67 @@ def zapt_tech_to_api_all_shoppings(
     logger.info("=" * 80)
     logger.info("🚀 ZAPT TECH -> JSON CONSOLIDADO | TODOS OS SHOPPINGS")
     logger.info("=" * 80)
-    logger.info(f"📋 Shoppings a processar: {', '.join(VALID_SHOPPING_SIGLAS)}")
-    logger.info(f"🔢 Total de shoppings: {len(VALID_SHOPPING_SIGLAS)}")
+    logger.info("📋 Shoppings a processar: %s", _VALID_SHOPPING_SIGLAS_STR)
+    logger.info("🔢 Total de shoppings: %s", len(VALID_SHOPPING_SIGLAS))
     logger.info("=" * 80)
 
-    # Array consolidado com items de TODOS os shoppings
-    all_items = []
-    results_summary = []
-    success_count = 0
-    error_count = 0
-
-    # Processa cada shopping individualmente
-    for sigla in VALID_SHOPPING_SIGLAS:
-        logger.info(f"\n{'=' * 80}")
-        logger.info(f"🏬 Processando shopping: {sigla}")
-        logger.info(f"{'=' * 80}")
-
+    # Garante índices das tabelas fato (no-op se já existirem)
+    if ensure_indexes:
         try:
-            # Valida sigla
-            validate_shopping_sigla(sigla)
-
-            # Executa query para o shopping
-            results = execute_query_from_postgres(
-                sql_query,
-                sigla
-            )
-
-            # Formata dados
-            payload = format_data_for_zapt_tech_api(results, sigla)
-
-            # Adiciona items ao array consolidado
-            items = payload.get("items", [])
-            all_items.extend(items)
+            ensure_required_indexes()
+        except Exception as index_error:
+            logger.warning("⚠️ Erro ao verificar índices: %s", index_error)
 
-            logger.info(f"✅ Shopping {sigla}: {len(items):,} registros coletados")
+    # Dispara as queries de todos os shoppings em paralelo
+    # (concorrência limitada pelo task runner ao tamanho do pool PostgreSQL)
+    futures = {}
+    for sigla in VALID_SHOPPING_SIGLAS:
+        futures[sigla] = execute_query_from_postgres.submit(sql_query, sigla, cache_ttl_hours, cache_dir)
 
-            results_summary.append({
-                "shopping": sigla,
-                "status": "success",
-                "records": len(items)
-            })
-            success_count += 1
-
-        except Exception as e:
-            logger.error(f"❌ Erro ao processar shopping {sigla}: {str(e)}")
-            results_summary.append({
-                "shopping": sigla,
-                "status": "error",
-                "error": str(e)
-            })
-            error_count += 1
+    # Coleta os resultados de cada shopping, na ordem original
+    item_batches, results_summary = _collect_shopping_results(logger, futures)
+    total_items = sum(len(items) for items in item_batches)
+    success_count = len(item_batches)
+    error_count = len(results_summary) - success_count
 
     # Cria payload consolidado com TODOS os items
-    logger.info(f"\n{'=' * 80}")
+    logger.info("\n" + "=" * 80)
     logger.info("📦 CONSOLIDANDO DADOS")
-    logger.info(f"{'=' * 80}")
-
-    consolidated_payload = {
-        "organizationId": ZAPT_TECH_ORGANIZATION_ID,
-        "schema": ZAPT_TECH_SCHEMA,
-        "items": all_items
-    }
+    logger.info("=" * 80)
 
-    logger.info(f"✅ Total de registros consolidados: {len(all_items):,}")
-    logger.info(f"   📊 Shoppings incluídos: {success_count}")
+    logger.info("✅ Total de registros consolidados: %d", total_items)
+    logger.info("   📊 Shoppings incluídos: %s", success_count)
 
-    # Salva JSON consolidado
-    logger.info(f"\n{'=' * 80}")
-    logger.info("💾 SALVANDO JSON CONSOLIDADO")
-    logger.info(f"{'=' * 80}")
+    # Salva dados consolidados (histórico Parquet + JSON latest)
+    logger.info("\n" + "=" * 80)
+    logger.info("💾 SALVANDO DADOS CONSOLIDADOS")
+    logger.info("=" * 80)
 
     save_response = save_results_to_json(
-        consolidated_payload,
+        item_batches,
         sigla_shopping="ALL",  # Identificador especial para arquivo consolidado
-        output_dir="flows/zapt_tech/output"
+        output_dir=OUTPUT_DIR,
+        gzip_latest=gzip_latest
     )
 
     # Resumo final
-    logger.info(f"\n{'=' * 80}")
+    logger.info("\n" + "=" * 80)
     logger.info("📊 RESUMO GERAL")
-    logger.info(f"{'=' * 80}")
+    logger.info("=" * 80)
 
     duration = time.time() - start_time
 
-    logger.info(f"✅ Shoppings processados com sucesso: {success_count}")
-    logger.info(f"❌ Shoppings com erro: {error_count}")
-    logger.info(f"📊 Total de registros: {len(all_items):,}")
-    logger.info(f"💾 Arquivo JSON: {save_response['filepath']}")
-    logger.info(f"📌 Acesso rápido: {save_response['latest_filepath']}")
-    logger.info(f"⏱️ Duração total: {duration:.2f}s")
-    logger.info(f"{'=' * 80}\n")
+    logger.info("✅ Shoppings processados com sucesso: %s", success_count)
+    logger.info("❌ Shoppings com erro: %s", error_count)
+    logger.info("📊 Total de registros: %d", total_items)
+    logger.info("💾 Histórico Parquet: %s", save_response['filepath'])
+    logger.info("📌 Acesso rápido: %s", save_response['latest_filepath'])
+    logger.info("⏱️ Duração total: %.2fs", duration)
+    logger.info("=" * 80 + "\n")
 
     # Envia alerta consolidado
     if send_alerts:
-        try:
-            from prefect.context import get_run_context
-            try:
-                context = get_run_context()
-                job_id = str(context.flow_run.id) if hasattr(context, 'flow_run') else None
-            except Exception:
-                job_id = None
-
-            if error_count == 0:
-                # Todos os shoppings processados com sucesso
-                total_records = sum(r.get("records", 0) for r in results_summary if r["status"] == "success")
-
-                send_flow_success_alert(
-                    flow_name="Zapt Tech - Todos Shoppings",
-                    source="PostgreSQL",
-                    destination=f"API ({api_url_block})",
-                    summary={
-                        "shoppings_processed": success_count,
-                        "total_records": total_records,
-                        "shoppings": ", ".join(VALID_SHOPPING_SIGLAS)
-                    },
-                    duration_seconds=duration,
-                    job_id=job_id,
-                    group_id=alert_group_id
-                )
-                logger.info("✅ Alerta consolidado de sucesso enviado")
-            else:
-                # Houve erros em alguns shoppings
-                errors_detail = "\n".join([
-                    f"- {r['shopping']}: {r.get('error', 'Erro desconhecido')}"
-                    for r in results_summary if r['status'] == 'error'
-                ])
-
-                send_flow_error_alert(
-                    flow_name="Zapt Tech - Todos Shoppings",
-                    source="PostgreSQL",
-                    destination=f"API ({api_url_block})",
-                    error_message=f"{error_count} shopping(s) com erro:\n{errors_detail}",
-                    duration_seconds=duration,
-                    job_id=job_id,
-                    group_id=alert_group_id
-                )
-                logger.info("✅ Alerta consolidado de erro enviado")
-
-        except Exception as alert_error:
-            logger.warning(f"⚠️ Erro ao enviar alerta consolidado: {alert_error}")
+        _send_consolidated_alert(logger, results_summary, total_items, duration, api_url_block, alert_group_id)
 
     return {
         "status": "completed",
@@ -1035,5 +1794,5 @@ if __name__ == "__main__":
     )
 
     print("✅ Deployment criado: zapt-tech-all-shoppings")
-    print(f"   📋 Shoppings: {', '.join(VALID_SHOPPING_SIGLAS)}")
+    print(f"   📋 Shoppings: {_VALID_SHOPPING_SIGLAS_STR}")
     print("   ⏰ Agendamento: Diariamente às 8h (America/Sao_Paulo)")
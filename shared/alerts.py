@@ -1,24 +1,49 @@
+import atexit
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 
+# Envio de alertas em segundo plano: o flow não espera o POST (até 10s de timeout).
+# Na saída do processo o executor é drenado, então alertas pendentes ainda são enviados.
+_ALERT_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="alerts")
+atexit.register(_ALERT_EXECUTOR.shutdown, wait=True)
+
 
 def send_monitoring_alert(
         message: str,
         group_id: str = "120363421261712366",
-        api_url: str = "http://189.126.105.104:9002/send-group-message"
+        api_url: str = "http://189.126.105.104:9002/send-group-message",
+        wait: bool = False
 ) -> bool:
     """
     Envia alerta de monitoramento para grupo via API
 
+    Por padrão o envio é feito em uma thread de fundo e a função retorna logo
+    após enfileirar; erros são impressos pela própria thread.
+
     Args:
         message: Mensagem a ser enviada
         group_id: ID do grupo (padrão: configurado)
         api_url: URL da API (padrão: configurado)
+        wait: Se True, envia de forma síncrona e retorna o resultado real
 
     Returns:
-        True se enviado com sucesso, False caso contrário
+        True se enviado (ou enfileirado) com sucesso, False caso contrário
     """
+    if wait:
+        return _post_alert(message, group_id, api_url)
+
+    try:
+        _ALERT_EXECUTOR.submit(_post_alert, message, group_id, api_url)
+        return True
+    except RuntimeError:
+        # Executor já encerrado (processo finalizando): envia de forma síncrona
+        return _post_alert(message, group_id, api_url)
+
+
+def _post_alert(message: str, group_id: str, api_url: str) -> bool:
+    """Faz o POST do alerta na API de mensagens (executado em segundo plano por padrão)"""
     body = {
         "group_id": group_id,
         "message": message
@@ -75,6 +100,24 @@ def format_duration(seconds: float) -> str:
     return f"{hours}h {remaining_minutes}min"
 
 
+# Cabeçalhos fixos das mensagens de alerta (preenchidos com str.format_map)
+SUCCESS_ALERT_TEMPLATE = """✅ SUCESSO - {flow_name}
+
+🔄 {source} → {destination}
+
+Resumo:"""
+
+ERROR_ALERT_TEMPLATE = """❌ ERRO - {flow_name}
+
+🔄 {source} → {destination}
+
+⚠️ Erro:
+{error_message}"""
+
+_BYTE_UNITS = ("B", "kB", "MB", "GB", "TB")
+_BYTE_UNIT_DECIMALS = (0, 0, 1, 1, 1)
+
+
 def format_bytes(bytes_size: int) -> str:
     """
     Formata tamanho em bytes para formato legível
@@ -85,14 +128,14 @@ def format_bytes(bytes_size: int) -> str:
     Returns:
         String formatada (ex: "203 kB", "1.5 MB")
     """
-    if bytes_size < 1024:
+    # Cada unidade equivale a 10 bits (1024): o índice sai direto do bit_length
+    unit_index = min(max(0, (int(bytes_size).bit_length() - 1) // 10), len(_BYTE_UNITS) - 1)
+
+    if unit_index == 0:
         return f"{bytes_size} B"
-    elif bytes_size < 1024 * 1024:
-        return f"{bytes_size / 1024:.0f} kB"
-    elif bytes_size < 1024 * 1024 * 1024:
-        return f"{bytes_size / (1024 * 1024):.1f} MB"
-    else:
-        return f"{bytes_size / (1024 * 1024 * 1024):.1f} GB"
+
+    decimals = _BYTE_UNIT_DECIMALS[unit_index]
+    return f"{bytes_size / (1 << (10 * unit_index)):.{decimals}f} {_BYTE_UNITS[unit_index]}"
 
 
 def send_flow_success_alert(
@@ -128,11 +171,11 @@ def send_flow_success_alert(
     date_str = now.strftime("%d/%m/%Y às %H:%M")
 
     # Monta mensagem
-    message = f"""✅ SUCESSO - {flow_name}
-
-🔄 {source} → {destination}
-
-Resumo:"""
+    message = SUCCESS_ALERT_TEMPLATE.format_map({
+        "flow_name": flow_name,
+        "source": source,
+        "destination": destination
+    })
 
     # Adiciona informações do summary
     if "records_extracted" in summary:
@@ -194,13 +237,13 @@ def send_flow_error_alert(
     now = datetime.now() - timedelta(hours=3)
     date_str = now.strftime("%d/%m/%Y às %H:%M")
 
-    # Monta mensagem
-    message = f"""❌ ERRO - {flow_name}
-
-🔄 {source} → {destination}
-
-⚠️ Erro:
-{error_message[:300]}"""  # Limita tamanho do erro
+    # Monta mensagem (limita tamanho do erro)
+    message = ERROR_ALERT_TEMPLATE.format_map({
+        "flow_name": flow_name,
+        "source": source,
+        "destination": destination,
+        "error_message": error_message[:300]
+    })
 
     # Adiciona resumo parcial se fornecido
     if partial_summary:
@@ -1,16 +1,90 @@
 import time
+import threading
+from functools import lru_cache
 from typing import Dict, Any
-import requests
+import httpx
+import orjson
 from prefect import task
 from prefect.logging import get_run_logger
 from prefect.cache_policies import NONE as NO_CACHE
 
+# URLs base das APIs (os endpoints são montados a partir delas)
+DECONVE_AUTH_BASE_URL = "https://auth.deconve.com/"
+DECONVE_API_BASE_URL = "https://api.deconve.com/"
+
+# Cliente HTTP/2: várias requisições simultâneas multiplexadas na mesma conexão TLS
+MAX_CONNECTIONS = 32
+MAX_KEEPALIVE_CONNECTIONS = 16
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.5
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+def _create_client() -> httpx.Client:
+    """
+    Cria o cliente HTTP compartilhado do módulo (HTTP/2 + keep-alive)
+
+    O transporte refaz a conexão em falhas de rede; respostas 429/5xx são
+    tratadas em _get_with_retry.
+
+    Returns:
+        httpx.Client thread-safe, reaproveitado por todas as chamadas
+    """
+    limits = httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS
+    )
+    transport = httpx.HTTPTransport(http2=True, retries=MAX_RETRIES, limits=limits)
+    return httpx.Client(transport=transport, timeout=30.0)
+
+
+_CLIENT = _create_client()
+
+
+def _get_with_retry(url: str, **kwargs) -> httpx.Response:
+    """
+    GET com retry em 429/5xx (backoff exponencial, respeitando Retry-After)
+
+    Returns:
+        Última resposta obtida (o chamador faz raise_for_status)
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        response = _CLIENT.get(url, **kwargs)
+
+        if response.status_code not in RETRY_STATUS or attempt == MAX_RETRIES:
+            return response
+
+        retry_after = response.headers.get("Retry-After", "")
+        delay = float(retry_after) if retry_after.isdigit() else RETRY_BACKOFF * (2 ** attempt)
+        time.sleep(delay)
+
+    return response
+
+
+@lru_cache(maxsize=8)
+def _auth_headers(access_token: str) -> Dict[str, str]:
+    """
+    Headers de autenticação por token, montados uma vez e reaproveitados
+
+    O dict é compartilhado entre chamadas: não deve ser alterado (o httpx
+    apenas copia os valores para a requisição).
+    """
+    return {"Authorization": f"Bearer {access_token}"}
+
+
+# Tokens por API key, reaproveitados no processo até perto da expiração
+_TOKEN_CACHE: Dict[str, Dict[str, Any]] = {}
+_TOKEN_CACHE_LOCK = threading.Lock()
+
 
 @task(retries=3, retry_delay_seconds=10)
 def authenticate_deconve(api_key: str) -> Dict[str, Any]:
     """
     Autentica na API Deconve e retorna token de acesso
 
+    O token fica em cache no processo: chamadas seguintes com a mesma API key
+    reutilizam o token enquanto is_token_expired for falso.
+
     Args:
         api_key: API Key do Deconve
 
@@ -19,12 +93,19 @@ def authenticate_deconve(api_key: str) -> Dict[str, Any]:
     """
     logger = get_run_logger()
 
+    with _TOKEN_CACHE_LOCK:
+        cached_token = _TOKEN_CACHE.get(api_key)
+
+    if cached_token and not is_token_expired(cached_token):
+        logger.info("♻️ Reutilizando token Deconve em cache")
+        return dict(cached_token)
+
     try:
-        auth_url = "https://auth.deconve.com/v1/token/"
+        auth_url = f"{DECONVE_AUTH_BASE_URL}v1/token/"
 
         logger.info("🔐 Autenticando na API Deconve...")
 
-        response = requests.post(
+        response = _CLIENT.post(
             auth_url,
             json={"api_key": api_key},
             timeout=30
@@ -32,16 +113,19 @@ def authenticate_deconve(api_key: str) -> Dict[str, Any]:
 
         response.raise_for_status()
 
-        token_data = response.json()
+        token_data = orjson.loads(response.content)
 
         logger.info(f"✅ Token obtido com sucesso (expira em {token_data['expires_in']}s)")
 
         # Adiciona timestamp de quando o token foi obtido
         token_data['obtained_at'] = time.time()
 
+        with _TOKEN_CACHE_LOCK:
+            _TOKEN_CACHE[api_key] = dict(token_data)
+
         return token_data
 
-    except requests.exceptions.RequestException as e:
+    except (httpx.HTTPError, orjson.JSONDecodeError) as e:
         logger.error(f"❌ Erro ao autenticar: {str(e)}")
         raise Exception(f"Falha na autenticação Deconve: {str(e)}") from e
 
@@ -60,15 +144,13 @@ def get_units(access_token: str) -> Dict[str, Any]:
     logger = get_run_logger()
 
     try:
-        api_url = "https://api.deconve.com/v1/units/"
+        api_url = f"{DECONVE_API_BASE_URL}v1/units/"
 
-        headers = {
-            "Authorization": f"Bearer {access_token}"
-        }
+        headers = _auth_headers(access_token)
 
         logger.info("📡 Buscando unidades da API Deconve...")
 
-        response = requests.get(
+        response = _get_with_retry(
             api_url,
             headers=headers,
             timeout=30
@@ -76,14 +158,14 @@ def get_units(access_token: str) -> Dict[str, Any]:
 
         response.raise_for_status()
 
-        units_data = response.json()
+        units_data = orjson.loads(response.content)
 
         total_units = units_data.get('total', 0)
         logger.info(f"✅ {total_units} unidade(s) encontrada(s)")
 
         return units_data
 
-    except requests.exceptions.RequestException as e:
+    except (httpx.HTTPError, orjson.JSONDecodeError) as e:
         logger.error(f"❌ Erro ao buscar unidades: {str(e)}")
         raise Exception(f"Falha ao buscar unidades Deconve: {str(e)}") from e
 
@@ -103,13 +185,11 @@ def get_unit_details(access_token: str, unit_id: str) -> Dict[str, Any]:
     logger = get_run_logger()
 
     try:
-        api_url = f"https://api.deconve.com/v1/units/{unit_id}"
+        api_url = f"{DECONVE_API_BASE_URL}v1/units/{unit_id}"
 
-        headers = {
-            "Authorization": f"Bearer {access_token}"
-        }
+        headers = _auth_headers(access_token)
 
-        response = requests.get(
+        response = _get_with_retry(
             api_url,
             headers=headers,
             timeout=30
@@ -117,14 +197,14 @@ def get_unit_details(access_token: str, unit_id: str) -> Dict[str, Any]:
 
         response.raise_for_status()
 
-        unit_details = response.json()
+        unit_details = orjson.loads(response.content)
 
         videos_count = len(unit_details.get('videos', []))
         logger.info(f"✅ Unit {unit_id}: {videos_count} vídeo(s)/câmera(s) encontrado(s)")
 
         return unit_details
 
-    except requests.exceptions.RequestException as e:
+    except (httpx.HTTPError, orjson.JSONDecodeError) as e:
         logger.error(f"❌ Erro ao buscar detalhes da unit {unit_id}: {str(e)}")
         raise Exception(f"Falha ao buscar detalhes da unit {unit_id}: {str(e)}") from e
 
@@ -144,13 +224,11 @@ def get_video_details(access_token: str, video_id: str) -> Dict[str, Any]:
     logger = get_run_logger()
 
     try:
-        api_url = f"https://api.deconve.com/v1/videos/{video_id}"
+        api_url = f"{DECONVE_API_BASE_URL}v1/videos/{video_id}"
 
-        headers = {
-            "Authorization": f"Bearer {access_token}"
-        }
+        headers = _auth_headers(access_token)
 
-        response = requests.get(
+        response = _get_with_retry(
             api_url,
             headers=headers,
             timeout=30
@@ -158,11 +236,11 @@ def get_video_details(access_token: str, video_id: str) -> Dict[str, Any]:
 
         response.raise_for_status()
 
-        video_details = response.json()
+        video_details = orjson.loads(response.content)
 
         return video_details
 
-    except requests.exceptions.RequestException as e:
+    except (httpx.HTTPError, orjson.JSONDecodeError) as e:
         logger.error(f"❌ Erro ao buscar detalhes do vídeo {video_id}: {str(e)}")
         raise Exception(f"Falha ao buscar detalhes do vídeo {video_id}: {str(e)}") from e
 
@@ -194,11 +272,9 @@ def get_people_counter_report(
     logger = get_run_logger()
 
     try:
-        api_url = "https://api.deconve.com/v1/peoplecounter/reports/"
+        api_url = f"{DECONVE_API_BASE_URL}v1/peoplecounter/reports/"
 
-        headers = {
-            "Authorization": f"Bearer {access_token}"
-        }
+        headers = _auth_headers(access_token)
 
         params = {
             "video_id": video_id,
@@ -209,7 +285,7 @@ def get_people_counter_report(
             "skip": skip
         }
 
-        response = requests.get(
+        response = _get_with_retry(
             api_url,
             headers=headers,
             params=params,
@@ -218,11 +294,11 @@ def get_people_counter_report(
 
         response.raise_for_status()
 
-        report_data = response.json()
+        report_data = orjson.loads(response.content)
 
         return report_data
 
-    except requests.exceptions.RequestException as e:
+    except (httpx.HTTPError, orjson.JSONDecodeError) as e:
         logger.error(f"❌ Erro ao buscar relatório de fluxo: {str(e)}")
         raise Exception(f"Falha ao buscar relatório de fluxo: {str(e)}") from e
 
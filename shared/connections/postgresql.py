@@ -1,12 +1,326 @@
-from typing import List, Dict, Any, Optional
+import io
+import os
+import re
+import time
+import csv
+import atexit
+import logging
+import hashlib
+import threading
+import weakref
+from collections import OrderedDict
+from uuid import uuid4
+from itertools import chain, islice
+from typing import List, Dict, Any, Optional, Iterator, Iterable, Sequence, Tuple, Union, Literal, Callable
 from contextlib import contextmanager
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INTRANS, TRANSACTION_STATUS_INERROR
+from psycopg2 import sql
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
 from prefect import task
 from prefect.logging import get_run_logger
 from prefect.cache_policies import NONE as NO_CACHE
 from prefect.blocks.system import Secret
 
+# Pools de conexão por processo, um por (host, port, database, user, schema):
+# o handshake TCP + TLS + autenticação acontece só na primeira conexão do pool.
+# Com POOL_MAX_CONN conexões em uso, postgresql_connection espera uma ser
+# devolvida (em vez do PoolError do psycopg2). Conexões ociosas há mais de
+# POOL_PING_AFTER_SECONDS são testadas com SELECT 1 antes de serem entregues.
+POOL_MIN_CONN = 1
+POOL_MAX_CONN = 8
+POOL_PING_AFTER_SECONDS = 60
+
+# Inserts em lote: execute_values junta page_size linhas em um único
+# INSERT ... VALUES (...), (...) (equivalente ao reWriteBatchedInserts do JDBC),
+# respeitando o limite de 65535 parâmetros por statement do PostgreSQL
+EXECUTE_MANY_PAGE_SIZE = 1000
+PG_MAX_BIND_PARAMS = 65535
+
+# COPY FROM STDIN: linhas enviadas por bloco e marcador de NULL no CSV
+COPY_BATCH_ROWS = 50_000
+COPY_NULL = "\\N"
+
+# Linhas por fetchmany em execute_query (e itersize do modo stream)
+FETCH_BATCH_SIZE = 10_000
+
+# Cache LRU de resultados de leitura de execute_query (opt-in com cache=True)
+QUERY_CACHE_MAXSIZE = 256
+
+_QUERY_CACHE: "OrderedDict[Tuple[str, bytes, Any], List[Dict[str, Any]]]" = OrderedDict()
+_QUERY_CACHE_LOCK = threading.Lock()
+
+# Prepared statements por conexão (PREPARE vale para a sessão inteira, então
+# sobrevive à devolução da conexão ao pool)
+_PREPARED: "weakref.WeakKeyDictionary[Any, set]" = weakref.WeakKeyDictionary()
+_PREPARED_LOCK = threading.Lock()
+_PLACEHOLDER_PATTERN = re.compile(r"%%|%s")
+
+
+class _BlockingConnectionPool(ThreadedConnectionPool):
+    """
+    ThreadedConnectionPool que espera por uma conexão livre e testa as ociosas
+
+    getconn() bloqueia enquanto houver maxconn conexões em uso. Conexão ociosa
+    há mais de POOL_PING_AFTER_SECONDS (ex: servidor reiniciado,
+    idle_session_timeout, timeout de NAT) é testada e, se caiu, substituída.
+    """
+
+    def __init__(self, minconn: int, maxconn: int, *args, **kwargs):
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._released_at: "weakref.WeakKeyDictionary[Any, float]" = weakref.WeakKeyDictionary()
+        super().__init__(minconn, maxconn, *args, **kwargs)
+
+    def _is_alive(self, conn) -> bool:
+        """Conexão aberta e, se ociosa há muito tempo, respondendo a SELECT 1"""
+        if conn.closed:
+            return False
+
+        released_at = self._released_at.get(conn)
+        if released_at is None or time.monotonic() - released_at <= POOL_PING_AFTER_SECONDS:
+            return True
+
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            if not conn.autocommit:
+                conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def getconn(self, key=None):
+        self._slots.acquire()
+        try:
+            # Descarta conexões mortas (todas as ociosas podem ter caído juntas);
+            # esgotadas as ociosas, o pool abre uma nova
+            for _ in range(self.maxconn):
+                conn = super().getconn(key)
+                if self._is_alive(conn):
+                    return conn
+                super().putconn(conn, key, close=True)
+            return super().getconn(key)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn=None, key=None, close=False):
+        # Libera a vaga só para conexão de fato emprestada (devolução repetida não conta)
+        checked_out = id(conn) in self._rused
+        try:
+            super().putconn(conn, key, close)
+        finally:
+            if close or conn.closed:
+                self._released_at.pop(conn, None)
+            else:
+                self._released_at[conn] = time.monotonic()
+            if checked_out:
+                self._slots.release()
+
+
+_POOLS: Dict[Tuple[str, int, str, str, str], _BlockingConnectionPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def _get_pool(
+        host: str,
+        port: int,
+        database: str,
+        user: str,
+        password: str,
+        schema: str,
+        timeout: int
+) -> _BlockingConnectionPool:
+    """
+    Retorna o pool do destino informado, criando-o na primeira chamada
+
+    Returns:
+        _BlockingConnectionPool compartilhado pelo processo
+    """
+    key = (host, port, database, user, schema)
+    pool = _POOLS.get(key)
+    if pool is not None:
+        return pool
+
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = _BlockingConnectionPool(
+                POOL_MIN_CONN,
+                POOL_MAX_CONN,
+                host=host,
+                port=port,
+                database=database,
+                user=user,
+                password=password,
+                connect_timeout=timeout,
+                options=f'-c search_path={schema}'
+            )
+            _POOLS[key] = pool
+    return pool
+
+
+def _query_cache_key(conn, query: str, params: Optional[Any]) -> Optional[Tuple[str, bytes, Any]]:
+    """
+    Chave do cache de leitura: destino da conexão + SHA-1 da query normalizada + params
+
+    Returns:
+        Chave hashável, ou None se os params não puderem ser usados como chave
+    """
+    if isinstance(params, dict):
+        params = tuple(sorted(params.items()))
+    try:
+        hash(params)
+    except TypeError:
+        return None
+
+    normalized = " ".join(query.split())
+    return conn.dsn, hashlib.sha1(normalized.encode()).digest(), params
+
+
+def _query_cache_get(cache_key: Tuple[str, bytes, Any]) -> Optional[List[Dict[str, Any]]]:
+    """
+    Busca um resultado no cache de leitura (marcando-o como usado recentemente)
+
+    Returns:
+        Cópia das linhas em cache, ou None se não houver
+    """
+    with _QUERY_CACHE_LOCK:
+        cached = _QUERY_CACHE.get(cache_key)
+        if cached is None:
+            return None
+        _QUERY_CACHE.move_to_end(cache_key)
+    return [dict(row) for row in cached]
+
+
+def _query_cache_put(cache_key: Tuple[str, bytes, Any], results: List[Dict[str, Any]]) -> None:
+    """Guarda uma cópia do resultado no cache de leitura, descartando o mais antigo se cheio"""
+    with _QUERY_CACHE_LOCK:
+        _QUERY_CACHE[cache_key] = [dict(row) for row in results]
+        if len(_QUERY_CACHE) > QUERY_CACHE_MAXSIZE:
+            _QUERY_CACHE.popitem(last=False)
+
+
+def _rollback_after_error(conn) -> None:
+    """
+    Faz rollback só quando há transação a desfazer
+
+    O status da transação é lido localmente (sem round-trip). Não há rollback
+    se a conexão caiu (InterfaceError/OperationalError de socket: o pool
+    descarta a conexão na devolução), em autocommit, ou se o erro aconteceu
+    antes de o statement chegar ao servidor.
+    """
+    if conn.closed or conn.autocommit:
+        return
+    if conn.get_transaction_status() in (TRANSACTION_STATUS_INTRANS, TRANSACTION_STATUS_INERROR):
+        conn.rollback()
+
+
+def _prepared_query(conn, cursor, name: str, query: str, params: Optional[Any]) -> Tuple[str, Optional[Any]]:
+    """
+    Garante o PREPARE de query na conexão e retorna o EXECUTE equivalente
+
+    Os placeholders %s viram $1, $2, ... no PREPARE; só parâmetros posicionais
+    são suportados.
+
+    Returns:
+        Tupla (query EXECUTE, params)
+    """
+    if not name.isidentifier():
+        raise ValueError(f"Nome de prepared statement inválido: '{name}'")
+    if isinstance(params, dict):
+        raise ValueError("prepared_name não suporta parâmetros nomeados (%(nome)s)")
+
+    with _PREPARED_LOCK:
+        prepared = _PREPARED.setdefault(conn, set())
+
+    if name not in prepared:
+        counter = iter(range(1, PG_MAX_BIND_PARAMS + 1))
+        prepare_body = _PLACEHOLDER_PATTERN.sub(
+            lambda m: "%" if m.group() == "%%" else f"${next(counter)}",
+            query
+        )
+        cursor.execute(f"PREPARE {name} AS {prepare_body}")
+        prepared.add(name)
+
+    if not params:
+        return f"EXECUTE {name}", None
+    return f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params
+
+
+def _columnar_results(columns: List[str], rows: List[tuple], result_format: str):
+    """
+    Monta o resultado em layout colunar (uma lista/array por coluna)
+
+    Args:
+        columns: Nomes das colunas
+        rows: Linhas como tuplas (saída do cursor)
+        result_format: "columns", "arrow" ou "pandas"
+
+    Returns:
+        Dict {coluna: lista}, pyarrow.Table ou pandas.DataFrame
+    """
+    if result_format == "pandas":
+        import pandas as pd
+        return pd.DataFrame.from_records(rows, columns=columns)
+
+    # Transposição em uma única passada (em C): linhas -> colunas
+    values = zip(*rows) if rows else [[] for _ in columns]
+    data = {column: list(column_values) for column, column_values in zip(columns, values)}
+
+    if result_format == "arrow":
+        import pyarrow as pa
+        return pa.Table.from_pydict(data)
+    return data
+
+
+def _fetch_results(cursor, result_format: str):
+    """
+    Lê o resultado do cursor no layout de result_format
+
+    Em "rows", o cursor de tuplas é lido em blocos de FETCH_BATCH_SIZE e cada
+    linha vira um único dict (zip com os nomes das colunas), limitando o pico
+    de memória do driver.
+    """
+    columns = [column.name for column in cursor.description]
+
+    if result_format != "rows":
+        return _columnar_results(columns, cursor.fetchall(), result_format)
+
+    results = []
+    while True:
+        rows = cursor.fetchmany(FETCH_BATCH_SIZE)
+        if not rows:
+            break
+        results.extend(dict(zip(columns, row)) for row in rows)
+    return results
+
+
+def clear_query_cache() -> None:
+    """Esvazia o cache de leitura de execute_query (chamado após escritas)"""
+    with _QUERY_CACHE_LOCK:
+        _QUERY_CACHE.clear()
+
+
+def close_all_postgresql_connections(*_hook_args) -> None:
+    """
+    Fecha todas as conexões de todos os pools do processo
+
+    Aceita os argumentos dos hooks do Prefect, podendo ser usada diretamente em
+    @flow(on_completion=[...], on_failure=[...], on_crashed=[...]). Também é
+    registrada no atexit.
+    """
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+
+    for pool in pools:
+        pool.closeall()
+
+
+atexit.register(close_all_postgresql_connections)
+
 
 @contextmanager
 def postgresql_connection(
@@ -20,6 +334,9 @@ def postgresql_connection(
 ):
     """
     Context manager para conexão PostgreSQL.
+    A conexão vem de um pool do processo e é devolvida a ele na saída (sem
+    fechar o socket); transações não commitadas são desfeitas antes da devolução.
+    Com POOL_MAX_CONN conexões do mesmo destino em uso, espera uma ser devolvida.
     Busca credenciais na seguinte ordem:
     1. Parâmetros fornecidos
     2. Variáveis de ambiente (.env): RPA_POSTGRES_HOST, RPA_POSTGRES_DATABASE, RPA_POSTGRES_USER, RPA_POSTGRES_PASSWORD
@@ -50,9 +367,9 @@ def postgresql_connection(
             cur.execute("SELECT * FROM tabela")
             conn.commit()
     """
-    import os
     logger = get_run_logger()
     conn = None
+    pool = None
 
     try:
         # 1. Tenta variáveis de ambiente (.env)
@@ -97,17 +414,10 @@ def postgresql_connection(
                 "ou nos Secrets do Prefect (rpa-postgres-host, rpa-postgres-database, rpa-postgres-user, rpa-postgres-password)"
             )
 
-        logger.info(f"🔌 Conectando PostgreSQL: {host}:{port}/{database} (schema: {schema})")
+        logger.info("🔌 Conectando PostgreSQL: %s:%s/%s (schema: %s)", host, port, database, schema)
 
-        conn = psycopg2.connect(
-            host=host,
-            port=port,
-            database=database,
-            user=user,
-            password=password,
-            connect_timeout=timeout,
-            options=f'-c search_path={schema}'
-        )
+        pool = _get_pool(host, port, database, user, password, schema, timeout)
+        conn = pool.getconn()
 
         # Desabilita autocommit para controle manual de transações
         conn.autocommit = False
@@ -116,19 +426,22 @@ def postgresql_connection(
         yield conn
 
     except Exception as e:
-        logger.error(f"❌ Erro ao conectar PostgreSQL: {str(e)}")
+        logger.error("❌ Erro ao conectar PostgreSQL: %s", e)
         raise
 
     finally:
         if conn:
             try:
-                conn.close()
-                logger.info("🔒 Conexão PostgreSQL fechada")
+                # Desfaz o que não foi commitado, como o close() fazia antes
+                if not conn.closed and conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                pool.putconn(conn, close=bool(conn.closed))
+                logger.info("🔒 Conexão PostgreSQL devolvida ao pool")
             except Exception as e:
-                logger.warning(f"⚠️ Aviso ao fechar conexão: {str(e)}")
+                logger.warning("⚠️ Aviso ao devolver conexão: %s", e)
+                pool.putconn(conn, close=True)
 
 
-@task(retries=3, retry_delay_seconds=10)
 def connect_postgresql(
         host: str,
         database: str,
@@ -156,7 +469,7 @@ def connect_postgresql(
     logger = get_run_logger()
 
     try:
-        logger.info(f"🔌 Conectando PostgreSQL: {host}:{port}/{database}")
+        logger.info("🔌 Conectando PostgreSQL: %s:%s/%s", host, port, database)
 
         conn = psycopg2.connect(
             host=host,
@@ -172,7 +485,7 @@ def connect_postgresql(
         return conn
 
     except Exception as e:
-        logger.error(f"❌ Erro ao conectar PostgreSQL: {str(e)}")
+        logger.error("❌ Erro ao conectar PostgreSQL: %s", e)
         raise
 
 
@@ -181,27 +494,64 @@ def execute_query(
         conn,
         query: str,
         params: Optional[tuple] = None,
-        fetch: bool = True
-) -> List[Dict[str, Any]]:
+        fetch: bool = True,
+        cache: bool = False,
+        prepared_name: Optional[str] = None,
+        result_format: Literal["rows", "columns", "arrow", "pandas"] = "rows"
+) -> Union[List[Dict[str, Any]], Dict[str, List[Any]], Any]:
     """
     Executa query SQL e retorna resultados como lista de dicionários
 
+    Para ler resultados grandes sem materializá-los, use iter_query_rows /
+    iter_query_batches direto (fora de task): um gerador devolvido pela task só
+    executaria a query depois de a task terminar, fora do seu tratamento de erro.
+
+    Com prepared_name, a query é preparada (PREPARE) na primeira chamada por
+    conexão e as seguintes só enviam EXECUTE com os parâmetros, sem novo
+    parse/planejamento no servidor.
+
+    result_format define o layout do resultado: "rows" (lista de dicts, padrão),
+    "columns" (dict {coluna: lista}), "arrow" (pyarrow.Table) ou "pandas"
+    (DataFrame). Os formatos colunares não repetem os nomes das colunas por
+    linha e vão direto para consumidores vetorizados.
+
+    Com cache=True, leituras repetidas da mesma (query, params) no mesmo destino
+    são servidas de um cache LRU do processo. Qualquer escrita feita por este
+    módulo (fetch=False, execute_many, copy_rows) esvazia o cache; escritas
+    feitas direto no cursor devem chamar clear_query_cache().
+
     Args:
         conn: Conexão psycopg2
         query: Query SQL a ser executada
         params: Parâmetros para a query (opcional)
         fetch: Se deve fazer fetch dos resultados (padrão: True)
+        cache: Se deve usar o cache de leitura (padrão: False; ignorado com fetch=False)
+        prepared_name: Nome do prepared statement a reutilizar (opcional)
+        result_format: Layout do resultado (padrão: "rows"; cache só vale para "rows")
 
     Returns:
-        Lista de dicionários com os resultados
+        Resultados no layout de result_format
     """
     logger = get_run_logger()
 
+    if result_format not in ("rows", "columns", "arrow", "pandas"):
+        raise ValueError(f"result_format inválido: '{result_format}'")
+
+    cache_key = _query_cache_key(conn, query, params) if cache and fetch and result_format == "rows" else None
+    cached = _query_cache_get(cache_key) if cache_key is not None else None
+    if cached is not None:
+        logger.info("♻️ Resultado em cache: %s linha(s)", len(cached))
+        return cached
+
     try:
-        logger.info(f"⚡ Executando query PostgreSQL...")
-        logger.info(f"📝 Query (primeiros 200 caracteres): {query[:200]}...")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("⚡ Executando query PostgreSQL...")
+            logger.info("📝 Query (primeiros 200 caracteres): %s...", query[:200])
+
+        cursor = conn.cursor()
 
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        if prepared_name:
+            query, params = _prepared_query(conn, cursor, prepared_name, query, params)
 
         if params:
             cursor.execute(query, params)
@@ -209,27 +559,271 @@ def execute_query(
             cursor.execute(query)
 
         if fetch:
-            results = cursor.fetchall()
-            # Converte RealDictRow para dict normal
-            results = [dict(row) for row in results]
-
-            logger.info(f"✅ Query executada com sucesso: {len(results)} linha(s) retornada(s)")
+            row_count = cursor.rowcount
+            results = _fetch_results(cursor, result_format)
             cursor.close()
+            logger.info("✅ Query executada com sucesso: %s linha(s) retornada(s)", row_count)
+
+            if cache_key is not None:
+                _query_cache_put(cache_key, results)
             return results
         else:
             conn.commit()
+            clear_query_cache()
             affected_rows = cursor.rowcount
-            logger.info(f"✅ Query executada: {affected_rows} linha(s) afetada(s)")
+            logger.info("✅ Query executada: %s linha(s) afetada(s)", affected_rows)
             cursor.close()
             return []
 
     except Exception as e:
-        logger.error(f"❌ Erro ao executar query: {str(e)}")
-        conn.rollback()
+        logger.error("❌ Erro ao executar query: %s", e)
+        _rollback_after_error(conn)
+        raise
+
+
+@task(cache_policy=NO_CACHE)
+def execute_many(
+        conn,
+        query: str,
+        rows: Iterable[Sequence[Any]],
+        page_size: int = EXECUTE_MANY_PAGE_SIZE,
+        commit: bool = True
+) -> int:
+    """
+    Executa um INSERT para várias linhas em poucos statements (execute_values)
+
+    Em vez de um round-trip por linha, envia page_size linhas por statement. O
+    page_size é reduzido automaticamente para não ultrapassar o limite de
+    parâmetros do PostgreSQL. Para cargas muito grandes (>10k linhas) em tabela
+    conhecida, prefira copy_rows.
+
+    Args:
+        conn: Conexão psycopg2
+        query: INSERT com um único %s no lugar de VALUES
+            (ex: "INSERT INTO tabela (a, b) VALUES %s")
+        rows: Linhas (tuplas/listas na ordem das colunas)
+        page_size: Linhas por statement (padrão: 1000)
+        commit: Se deve fazer commit ao final (padrão: True)
+
+    Returns:
+        Quantidade de linhas enviadas
+
+    Example:
+        execute_many(conn, "INSERT INTO tabela (a, b) VALUES %s", [(1, "x"), (2, "y")])
+    """
+    logger = get_run_logger()
+
+    rows = rows if isinstance(rows, list) else list(rows)
+    if not rows:
+        logger.info("ℹ️ Nenhuma linha para inserir")
+        return 0
+
+    page_size = max(1, min(page_size, PG_MAX_BIND_PARAMS // len(rows[0])))
+
+    try:
+        with conn.cursor() as cursor:
+            execute_values(cursor, query, rows, page_size=page_size)
+        if commit:
+            conn.commit()
+        clear_query_cache()
+    except Exception as e:
+        logger.error("❌ Erro ao inserir lote: %s", e)
+        _rollback_after_error(conn)
         raise
 
+    logger.info("✅ %s linha(s) inserida(s) em lotes de %s", len(rows), page_size)
+    return len(rows)
+
+
+def make_inserter(
+        conn,
+        table: str,
+        columns: Sequence[str],
+        commit: bool = True
+) -> Callable[[Iterable[Sequence[Any]]], int]:
+    """
+    Cria uma função de insert especializada para (tabela, colunas)
+
+    O INSERT ... VALUES %s e o page_size (máximo de linhas por statement dentro
+    do limite de parâmetros do PostgreSQL) são montados uma única vez; cada
+    chamada só faz o execute_values das linhas recebidas.
+
+    Args:
+        conn: Conexão psycopg2
+        table: Tabela de destino (aceita "schema.tabela")
+        columns: Colunas, na ordem dos valores de cada linha
+        commit: Se cada chamada deve fazer commit ao final (padrão: True)
+
+    Returns:
+        Função insert(rows) -> quantidade de linhas inseridas
+
+    Example:
+        insert_vehicles = make_inserter(conn, "bronze.vehicles", ["plate", "model"])
+        insert_vehicles([("ABC1234", "Onix"), ("XYZ9876", "HB20")])
+    """
+    insert_query = sql.SQL("INSERT INTO {} ({}) VALUES %s").format(
+        sql.Identifier(*table.split(".")),
+        sql.SQL(", ").join(sql.Identifier(column) for column in columns)
+    ).as_string(conn)
+    page_size = PG_MAX_BIND_PARAMS // len(columns)
+
+    def insert(rows: Iterable[Sequence[Any]]) -> int:
+        rows = rows if isinstance(rows, list) else list(rows)
+        if not rows:
+            return 0
+
+        try:
+            with conn.cursor() as cursor:
+                execute_values(cursor, insert_query, rows, page_size=page_size)
+            if commit:
+                conn.commit()
+        except Exception:
+            _rollback_after_error(conn)
+            raise
+
+        clear_query_cache()
+        return len(rows)
+
+    return insert
+
 
 @task(cache_policy=NO_CACHE)
+def copy_rows(
+        conn,
+        table: str,
+        columns: Sequence[str],
+        rows: Iterable[Sequence[Any]],
+        batch_rows: int = COPY_BATCH_ROWS,
+        commit: bool = True
+) -> int:
+    """
+    Carrega linhas via COPY FROM STDIN (CSV), o caminho mais rápido de carga
+
+    As linhas são serializadas em blocos de batch_rows, sem materializar o
+    iterável inteiro. None é enviado como NULL.
+
+    Args:
+        conn: Conexão psycopg2
+        table: Tabela de destino (aceita "schema.tabela")
+        columns: Colunas, na ordem dos valores de cada linha
+        rows: Linhas (tuplas/listas)
+        batch_rows: Linhas por bloco de COPY (padrão: 50000)
+        commit: Se deve fazer commit ao final (padrão: True)
+
+    Returns:
+        Quantidade de linhas carregadas
+    """
+    logger = get_run_logger()
+
+    copy_sql = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv, NULL {})").format(
+        sql.Identifier(*table.split(".")),
+        sql.SQL(", ").join(sql.Identifier(column) for column in columns),
+        sql.Literal(COPY_NULL)
+    )
+
+    total_rows = 0
+    rows = iter(rows)
+
+    try:
+        with conn.cursor() as cursor:
+            copy_query = copy_sql.as_string(cursor)
+            while True:
+                batch = list(islice(rows, batch_rows))
+                if not batch:
+                    break
+
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerows(
+                    [COPY_NULL if value is None else value for value in row]
+                    for row in batch
+                )
+                buffer.seek(0)
+
+                cursor.copy_expert(copy_query, buffer)
+                total_rows += len(batch)
+        if commit:
+            conn.commit()
+        clear_query_cache()
+    except Exception as e:
+        logger.error("❌ Erro no COPY para %s: %s", table, e)
+        _rollback_after_error(conn)
+        raise
+
+    logger.info("✅ %s linha(s) carregada(s) via COPY em %s", total_rows, table)
+    return total_rows
+
+
+def iter_query_batches(
+        conn,
+        query: str,
+        params: Optional[Any] = None,
+        batch_size: int = 5000,
+        cursor_name: Optional[str] = None
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Executa query com cursor nomeado (server-side) e entrega os resultados em lotes
+
+    Diferente de execute_query, não materializa o resultado inteiro: o PostgreSQL
+    envia no máximo batch_size linhas por vez, limitando o pico de memória.
+    Deve ser consumido com a conexão aberta (fora de autocommit).
+
+    Args:
+        conn: Conexão psycopg2
+        query: Query SQL a ser executada
+        params: Parâmetros para a query (tupla ou dict para %(nome)s, opcional)
+        batch_size: Linhas por lote (também usado como itersize do cursor)
+        cursor_name: Nome do cursor server-side (padrão: nome único gerado)
+
+    Yields:
+        Listas de dicionários com até batch_size linhas
+
+    Example:
+        for batch in iter_query_batches(conn, "SELECT * FROM tabela"):
+            process(batch)
+    """
+    logger = get_run_logger()
+
+    with conn.cursor(name=cursor_name or f"s_{uuid4().hex}") as cursor:
+        cursor.itersize = batch_size
+        cursor.execute(query, params)
+
+        total_rows = 0
+        columns = None
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            # Em cursor nomeado, description só existe após o primeiro fetch
+            if columns is None:
+                columns = [column.name for column in cursor.description]
+            total_rows += len(rows)
+            yield [dict(zip(columns, row)) for row in rows]
+
+    logger.info("✅ Query executada com sucesso: %s linha(s) retornada(s) via cursor server-side", total_rows)
+
+
+def iter_query_rows(
+        conn,
+        query: str,
+        params: Optional[Any] = None,
+        batch_size: int = FETCH_BATCH_SIZE
+) -> Iterator[Dict[str, Any]]:
+    """
+    Versão linha a linha de iter_query_batches
+
+    Args:
+        conn: Conexão psycopg2
+        query: Query SQL a ser executada
+        params: Parâmetros para a query (opcional)
+        batch_size: Linhas trazidas do servidor por vez
+
+    Returns:
+        Iterador com um dicionário por linha
+    """
+    return chain.from_iterable(iter_query_batches(conn, query, params, batch_size=batch_size))
+
+
 def close_postgresql_connection(conn):
     """
     Fecha conexão PostgreSQL de forma segura
@@ -244,7 +838,7 @@ def close_postgresql_connection(conn):
             conn.close()
         logger.info("✅ Conexão PostgreSQL fechada com sucesso")
     except Exception as e:
-        logger.warning(f"⚠️ Aviso ao fechar conexão: {str(e)}")
+        logger.warning("⚠️ Aviso ao fechar conexão: %s", e)
 
 
 def format_query_with_params(query: str, **kwargs) -> str:
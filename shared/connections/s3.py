@@ -1,11 +1,79 @@
 import os
 import io
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.config import Config
 from botocore.exceptions import ClientError
 import pandas as pd
+import pyarrow.csv as pa_csv
 from prefect import get_run_logger
 
+# Download: objetos acima de 8 MB são baixados em partes (range GET) paralelas
+S3_DOWNLOAD_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    max_concurrency=10,
+    use_threads=True
+)
+
+# Upload: multipart paralelo acima de 8 MB; arquivos grandes usam partes
+# maiores para reduzir o número de requisições (limite de 10k partes)
+S3_UPLOAD_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=16 * 1024 * 1024,
+    max_concurrency=16,
+    use_threads=True,
+    io_chunksize=2 * 1024 * 1024
+)
+S3_LARGE_UPLOAD_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=64 * 1024 * 1024,
+    max_concurrency=16,
+    use_threads=True,
+    io_chunksize=2 * 1024 * 1024
+)
+S3_LARGE_UPLOAD_BYTES = 1024 * 1024 * 1024
+
+# Parser PyArrow (use_arrow=True): blocos de 16 MB parseados em paralelo
+ARROW_CSV_BLOCK_SIZE = 16 * 1024 * 1024
+
+# Listagem: prefixos listados em paralelo por list_files
+S3_LIST_MAX_WORKERS = 16
+
+
+# Conexões HTTPS mantidas por cliente (compartilhadas entre threads)
+S3_MAX_POOL_CONNECTIONS = 50
+
+
+@lru_cache(maxsize=8)
+def _create_s3_client(
+        aws_access_key_id: str,
+        aws_secret_access_key: str,
+        region_name: str,
+        max_retries: int
+):
+    """
+    Cria o cliente S3 uma única vez por credencial/região no processo
+
+    Criar um cliente boto3 carrega os modelos do serviço e monta os resolvers
+    de endpoint; o cliente é thread-safe e mantém o pool de conexões HTTPS.
+    """
+    session = boto3.session.Session(
+        aws_access_key_id=aws_access_key_id,
+        aws_secret_access_key=aws_secret_access_key,
+        region_name=region_name,
+    )
+
+    return session.client(
+        "s3",
+        config=Config(
+            max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+            retries={"max_attempts": max_retries, "mode": "adaptive"},
+            tcp_keepalive=True
+        )
+    )
+
 
 def connect_s3(
         aws_access_key_id: str = None,
@@ -16,6 +84,9 @@ def connect_s3(
     """
     Cria cliente S3 com autenticação por access key.
 
+    O cliente é reaproveitado entre chamadas com as mesmas credenciais,
+    região e max_retries.
+
     Args:
         aws_access_key_id: AWS Access Key ID
         aws_secret_access_key: AWS Secret Access Key
@@ -35,72 +106,97 @@ def connect_s3(
     if not aws_access_key_id or not aws_secret_access_key:
         raise ValueError("Credenciais AWS não fornecidas. Configure AWS_ACCESS_KEY_ID e AWS_SECRET_ACCESS_KEY")
 
-    logger.info(f"Conectando ao S3 na região {region_name}...")
+    logger.info("Conectando ao S3 na região %s...", region_name)
 
-    session = boto3.session.Session(
-        aws_access_key_id=aws_access_key_id,
-        aws_secret_access_key=aws_secret_access_key,
-        region_name=region_name,
-    )
-
-    s3_client = session.client(
-        "s3",
-        config=Config(retries={"max_attempts": max_retries, "mode": "standard"})
-    )
+    s3_client = _create_s3_client(aws_access_key_id, aws_secret_access_key, region_name, max_retries)
 
     logger.info("✓ Conexão S3 estabelecida")
     return s3_client
 
 
+def _collect_objects(page: dict, suffix: str, files: list) -> None:
+    """Adiciona a files os objetos da página, ignorando diretórios e filtrando por sufixo"""
+    for obj in page.get('Contents', []):
+        key = obj['Key']
+
+        # Ignora diretórios
+        if key.endswith('/'):
+            continue
+
+        # Filtra por sufixo se especificado
+        if suffix and not key.endswith(suffix):
+            continue
+
+        files.append({
+            'key': key,
+            'size': obj['Size'],
+            'last_modified': obj['LastModified'],
+            'etag': obj.get('ETag', '').strip('"')
+        })
+
+
+def _list_prefix(s3_client, bucket: str, prefix: str, suffix: str) -> list:
+    """Lista recursivamente todos os objetos de um prefixo"""
+    files = []
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        _collect_objects(page, suffix, files)
+    return files
+
+
 def list_files(
         s3_client,
         bucket: str,
         prefix: str = "",
-        suffix: str = None
+        suffix: str = None,
+        prefixes: list = None,
+        max_workers: int = S3_LIST_MAX_WORKERS
 ) -> list:
     """
     Lista arquivos em um bucket S3.
 
+    A listagem é dividida por subprefixo e feita em paralelo: cada chamada
+    ListObjectsV2 tem latência própria, então prefixos independentes não
+    precisam esperar uns pelos outros. Sem prefixes, os subprefixos diretos de
+    prefix são descobertos com Delimiter='/'.
+
     Args:
         s3_client: Cliente S3 boto3
         bucket: Nome do bucket
         prefix: Prefixo do caminho (pasta)
         suffix: Extensão dos arquivos (ex: '.csv')
+        prefixes: Subprefixos a listar em paralelo (opcional)
+        max_workers: Máximo de listagens simultâneas (padrão: 16)
 
     Returns:
         list: Lista de dicionários com metadados dos arquivos
     """
     logger = get_run_logger()
-    logger.info(f"Listando arquivos: s3://{bucket}/{prefix}")
+    logger.info("Listando arquivos: s3://%s/%s", bucket, prefix)
 
     files = []
-    paginator = s3_client.get_paginator('list_objects_v2')
 
     try:
-        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
-            for obj in page.get('Contents', []):
-                key = obj['Key']
-
-                # Ignora diretórios
-                if key.endswith('/'):
-                    continue
-
-                # Filtra por sufixo se especificado
-                if suffix and not key.endswith(suffix):
-                    continue
-
-                files.append({
-                    'key': key,
-                    'size': obj['Size'],
-                    'last_modified': obj['LastModified'],
-                    'etag': obj.get('ETag', '').strip('"')
-                })
-
-        logger.info(f"✓ Encontrados {len(files)} arquivo(s)")
+        if prefixes is None:
+            # Objetos do primeiro nível + subprefixos a listar em paralelo
+            prefixes = []
+            paginator = s3_client.get_paginator('list_objects_v2')
+            for page in paginator.paginate(Bucket=bucket, Prefix=prefix, Delimiter='/'):
+                _collect_objects(page, suffix, files)
+                prefixes.extend(p['Prefix'] for p in page.get('CommonPrefixes', []))
+
+        if prefixes:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(prefixes))) as executor:
+                for prefix_files in executor.map(
+                        lambda p: _list_prefix(s3_client, bucket, p, suffix), prefixes
+                ):
+                    files.extend(prefix_files)
+
+        logger.info("✓ Encontrados %s arquivo(s)", len(files))
         return files
 
     except ClientError as e:
-        logger.error(f"Erro ao listar arquivos: {e}")
+        logger.error("Erro ao listar arquivos: %s", e)
         raise
 
 
@@ -109,16 +205,23 @@ def read_csv_from_s3(
         bucket: str,
         key: str,
         encoding: str = 'utf-8',
+        use_arrow: bool = False,
         **kwargs
 ) -> pd.DataFrame:
     """
     Lê arquivo CSV do S3 para DataFrame.
 
+    Com use_arrow=True o CSV é parseado pelo PyArrow em várias threads (blocos
+    de 16 MB) e convertido para pandas no final. A inferência de tipos do
+    PyArrow difere da do pandas (ex: datas ISO viram datetime), por isso é
+    opt-in; nesse modo **kwargs não é usado.
+
     Args:
         s3_client: Cliente S3 boto3
         bucket: Nome do bucket
         key: Chave (caminho) do arquivo
         encoding: Encoding do arquivo (padrão: utf-8)
+        use_arrow: Se deve usar o parser multi-thread do PyArrow (padrão: False)
         **kwargs: Argumentos adicionais para pd.read_csv
 
     Returns:
@@ -127,8 +230,26 @@ def read_csv_from_s3(
     logger = get_run_logger()
 
     try:
-        response = s3_client.get_object(Bucket=bucket, Key=key)
-        content = response['Body'].read()
+        # Download paralelo em partes (TransferConfig) para um buffer em memória
+        content = io.BytesIO()
+        s3_client.download_fileobj(bucket, key, content, Config=S3_DOWNLOAD_CONFIG)
+        content.seek(0)
+
+        if use_arrow:
+            table = pa_csv.read_csv(
+                content,
+                read_options=pa_csv.ReadOptions(
+                    encoding=encoding,
+                    block_size=ARROW_CSV_BLOCK_SIZE,
+                    use_threads=True
+                ),
+                # Mesmo comportamento do on_bad_lines='skip' do pandas
+                parse_options=pa_csv.ParseOptions(invalid_row_handler=lambda row: 'skip')
+            )
+            df = table.to_pandas()
+
+            logger.info("✓ CSV lido (PyArrow): %s linhas, %s colunas", len(df), len(df.columns))
+            return df
 
         # Configurações padrão para leitura robusta
         default_kwargs = {
@@ -138,16 +259,16 @@ def read_csv_from_s3(
         }
         default_kwargs.update(kwargs)
 
-        df = pd.read_csv(io.BytesIO(content), **default_kwargs)
+        df = pd.read_csv(content, **default_kwargs)
 
-        logger.info(f"✓ CSV lido: {len(df)} linhas, {len(df.columns)} colunas")
+        logger.info("✓ CSV lido: %s linhas, %s colunas", len(df), len(df.columns))
         return df
 
     except ClientError as e:
-        logger.error(f"Erro ao ler CSV {key}: {e}")
+        logger.error("Erro ao ler CSV %s: %s", key, e)
         raise
     except Exception as e:
-        logger.error(f"Erro ao processar CSV {key}: {e}")
+        logger.error("Erro ao processar CSV %s: %s", key, e)
         raise
 
 
@@ -178,7 +299,7 @@ def get_file_metadata(
         }
     except ClientError as e:
         logger = get_run_logger()
-        logger.error(f"Erro ao obter metadados de {key}: {e}")
+        logger.error("Erro ao obter metadados de %s: %s", key, e)
         raise
 
 
@@ -192,6 +313,8 @@ def upload_file(
     """
     Faz upload de arquivo local para S3.
 
+    Acima de 8 MB o envio é multipart, com até 16 partes simultâneas.
+
     Args:
         s3_client: Cliente S3 boto3
         file_path: Caminho do arquivo local
@@ -205,9 +328,10 @@ def upload_file(
     logger = get_run_logger()
 
     try:
-        s3_client.upload_file(file_path, bucket, key, ExtraArgs=extra_args or {})
-        logger.info(f"✓ Upload concluído: {key}")
+        config = S3_LARGE_UPLOAD_CONFIG if os.path.getsize(file_path) > S3_LARGE_UPLOAD_BYTES else S3_UPLOAD_CONFIG
+        s3_client.upload_file(file_path, bucket, key, ExtraArgs=extra_args or {}, Config=config)
+        logger.info("✓ Upload concluído: %s", key)
         return True
     except ClientError as e:
-        logger.error(f"Erro no upload de {file_path}: {e}")
+        logger.error("Erro no upload de %s: %s", file_path, e)
         raise
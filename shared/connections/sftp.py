@@ -1,14 +1,39 @@
 import io
 import os
 import csv
+import base64
+import codecs
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 import paramiko
 from paramiko import RSAKey, Ed25519Key
 from prefect import task
 from prefect.logging import get_run_logger
 from prefect.cache_policies import NONE as NO_CACHE
 
+# Download: leituras de 1 MB com prefetch (várias requisições SFTP em voo) e
+# gravação em disco numa thread separada, sobrepondo rede e disco
+SFTP_READ_CHUNK_SIZE = 1 << 20
+
+# Janela do prefetch: requisições de leitura SFTP em voo ao mesmo tempo. Cada
+# requisição usa o tamanho padrão do paramiko (32 KB, aceito por qualquer
+# servidor), então 256 requisições = 8 MB em trânsito, o suficiente para
+# encher o link mesmo com RTT alto sem acumular o arquivo inteiro em memória
+SFTP_PREFETCH_MAX_REQUESTS = 256
+
+# Chaves privadas já parseadas, por hash da chave + passphrase
+_KEY_CACHE: Dict[bytes, Any] = {}
+_KEY_CACHE_LOCK = threading.Lock()
+
+# Bytes lidos do início do arquivo para detectar o encoding
+ENCODING_SAMPLE_SIZE = 64 * 1024
+
+# Bloco da cópia binária do corpo do CSV em normalize_csv_header
+CSV_COPY_CHUNK_SIZE = 1 << 20
+
 
 @task(retries=3, retry_delay_seconds=10)
 def connect_sftp(
@@ -46,7 +71,7 @@ def connect_sftp(
         pkey = _load_private_key(private_key, private_key_path, passphrase, logger)
 
         # Conecta via SSH
-        logger.info(f"Conectando ao servidor SFTP: {host}:{port}")
+        logger.info("Conectando ao servidor SFTP: %s:%s", host, port)
         ssh_client.connect(
             hostname=host,
             port=port,
@@ -57,12 +82,12 @@ def connect_sftp(
 
         # Abre sessão SFTP
         sftp_client = ssh_client.open_sftp()
-        logger.info(f"✅ Conexão SFTP estabelecida com sucesso em {host}")
+        logger.info("✅ Conexão SFTP estabelecida com sucesso em %s", host)
 
         return sftp_client, ssh_client
 
     except Exception as e:
-        logger.error(f"❌ Erro ao conectar SFTP: {str(e)}")
+        logger.error("❌ Erro ao conectar SFTP: %s", e)
         raise Exception(f"Falha na conexão SFTP: {str(e)}") from e
 
 
@@ -83,7 +108,7 @@ def _load_private_key(
 
     # Opção 2: Chave de arquivo
     elif private_key_path:
-        logger.info(f"Carregando chave privada do arquivo: {private_key_path}")
+        logger.info("Carregando chave privada do arquivo: %s", private_key_path)
 
         if not os.path.exists(private_key_path):
             raise FileNotFoundError(f"Arquivo não encontrado: {private_key_path}")
@@ -96,16 +121,66 @@ def _load_private_key(
         )
 
 
-def _load_key_from_string(key_string: str, passphrase: Optional[str] = None):
-    """Carrega chave de uma string"""
-    key_types = [(RSAKey, "RSA"), (Ed25519Key, "Ed25519")]
+def _key_classes(key_string: str) -> list:
+    """
+    Ordena as classes de chave pelo tipo indicado no PEM, evitando tentativas com erro
+
+    No formato OpenSSH o tipo não está no cabeçalho, mas sim no bloco público
+    (não criptografado) logo no início do conteúdo base64.
+    """
+    if "BEGIN RSA PRIVATE KEY" in key_string:
+        return [RSAKey, Ed25519Key]
+
+    if "BEGIN OPENSSH PRIVATE KEY" in key_string:
+        body = "".join(
+            line for line in key_string.strip().splitlines()
+            if line and not line.startswith("-----")
+        )
+        try:
+            if b"ssh-ed25519" in base64.b64decode(body[:400] + "=" * (-len(body[:400]) % 4)):
+                return [Ed25519Key, RSAKey]
+        except ValueError:
+            pass
+
+    return [RSAKey, Ed25519Key]
+
+
+def _parse_key(key_string: str, passphrase: Optional[str]):
+    """
+    Faz o parse da chave uma única vez por processo
+
+    O cache é indexado pelo hash (blake2b) da chave + passphrase, sem guardar
+    o texto da chave.
 
-    for key_class, key_type in key_types:
+    Returns:
+        Chave paramiko, ou None se nenhum formato suportado funcionar
+    """
+    cache_key = hashlib.blake2b(f"{key_string}\0{passphrase or ''}".encode()).digest()
+
+    with _KEY_CACHE_LOCK:
+        pkey = _KEY_CACHE.get(cache_key)
+    if pkey is not None:
+        return pkey
+
+    for key_class in _key_classes(key_string):
         try:
-            key_file = io.StringIO(key_string)
-            return key_class.from_private_key(key_file, password=passphrase)
+            pkey = key_class.from_private_key(io.StringIO(key_string), password=passphrase)
+            break
         except Exception:
             continue
+    else:
+        return None
+
+    with _KEY_CACHE_LOCK:
+        _KEY_CACHE[cache_key] = pkey
+    return pkey
+
+
+def _load_key_from_string(key_string: str, passphrase: Optional[str] = None):
+    """Carrega chave de uma string"""
+    pkey = _parse_key(key_string, passphrase)
+    if pkey is not None:
+        return pkey
 
     raise Exception(
         "Não foi possível carregar a chave. "
@@ -117,13 +192,10 @@ def _load_key_from_string(key_string: str, passphrase: Optional[str] = None):
 
 def _load_key_from_file(key_path: str, passphrase: Optional[str] = None):
     """Carrega chave de um arquivo"""
-    key_types = [(RSAKey, "RSA"), (Ed25519Key, "Ed25519")]
-
-    for key_class, key_type in key_types:
-        try:
-            return key_class.from_private_key_file(key_path, password=passphrase)
-        except Exception:
-            continue
+    with open(key_path, 'r') as key_file:
+        pkey = _parse_key(key_file.read(), passphrase)
+    if pkey is not None:
+        return pkey
 
     raise Exception(
         f"Não foi possível carregar a chave do arquivo {key_path}. "
@@ -133,7 +205,6 @@ def _load_key_from_file(key_path: str, passphrase: Optional[str] = None):
     )
 
 
-@task(cache_policy=NO_CACHE)
 def list_csv_files(sftp_client, remote_folder: str) -> List[Dict[str, Any]]:
     """
     Lista todos os arquivos CSV de uma pasta SFTP com seus metadados
@@ -165,22 +236,21 @@ def list_csv_files(sftp_client, remote_folder: str) -> List[Dict[str, Any]]:
         ]
 
         if not csv_files:
-            logger.warning(f"⚠️ Nenhum arquivo CSV encontrado em {remote_folder}")
+            logger.warning("⚠️ Nenhum arquivo CSV encontrado em %s", remote_folder)
             return []
 
         # Ordena por data de modificação (mais recente primeiro)
         csv_files.sort(key=lambda x: x["modified_timestamp"], reverse=True)
 
-        logger.info(f"✅ {len(csv_files)} arquivo(s) CSV encontrado(s) em {remote_folder}")
+        logger.info("✅ %s arquivo(s) CSV encontrado(s) em %s", len(csv_files), remote_folder)
 
         return csv_files
 
     except Exception as e:
-        logger.error(f"❌ Erro ao listar arquivos em {remote_folder}: {str(e)}")
+        logger.error("❌ Erro ao listar arquivos em %s: %s", remote_folder, e)
         raise
 
 
-@task(cache_policy=NO_CACHE)
 def get_latest_file(sftp_client, remote_folder: str) -> Optional[Dict[str, Any]]:
     """
     Retorna o arquivo CSV mais recente (por data de modificação) de uma pasta SFTP
@@ -194,7 +264,7 @@ def get_latest_file(sftp_client, remote_folder: str) -> Optional[Dict[str, Any]]
     """
     logger = get_run_logger()
 
-    csv_files = list_csv_files.fn(sftp_client, remote_folder)
+    csv_files = list_csv_files(sftp_client, remote_folder)
 
     if not csv_files:
         return None
@@ -210,32 +280,31 @@ def get_latest_file(sftp_client, remote_folder: str) -> Optional[Dict[str, Any]]
 
 def _detect_encoding(file_path: str, logger) -> str:
     """
-    Detecta o encoding de um arquivo tentando os formatos mais comuns
+    Detecta o encoding de um arquivo a partir do BOM e de uma amostra inicial
+
+    Lê apenas ENCODING_SAMPLE_SIZE bytes, uma única vez, independente do
+    tamanho do arquivo.
     """
-    # Lista de encodings para tentar, em ordem de prioridade
-    encodings = [
-        'utf-16',      # UTF-16 com BOM (comum em arquivos do Windows/Salesforce)
-        'utf-16-le',   # UTF-16 Little Endian
-        'utf-16-be',   # UTF-16 Big Endian
-        'utf-8',       # UTF-8
-        'utf-8-sig',   # UTF-8 com BOM
-        'latin-1',     # ISO-8859-1
-        'cp1252',      # Windows-1252
-    ]
-
-    for encoding in encodings:
+    with open(file_path, 'rb') as f:
+        sample = f.read(ENCODING_SAMPLE_SIZE)
+
+    # BOM: resposta imediata (comum em arquivos do Windows/Salesforce)
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+
+    # UTF-16 sem BOM: texto majoritariamente ASCII tem um byte nulo a cada dois
+    if sample.count(b'\x00') > len(sample) // 4:
+        return 'utf-16-le' if sample[1::2].count(b'\x00') > sample[0::2].count(b'\x00') else 'utf-16-be'
+
+    # Decodificação incremental: um caractere multibyte cortado no fim da
+    # amostra não conta como erro
+    for encoding in ('utf-8', 'latin-1'):
         try:
-            with open(file_path, 'r', encoding=encoding) as f:
-                # Tenta ler as primeiras 1000 linhas para validar
-                for _ in range(1000):
-                    line = f.readline()
-                    if not line:
-                        break
-                # Se chegou aqui, o encoding funciona
-                return encoding
-        except (UnicodeDecodeError, UnicodeError):
-            continue
-        except Exception:
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            return encoding
+        except UnicodeDecodeError:
             continue
 
     # Fallback para utf-8 com tratamento de erros
@@ -243,6 +312,32 @@ def _detect_encoding(file_path: str, logger) -> str:
     return 'utf-8'
 
 
+def _download_file(sftp_client, remote_file_path: str, local_file_path: str, file_size: int) -> None:
+    """
+    Baixa o arquivo remoto em blocos, gravando o bloco anterior enquanto lê o próximo
+
+    O arquivo local não recebe posix_fadvise(DONTNEED): ele é relido logo em
+    seguida (detecção de encoding e normalização do cabeçalho), e o page cache
+    evita essa segunda leitura do disco.
+    """
+    with sftp_client.open(remote_file_path, 'rb') as remote_file, \
+            open(local_file_path, 'wb') as local_file, \
+            ThreadPoolExecutor(max_workers=1) as writer:
+        remote_file.prefetch(file_size, max_concurrent_requests=SFTP_PREFETCH_MAX_REQUESTS)
+
+        pending_write = None
+        while True:
+            chunk = remote_file.read(SFTP_READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            if pending_write is not None:
+                pending_write.result()
+            pending_write = writer.submit(local_file.write, chunk)
+
+        if pending_write is not None:
+            pending_write.result()
+
+
 @task(cache_policy=NO_CACHE)
 def download_csv_from_sftp(sftp_client, remote_file_path: str) -> Dict[str, Any]:
     """
@@ -261,7 +356,7 @@ def download_csv_from_sftp(sftp_client, remote_file_path: str) -> Dict[str, Any]
         # Verifica tamanho do arquivo
         file_attrs = sftp_client.stat(remote_file_path)
         file_size_mb = file_attrs.st_size / (1024 * 1024)
-        logger.info(f"📥 Baixando arquivo: {remote_file_path} ({file_size_mb:.2f} MB)")
+        logger.info("📥 Baixando arquivo: %s (%.2f MB)", remote_file_path, file_size_mb)
 
         # Cria arquivo temporário (modo binário para download)
         import tempfile
@@ -269,55 +364,132 @@ def download_csv_from_sftp(sftp_client, remote_file_path: str) -> Dict[str, Any]
         temp_file_path = temp_file.name
         temp_file.close()
 
-        # Download otimizado com prefetch
-        sftp_client.get(remote_file_path, temp_file_path)
+        # Download com prefetch, sobrepondo leitura remota e gravação local
+        _download_file(sftp_client, remote_file_path, temp_file_path, file_attrs.st_size)
 
         # Detecta encoding
         encoding = _detect_encoding(temp_file_path, logger)
-        logger.info(f"📄 Encoding detectado: {encoding}")
+        logger.info("📄 Encoding detectado: %s", encoding)
 
-        # Conta linhas (rápido, só lê sem processar)
-        with open(temp_file_path, 'r', encoding=encoding) as f:
-            num_lines = sum(1 for _ in f) - 1  # -1 para o cabeçalho
-
-        logger.info(f"✅ Download concluído: {num_lines:_} registros ({file_size_mb:.2f} MB)".replace('_', '.'))
+        # A contagem de registros é feita por normalize_csv_header, na mesma
+        # passada que reescreve o arquivo
+        logger.info("✅ Download concluído (%.2f MB)", file_size_mb)
 
         return {
             "file_path": temp_file_path,
             "encoding": encoding,
             "source_file": os.path.basename(remote_file_path),
-            "extracted_at": datetime.now().isoformat(),
-            "num_records": num_lines
+            "extracted_at": datetime.now().isoformat()
         }
 
     except Exception as e:
-        logger.error(f"❌ Erro ao baixar CSV {remote_file_path}: {str(e)}")
+        logger.error("❌ Erro ao baixar CSV %s: %s", remote_file_path, e)
         raise
 
 
+def _copy_counting_lines(src, dst) -> int:
+    """
+    Copia src para dst em blocos (binários ou de texto), contando as linhas copiadas
+    """
+    num_lines = 0
+    last_chunk = None
+    while True:
+        chunk = src.read(CSV_COPY_CHUNK_SIZE)
+        if not chunk:
+            break
+        dst.write(chunk)
+        newline = b'\n' if isinstance(chunk, bytes) else '\n'
+        num_lines += chunk.count(newline)
+        last_chunk = chunk
+
+    # Última linha sem quebra de linha no final
+    if last_chunk and not last_chunk.endswith(newline):
+        num_lines += 1
+    return num_lines
+
+
+def _swap_csv_header(
+        csv_file_path: str,
+        encoding: str,
+        column_mapping: Dict[str, str],
+        temp_path: str
+) -> Optional[int]:
+    """
+    Troca o cabeçalho do CSV e copia o corpo em blocos, sem parsear as linhas
+
+    Em UTF-8 o corpo é copiado byte a byte; nos demais encodings é copiado em
+    blocos de texto, só transcodificando para UTF-8.
+
+    Returns:
+        Número de registros, ou None se o cabeçalho ocupar mais de uma linha
+        (campo entre aspas com quebra de linha) e o caminho por CSV for necessário
+    """
+    binary = codecs.lookup(encoding).name in ('utf-8', 'utf-8-sig')
+
+    if binary:
+        input_file = open(csv_file_path, 'rb')
+    else:
+        input_file = open(csv_file_path, 'r', encoding=encoding, newline='')
+
+    with input_file:
+        header_line = input_file.readline()
+        if binary:
+            header_line = header_line.decode(encoding)
+        if header_line.count('"') % 2:
+            return None
+
+        header = next(csv.reader([header_line]), [])
+        normalized_header = [column_mapping.get(col, col) for col in header]
+
+        header_buffer = io.StringIO()
+        line_terminator = '\r\n' if header_line.endswith('\r\n') else '\n'
+        csv.writer(header_buffer, lineterminator=line_terminator).writerow(normalized_header)
+
+        if binary:
+            with open(temp_path, 'wb') as output_file:
+                output_file.write(header_buffer.getvalue().encode('utf-8'))
+                return _copy_counting_lines(input_file, output_file)
+
+        with open(temp_path, 'w', encoding='utf-8', newline='') as output_file:
+            output_file.write(header_buffer.getvalue())
+            return _copy_counting_lines(input_file, output_file)
+
+
 def normalize_csv_header(
         csv_file_path: str,
         encoding: str,
         column_mapping: Dict[str, str]
-) -> str:
+) -> Tuple[str, int]:
     """
     Normaliza apenas o cabeçalho (primeira linha) do CSV
 
+    O corpo é copiado em blocos, sem parsear as linhas (em UTF-8, byte a byte;
+    nos demais encodings, só transcodificado), e os registros são contados na
+    mesma passada (contagem de linhas, não de registros CSV). Cabeçalhos com
+    quebra de linha dentro de aspas usam o caminho por csv.reader/csv.writer.
+
     Args:
         csv_file_path: Caminho do arquivo CSV
         encoding: Encoding do arquivo
         column_mapping: Mapeamento {original: normalizado}
 
     Returns:
-        Caminho do novo arquivo com cabeçalho normalizado
+        Tupla (caminho do novo arquivo com cabeçalho normalizado, número de registros)
     """
     import tempfile
 
     # Cria arquivo temporário para o CSV normalizado
     temp_file = tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.csv', encoding='utf-8', newline='')
     temp_path = temp_file.name
+    temp_file.close()
 
-    with open(csv_file_path, 'r', encoding=encoding) as input_file:
+    num_records = _swap_csv_header(csv_file_path, encoding, column_mapping, temp_path)
+    if num_records is not None:
+        os.unlink(csv_file_path)
+        return temp_path, num_records
+
+    with open(csv_file_path, 'r', encoding=encoding) as input_file, \
+            open(temp_path, 'w', encoding='utf-8', newline='') as output_file:
         reader = csv.reader(input_file)
 
         # Lê e normaliza o cabeçalho
@@ -325,22 +497,21 @@ def normalize_csv_header(
         normalized_header = [column_mapping.get(col, col) for col in header]
 
         # Escreve cabeçalho normalizado
-        writer = csv.writer(temp_file)
+        writer = csv.writer(output_file)
         writer.writerow(normalized_header)
 
-        # Copia o resto das linhas sem modificação
+        # Copia o resto das linhas sem modificação, contando os registros
+        num_records = 0
         for row in reader:
             writer.writerow(row)
-
-    temp_file.close()
+            num_records += 1
 
     # Remove arquivo original
     os.unlink(csv_file_path)
 
-    return temp_path
+    return temp_path, num_records
 
 
-@task(cache_policy=NO_CACHE)
 def close_sftp_connection(sftp_client, ssh_client):
     """
     Fecha conexão SFTP e SSH de forma segura
@@ -358,4 +529,4 @@ def close_sftp_connection(sftp_client, ssh_client):
             ssh_client.close()
         logger.info("✅ Conexão SFTP fechada com sucesso")
     except Exception as e:
-        logger.warning(f"⚠️ Aviso ao fechar conexão: {str(e)}")
+        logger.warning("⚠️ Aviso ao fechar conexão: %s", e)
@@ -1,65 +1,304 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator, Tuple, Union, Collection, Sequence
 from contextlib import contextmanager
+from functools import lru_cache
 from prefect import task
 from prefect.logging import get_run_logger
 from prefect.cache_policies import NONE as NO_CACHE
 import snowflake.connector
 from snowflake.connector import DictCursor
-from cryptography.hazmat.backends import default_backend
+from snowflake.connector.errors import NotSupportedError
+from snowflake.connector.pandas_tools import write_pandas
 from cryptography.hazmat.primitives import serialization
 import re
 import os
+import time
+import atexit
+import logging
+import base64
+import hashlib
+import threading
+import codecs
+import shutil
+import tempfile
+from pathlib import PurePath
+from collections import OrderedDict
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
 
 # Whitelist de identifiers permitidos
-ALLOWED_DATABASES = ['AJ_DATALAKEHOUSE_RPA', 'AJ_DATALAKEHOUSE_MKT']
-ALLOWED_SCHEMAS = ['BRONZE', 'GOLD', 'SILVER', 'PUBLIC']
+ALLOWED_DATABASES = frozenset({'AJ_DATALAKEHOUSE_RPA', 'AJ_DATALAKEHOUSE_MKT'})
+ALLOWED_SCHEMAS = frozenset({'BRONZE', 'GOLD', 'SILVER', 'PUBLIC'})
+
+# Identifier seguro: só letras, dígitos e underscore (\Z não aceita '\n' final, ao contrário de $)
+_IDENTIFIER_MATCH = re.compile(r'\A[A-Za-z0-9_]+\Z').match
+
+# Carga de CSV grande: arquivos acima de CSV_SHARD_SIZE_MB são divididos em
+# partes, enviadas por PUTs paralelos e carregadas por um único COPY INTO
+# (o Snowflake lê um arquivo por thread do warehouse)
+CSV_SHARD_SIZE_MB = 200
+CSV_SHARD_READ_BLOCK = 8 * 1024 * 1024
+PUT_PARALLEL = 4
+
+# COPY INTO em lotes de COPY_BATCH_FILES arquivos já enviados, enquanto as
+# demais partes ainda estão no PUT
+COPY_BATCH_FILES = 4
+
+# Transcodificação UTF-16 -> UTF-8 antes do PUT (caracteres por leitura)
+TRANSCODE_CHUNK_CHARS = 1 << 20
+
+# Formato parquet: CSV convertido localmente em blocos de 64 MB para Parquet
+# (zstd), carregado com MATCH_BY_COLUMN_NAME
+PARQUET_CSV_BLOCK_SIZE = 64 * 1024 * 1024
+PARQUET_COMPRESSION_LEVEL = 3
+
+# Linhas por lote entregues por iter_query_batches
+FETCH_BATCH_SIZE = 50_000
+
+# insert_dataframe (write_pandas): linhas por arquivo Parquet enviado ao stage
+DATAFRAME_CHUNK_SIZE = 500_000
+
+# COPY INTO do insert_csv_file_replace, montados uma vez (por encoding no CSV)
+_COPY_CSV_TEMPLATE = """
+        COPY INTO {{table}} ({{columns}})
+        FROM {{stage}}
+        FILES = ({{files}})
+        FILE_FORMAT = (
+            TYPE = 'CSV'
+            ENCODING = '{encoding}'
+            FIELD_OPTIONALLY_ENCLOSED_BY = '"'
+            SKIP_HEADER = 1
+            NULL_IF = ('NULL', 'null', '')
+            EMPTY_FIELD_AS_NULL = TRUE
+            COMPRESSION = 'AUTO'
+        )
+        ON_ERROR = 'ABORT_STATEMENT'
+        PURGE = TRUE
+        """
+_COPY_CSV_TEMPLATES = {
+    encoding: _COPY_CSV_TEMPLATE.format(encoding=encoding) for encoding in ('UTF8', 'UTF16')
+}
+_COPY_PARQUET_TEMPLATE = """
+        COPY INTO {table}
+        FROM {stage}
+        FILES = ({files})
+        FILE_FORMAT = (TYPE = 'PARQUET')
+        MATCH_BY_COLUMN_NAME = CASE_INSENSITIVE
+        ON_ERROR = 'ABORT_STATEMENT'
+        PURGE = TRUE
+        """
+
+# Intervalo de polling de queries assíncronas (execute_async), em segundos
+ASYNC_POLL_INTERVAL = 0.1
+
+# Bloco lido do início do CSV para extrair o cabeçalho
+CSV_HEADER_READ_BLOCK = 64 * 1024
+
+# Chaves privadas já convertidas para DER, por (hash da chave, hash da passphrase),
+# em LRU limitado a PRIVATE_KEY_CACHE_MAXSIZE chaves
+PRIVATE_KEY_CACHE_MAXSIZE = 16
+_PRIVATE_KEY_CACHE: "OrderedDict[tuple, bytes]" = OrderedDict()
+_PRIVATE_KEY_CACHE_LOCK = threading.Lock()
+
+# Pool de conexões ociosas por (account, user, warehouse, database, schema, role):
+# close_snowflake_connection devolve a conexão ao pool e connect_snowflake a
+# reutiliza, evitando um novo handshake TLS + login por chave a cada conexão.
+# Conexões ociosas há mais de POOL_PING_AFTER_SECONDS são testadas com SELECT 1.
+POOL_MAX_IDLE_PER_KEY = 4
+POOL_PING_AFTER_SECONDS = 60
+_IDLE_CONNECTIONS: Dict[Tuple, List[Tuple[Any, float]]] = {}
+_IDLE_CONNECTIONS_LOCK = threading.Lock()
 
 
-def validate_identifier(value: str, allowed: List[str], param_name: str) -> str:
+def validate_identifier(value: str, allowed: Collection[str], param_name: str) -> str:
     """Valida identifier contra whitelist para prevenir SQL injection"""
     if value not in allowed:
-        raise ValueError(f"Invalid {param_name}: {value}. Allowed: {allowed}")
+        raise ValueError(f"Invalid {param_name}: {value}. Allowed: {sorted(allowed)}")
     return value
 
 
 def sanitize_identifier(value: str) -> str:
     """Remove caracteres perigosos de identifiers"""
-    if not re.match(r'^[A-Za-z0-9_]+$', value):
+    if not _IDENTIFIER_MATCH(value):
         raise ValueError(f"Invalid identifier: {value}. Only alphanumeric and underscore allowed")
     return value
 
 
+def _private_key_fingerprint(private_key_string: str, passphrase: Optional[str] = None) -> Tuple[bytes, bytes]:
+    """Hash (blake2b) da chave e da passphrase: identifica a chave sem guardar o texto"""
+    return (
+        hashlib.blake2b(private_key_string.encode(), digest_size=16).digest(),
+        hashlib.blake2b((passphrase or '').encode(), digest_size=16).digest()
+    )
+
+
 def _load_private_key_bytes(private_key_string: str, passphrase: Optional[str] = None):
     """
     Carrega chave privada para uso com Snowflake
 
+    A conversão é feita uma única vez por processo: o cache é indexado pelo
+    hash (blake2b) da chave e da passphrase, sem guardar o texto da chave.
+
+    Chaves que não são PEM (sem '-----BEGIN') são tratadas como DER PKCS8
+    em base64 e apenas decodificadas, sem passar pelo OpenSSL.
+
     Args:
-        private_key_string: Chave privada em formato PEM (string)
+        private_key_string: Chave privada em formato PEM ou DER PKCS8 em base64 (string)
         passphrase: Passphrase opcional se a chave for criptografada
 
     Returns:
         Bytes da chave privada em formato DER (pkcs8)
     """
+    cache_key = _private_key_fingerprint(private_key_string, passphrase)
+
+    with _PRIVATE_KEY_CACHE_LOCK:
+        private_key_bytes = _PRIVATE_KEY_CACHE.get(cache_key)
+        if private_key_bytes is not None:
+            _PRIVATE_KEY_CACHE.move_to_end(cache_key)
+            return private_key_bytes
+
     # Converte passphrase para bytes se fornecida
     password_bytes = passphrase.encode() if passphrase else None
 
-    # Carrega a chave privada
-    private_key = serialization.load_pem_private_key(
-        private_key_string.encode(),
-        password=password_bytes,
-        backend=default_backend()
-    )
-
-    # Converte para formato DER (PKCS8) que o Snowflake aceita
-    private_key_bytes = private_key.private_bytes(
-        encoding=serialization.Encoding.DER,
-        format=serialization.PrivateFormat.PKCS8,
-        encryption_algorithm=serialization.NoEncryption()
-    )
+    is_pem = private_key_string.lstrip().startswith('-----BEGIN')
+
+    if not is_pem and password_bytes is None:
+        # DER PKCS8 em base64 sem passphrase: já é o formato que o Snowflake aceita
+        private_key_bytes = base64.b64decode(private_key_string)
+    else:
+        # Carrega a chave privada
+        if is_pem:
+            load_key, key_data = serialization.load_pem_private_key, private_key_string.encode()
+        else:
+            load_key, key_data = serialization.load_der_private_key, base64.b64decode(private_key_string)
+
+        # As chaves vêm de Secrets do Prefect (fonte confiável): pula a validação
+        # RSA do OpenSSL, que domina o tempo de carga. cryptography < 39 não
+        # tem o parâmetro e carrega com a validação normal
+        try:
+            private_key = load_key(key_data, password=password_bytes, unsafe_skip_rsa_key_validation=True)
+        except TypeError:
+            private_key = load_key(key_data, password=password_bytes)
+
+        # Converte para formato DER (PKCS8) que o Snowflake aceita
+        private_key_bytes = private_key.private_bytes(
+            encoding=serialization.Encoding.DER,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        )
 
+    with _PRIVATE_KEY_CACHE_LOCK:
+        _PRIVATE_KEY_CACHE[cache_key] = private_key_bytes
+        while len(_PRIVATE_KEY_CACHE) > PRIVATE_KEY_CACHE_MAXSIZE:
+            _PRIVATE_KEY_CACHE.popitem(last=False)
     return private_key_bytes
 
 
+def _checkout_connection(pool_key: Tuple):
+    """
+    Retira uma conexão ociosa e válida do pool
+
+    Returns:
+        Conexão Snowflake, ou None se não houver conexão reutilizável
+    """
+    while True:
+        with _IDLE_CONNECTIONS_LOCK:
+            idle = _IDLE_CONNECTIONS.get(pool_key)
+            if not idle:
+                return None
+            conn, last_use = idle.pop()
+
+        if conn.is_closed():
+            continue
+
+        if time.monotonic() - last_use > POOL_PING_AFTER_SECONDS:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+            except Exception:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+                continue
+
+        return conn
+
+
+def _release_connection(conn) -> bool:
+    """
+    Devolve a conexão ao pool (desfazendo transação pendente)
+
+    Só volta ao pool a conexão cuja sessão ainda corresponde ao destino da
+    chave: se o database/schema/warehouse/role foi trocado (USE ...), ela é
+    fechada. O modo autocommit é restaurado se tiver sido desligado.
+
+    Returns:
+        True se a conexão foi para o pool; False se deve ser fechada
+    """
+    pool_key = getattr(conn, '_pool_key', None)
+    if pool_key is None or conn.is_closed():
+        return False
+
+    try:
+        conn.rollback()
+        if not getattr(conn, '_autocommit', True):
+            conn.autocommit(True)
+    except Exception:
+        return False
+
+    _, _, warehouse, database, schema, role = pool_key[:6]
+    for expected, current in ((warehouse, conn.warehouse), (database, conn.database), (schema, conn.schema), (role, conn.role)):
+        if expected and (current or '').upper() != expected.upper():
+            return False
+
+    with _IDLE_CONNECTIONS_LOCK:
+        idle = _IDLE_CONNECTIONS.setdefault(pool_key, [])
+        if len(idle) >= POOL_MAX_IDLE_PER_KEY:
+            return False
+        idle.append((conn, time.monotonic()))
+    return True
+
+
+def close_all_snowflake_connections(*_hook_args) -> None:
+    """
+    Fecha todas as conexões ociosas do pool do processo
+
+    Aceita os argumentos dos hooks do Prefect, podendo ser usada diretamente em
+    @flow(on_completion=[...], on_failure=[...], on_crashed=[...]). Também é
+    registrada no atexit.
+    """
+    with _IDLE_CONNECTIONS_LOCK:
+        idle = [conn for conns in _IDLE_CONNECTIONS.values() for conn, _ in conns]
+        _IDLE_CONNECTIONS.clear()
+
+    for conn in idle:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+atexit.register(close_all_snowflake_connections)
+
+
+def private_key_to_der_b64(private_key_string: str, passphrase: Optional[str] = None) -> str:
+    """
+    Converte a chave privada (PEM) em DER PKCS8 sem criptografia, em base64
+
+    Feito uma vez no deploy: guardando o resultado em SNOWFLAKE_PRIVATE_KEY
+    (no lugar do PEM, e sem passphrase), _load_private_key_bytes só decodifica
+    o base64, sem parse de PEM/ASN.1 no OpenSSL a cada conexão.
+
+    Example:
+        python -c "import os; from shared.connections.snowflake import private_key_to_der_b64; \\
+            print(private_key_to_der_b64(open('rsa_key.p8').read(), os.getenv('SNOWFLAKE_PRIVATE_KEY_PASSPHRASE')))"
+    """
+    return base64.b64encode(_load_private_key_bytes(private_key_string, passphrase)).decode('ascii')
+
+
 @task(retries=3, retry_delay_seconds=10)
 def connect_snowflake(
         account: str,
@@ -73,15 +312,20 @@ def connect_snowflake(
         timeout: int = 60,
         ocsp_fail_open: bool = True,
         insecure_mode: bool = False,
-        validate_default_parameters: bool = True
+        validate_default_parameters: bool = True,
+        paramstyle: Optional[str] = None
 ):
     """
     Estabelece conexão com Snowflake usando autenticação por chave privada
 
+    Reutiliza uma conexão do pool do processo (devolvida por
+    close_snowflake_connection) quando houver uma para o mesmo destino.
+
     Args:
         account: Nome da conta Snowflake (ex: amdjr.us-east-1)
         user: Usuário Snowflake
-        private_key: Chave privada em formato PEM (string)
+        private_key: Chave privada em formato PEM, ou DER PKCS8 em base64 (mais rápido,
+            ver private_key_to_der_b64)
         warehouse: Warehouse a ser utilizado
         database: Database a ser utilizado
         schema: Schema a ser utilizado
@@ -91,6 +335,9 @@ def connect_snowflake(
         ocsp_fail_open: Permite conexão mesmo se validação OCSP falhar (default: True)
         insecure_mode: Desabilita SSL (use apenas quando necessário, ex: SFTP) (default: False)
         validate_default_parameters: Valida parâmetros padrão do Snowflake (default: True)
+        paramstyle: Estilo de parâmetros da conexão (default: pyformat, %s). Com 'qmark'
+            (?) o bind é feito no servidor, e execute_many em lote grande vira carga
+            via stage em vez de um INSERT gigante montado no cliente
 
     Returns:
         Conexão Snowflake
@@ -102,7 +349,19 @@ def connect_snowflake(
         database = validate_identifier(database, ALLOWED_DATABASES, 'database')
         schema = validate_identifier(schema, ALLOWED_SCHEMAS, 'schema')
 
-        logger.info(f"Conectando ao Snowflake: {account} / {database}.{schema}")
+        # Todo argumento que muda a sessão faz parte da chave: uma conexão aberta
+        # com outra chave ou outras opções de segurança/timeout nunca é reutilizada
+        pool_key = (
+            account, user, warehouse, database, schema, role, paramstyle,
+            timeout, ocsp_fail_open, insecure_mode, validate_default_parameters,
+            _private_key_fingerprint(private_key, private_key_passphrase)
+        )
+        conn = _checkout_connection(pool_key)
+        if conn is not None:
+            logger.info("♻️ Reutilizando conexão Snowflake: %s / %s.%s", account, database, schema)
+            return conn
+
+        logger.info("Conectando ao Snowflake: %s / %s.%s", account, database, schema)
 
         # Configura variável de ambiente para OCSP (fallback)
         os.environ['SNOWFLAKE_OCSP_FAIL_OPEN'] = 'True'
@@ -127,27 +386,85 @@ def connect_snowflake(
             validate_default_parameters=validate_default_parameters,  # Valida parâmetros
             # Parâmetros adicionais de resiliência
             client_session_keep_alive=True,  # Mantém sessão ativa
-            client_prefetch_threads=4  # Otimiza download de resultados
+            client_prefetch_threads=4,  # Otimiza download de resultados
+            autocommit=True,  # TRUNCATE/COPY INTO já confirmam sozinhos (sem COMMIT extra)
+            **({'paramstyle': paramstyle} if paramstyle else {})
         )
 
+        # Schema da sessão guardado na conexão (evita SELECT CURRENT_SCHEMA() por DDL)
+        conn._cached_schema = schema
+        conn._pool_key = pool_key
+
         logger.info("✅ Conexão Snowflake estabelecida com sucesso")
-        logger.info(f"🔒 SSL ativo | OCSP fail-open: {ocsp_fail_open}")
+        logger.info("🔒 SSL ativo | OCSP fail-open: %s", ocsp_fail_open)
 
         return conn
 
     except Exception as e:
-        logger.error(f"❌ Erro ao conectar Snowflake: {str(e)}")
+        logger.error("❌ Erro ao conectar Snowflake: %s", e)
         logger.error("💡 Dica: Verifique se o snowflake-connector-python está atualizado")
         logger.error("   Execute: pip install --upgrade snowflake-connector-python")
         raise
 
 
+def _current_schema(conn, cursor) -> str:
+    """
+    Schema atual da sessão, sem round-trip quando possível
+
+    Ordem: schema guardado por connect_snowflake, schema que o conector mantém
+    da sessão (conn.schema) e, só se ambos faltarem, SELECT CURRENT_SCHEMA().
+    """
+    current_schema = getattr(conn, '_cached_schema', None) or getattr(conn, 'schema', None)
+    if current_schema is None:
+        cursor.execute("SELECT CURRENT_SCHEMA()")
+        current_schema = cursor.fetchone()[0]
+        conn._cached_schema = current_schema
+    return current_schema
+
+
+def _columns_ddl(columns_schema: Dict[str, str]) -> str:
+    """Lista de colunas do CREATE TABLE: "coluna" TIPO, ..."""
+    return ", ".join(f'"{col}" {dtype}' for col, dtype in columns_schema.items())
+
+
+def _create_table_ddl(
+        full_table_name: str,
+        columns_schema: Dict[str, str],
+        primary_key: Optional[Any] = None,
+        columns_ddl: Optional[str] = None,
+        cluster_by_primary_key: bool = True
+) -> str:
+    """Monta o CREATE TABLE IF NOT EXISTS (ver create_table_if_not_exists)"""
+    columns_ddl = columns_ddl or _columns_ddl(columns_schema)
+
+    cluster_by = ""
+    if primary_key:
+        # Trata chave primária: pode ser string ou lista (chave composta)
+        if isinstance(primary_key, list):
+            # Chave composta: múltiplas colunas
+            pk_columns = ", ".join(f'"{pk}"' for pk in primary_key)
+            columns_ddl += f', PRIMARY KEY ({pk_columns})'
+            if cluster_by_primary_key and len(primary_key) > 1:
+                cluster_by = f"CLUSTER BY ({pk_columns})"
+        else:
+            # Chave simples: uma coluna
+            columns_ddl += f', PRIMARY KEY ("{primary_key}")'
+
+    return f"""
+    CREATE TABLE IF NOT EXISTS {full_table_name} (
+        {columns_ddl}
+    ) {cluster_by}
+    """
+
+
 @task(cache_policy=NO_CACHE)
 def create_table_if_not_exists(
         conn,
         table_name: str,
         columns_schema: Dict[str, str],
-        primary_key: Optional[Any] = None
+        primary_key: Optional[Any] = None,
+        columns_ddl: Optional[str] = None,
+        cluster_by_primary_key: bool = True
 ):
     """
     Cria tabela no Snowflake se não existir
@@ -157,6 +474,11 @@ def create_table_if_not_exists(
         table_name: Nome da tabela (ex: BRZ_SALESFORCE_SUBSCRIBER)
         columns_schema: Dicionário {nome_coluna: tipo_dados}
         primary_key: Chave primária (string para chave simples ou lista para chave composta)
+        columns_ddl: Lista de colunas já montada (ex: "columns_ddl" dos *_TABLES_SCHEMAS);
+            se omitida, é montada a partir de columns_schema
+        cluster_by_primary_key: Com chave composta, cria a tabela com CLUSTER BY nas
+            colunas da chave (MERGEs por chave tocam menos micro-partições; ativa o
+            automatic clustering do Snowflake na tabela) (default: True)
 
     Example:
         # Chave simples
@@ -175,42 +497,76 @@ def create_table_if_not_exists(
     logger = get_run_logger()
 
     try:
-        # Obtém o schema atual da conexão
-        cursor = conn.cursor()
-        cursor.execute("SELECT CURRENT_SCHEMA()")
-        current_schema = cursor.fetchone()[0]
-        cursor.close()
+        with conn.cursor() as cursor:
+            # Obtém o schema atual da conexão
+            current_schema = _current_schema(conn, cursor)
+
+            # Monta DDL com schema explícito
+            full_table_name = f"{current_schema}.{table_name}"
+            ddl = _create_table_ddl(
+                full_table_name, columns_schema, primary_key, columns_ddl, cluster_by_primary_key
+            )
 
-        # Monta DDL com schema explícito
-        full_table_name = f"{current_schema}.{table_name}"
-        columns_ddl = ", ".join([f'"{col}" {dtype}' for col, dtype in columns_schema.items()])
-
-        if primary_key:
-            # Trata chave primária: pode ser string ou lista (chave composta)
-            if isinstance(primary_key, list):
-                # Chave composta: múltiplas colunas
-                pk_columns = ", ".join([f'"{pk}"' for pk in primary_key])
-                columns_ddl += f', PRIMARY KEY ({pk_columns})'
-            else:
-                # Chave simples: uma coluna
-                columns_ddl += f', PRIMARY KEY ("{primary_key}")'
-
-        ddl = f"""
-        CREATE TABLE IF NOT EXISTS {full_table_name} (
-            {columns_ddl}
-        )
-        """
+            logger.info("📋 Criando tabela: %s", full_table_name)
 
-        logger.info(f"📋 Criando tabela: {full_table_name}")
+            cursor.execute(ddl)
 
-        cursor = conn.cursor()
-        cursor.execute(ddl)
-        cursor.close()
+        logger.info("✅ Tabela %s verificada/criada com sucesso", full_table_name)
+
+    except Exception as e:
+        logger.error("❌ Erro ao criar tabela %s: %s", table_name, e)
+        raise
+
+
+@task(cache_policy=NO_CACHE)
+def create_tables_bulk(conn, schemas: Dict[str, Dict[str, Any]], cluster_by_primary_key: bool = True):
+    """
+    Cria várias tabelas no Snowflake (se não existirem) em um único envio
+
+    Junta os N CREATE TABLE IF NOT EXISTS em um script multi-statement
+    (num_statements=N): uma ida ao servidor em vez de uma por tabela.
+
+    Args:
+        conn: Conexão Snowflake
+        schemas: Dicionário no formato de SALESFORCE_TABLES_SCHEMAS/DECONVE_TABLES_SCHEMAS
+            ({chave: {"table_name", "columns", "primary_key", "columns_ddl"}})
+        cluster_by_primary_key: Ver create_table_if_not_exists (default: True)
+
+    Example:
+        create_tables_bulk(conn, {**SALESFORCE_TABLES_SCHEMAS, **DECONVE_TABLES_SCHEMAS})
+    """
+    logger = get_run_logger()
 
-        logger.info(f"✅ Tabela {full_table_name} verificada/criada com sucesso")
+    if not schemas:
+        return
+
+    try:
+        with conn.cursor() as cursor:
+            current_schema = _current_schema(conn, cursor)
+
+            table_names = [f"{current_schema}.{table_schema['table_name']}" for table_schema in schemas.values()]
+            script = ";".join(
+                _create_table_ddl(
+                    full_table_name,
+                    table_schema["columns"],
+                    table_schema.get("primary_key"),
+                    table_schema.get("columns_ddl"),
+                    cluster_by_primary_key
+                )
+                for full_table_name, table_schema in zip(table_names, schemas.values())
+            )
+
+            logger.info("📋 Criando %d tabelas: %s", len(table_names), ", ".join(table_names))
+
+            cursor.execute(script, num_statements=len(table_names))
+            # Consome o resultado de cada statement (erros de qualquer um sobem aqui)
+            while cursor.nextset():
+                pass
+
+        logger.info("✅ %d tabelas verificadas/criadas com sucesso", len(table_names))
 
     except Exception as e:
-        logger.error(f"❌ Erro ao criar tabela {table_name}: {str(e)}")
+        logger.error("❌ Erro ao criar tabelas %s: %s", ", ".join(schemas), e)
         raise
 
 
@@ -226,19 +582,363 @@ def truncate_table(conn, table_name: str):
     logger = get_run_logger()
 
     try:
-        logger.info(f"Truncando tabela {table_name}...")
+        logger.info("Truncando tabela %s...", table_name)
 
         cursor = conn.cursor()
         cursor.execute(f"TRUNCATE TABLE {table_name}")
         cursor.close()
 
-        logger.info(f"✅ Tabela {table_name} truncada com sucesso")
+        logger.info("✅ Tabela %s truncada com sucesso", table_name)
 
     except Exception as e:
-        logger.error(f"❌ Erro ao truncar tabela {table_name}: {str(e)}")
+        logger.error("❌ Erro ao truncar tabela %s: %s", table_name, e)
         raise
 
 
+def read_csv_header(csv_file_path: str, encoding: str) -> List[str]:
+    """
+    Lê só a linha de cabeçalho do CSV, decodificando apenas o primeiro bloco
+
+    Funciona para qualquer encoding (inclusive UTF-16, em que a quebra de linha
+    ocupa dois bytes). Cabeçalhos com aspas (que podem conter vírgulas ou
+    quebras de linha) são lidos pelo parser CSV do Arrow, que também lê só o
+    primeiro bloco do arquivo.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    text = ""
+
+    with open(csv_file_path, 'rb') as f:
+        while '\n' not in text:
+            block = f.read(CSV_HEADER_READ_BLOCK)
+            if not block:
+                break
+            text += decoder.decode(block)
+
+    header_line = text.split('\n', 1)[0].rstrip('\r').lstrip('\ufeff')
+
+    if '"' in header_line:
+        reader = pa_csv.open_csv(
+            csv_file_path,
+            read_options=pa_csv.ReadOptions(block_size=CSV_HEADER_READ_BLOCK, encoding=encoding),
+            parse_options=pa_csv.ParseOptions(newlines_in_values=True)
+        )
+        return reader.schema.names
+    return header_line.split(',')
+
+
+def _split_csv_file(csv_file_path: str, shard_bytes: int, output_dir: str) -> List[str]:
+    """
+    Divide um CSV (encoding compatível com ASCII) em partes de ~shard_bytes
+
+    Cada parte repete a linha de cabeçalho (o COPY usa SKIP_HEADER = 1 para
+    todas). O corte só acontece em quebra de linha fora de aspas: a paridade
+    de aspas acumulada precisa ser par, então campos com quebra de linha nunca
+    são partidos. A cópia é feita em blocos, sem iterar linha a linha.
+
+    Returns:
+        Caminhos das partes, em ordem
+    """
+    stem = os.path.splitext(os.path.basename(csv_file_path))[0]
+    shard_paths = []
+
+    with open(csv_file_path, 'rb') as src:
+        header = src.readline()
+        shard = None
+        shard_size = 0
+        quotes = 0
+
+        def open_shard():
+            path = os.path.join(output_dir, f"{stem}_part_{len(shard_paths) + 1:04d}.csv")
+            shard_paths.append(path)
+            f = open(path, 'wb')
+            f.write(header)
+            return f
+
+        try:
+            shard = open_shard()
+            while True:
+                block = src.read(CSV_SHARD_READ_BLOCK)
+                if not block:
+                    break
+
+                start = 0
+                if shard_size >= shard_bytes:
+                    # Procura a primeira quebra de linha fora de aspas para cortar
+                    pos = block.find(b'\n')
+                    while pos != -1 and (quotes + block.count(b'"', 0, pos)) % 2:
+                        pos = block.find(b'\n', pos + 1)
+
+                    if pos != -1:
+                        shard.write(block[:pos + 1])
+                        quotes += block.count(b'"', 0, pos + 1)
+                        shard.close()
+                        shard = open_shard()
+                        shard_size = 0
+                        start = pos + 1
+
+                shard.write(block[start:] if start else block)
+                shard_size += len(block) - start
+                quotes += block.count(b'"', start)
+        finally:
+            if shard:
+                shard.close()
+
+    return shard_paths
+
+
+def _csv_to_parquet(csv_file_path: str, encoding: str, columns: List[str], parquet_path: str) -> None:
+    """
+    Converte o CSV em Parquet (zstd) em streaming, um bloco por vez
+
+    Todas as colunas são lidas como texto, com os mesmos valores nulos do
+    FILE_FORMAT CSV ('NULL', 'null', ''), deixando a conversão de tipos para
+    o Snowflake como no caminho CSV. As colunas recebem os nomes de columns.
+    """
+    reader = pa_csv.open_csv(
+        csv_file_path,
+        read_options=pa_csv.ReadOptions(
+            encoding=encoding,
+            block_size=PARQUET_CSV_BLOCK_SIZE,
+            column_names=columns,
+            skip_rows=1
+        ),
+        convert_options=pa_csv.ConvertOptions(
+            column_types={col: pa.string() for col in columns},
+            null_values=['NULL', 'null', ''],
+            strings_can_be_null=True
+        )
+    )
+
+    with pq.ParquetWriter(
+            parquet_path,
+            reader.schema,
+            compression='zstd',
+            compression_level=PARQUET_COMPRESSION_LEVEL,
+            use_dictionary=True
+    ) as writer:
+        for batch in reader:
+            writer.write_batch(batch)
+
+
+def _wait_for_query(conn, query_id: str) -> None:
+    """Aguarda uma query submetida com execute_async (levanta exceção se falhou)"""
+    while conn.is_still_running(conn.get_query_status_throw_if_error(query_id)):
+        time.sleep(ASYNC_POLL_INTERVAL)
+
+
+def _is_utf16(csv_file_path: str, encoding: str) -> bool:
+    """CSV em UTF-16: pelo encoding informado ou pelo BOM do arquivo"""
+    if encoding.lower().startswith('utf-16'):
+        return True
+    with open(csv_file_path, 'rb') as f:
+        return f.read(2) in (codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)
+
+
+def _transcode_to_utf8(csv_file_path: str, encoding: str, output_dir: str) -> str:
+    """
+    Converte o CSV para UTF-8 (sem BOM) em streaming, mantendo o nome do arquivo
+
+    Returns:
+        Caminho do arquivo UTF-8 em output_dir
+    """
+    utf8_path = os.path.join(output_dir, os.path.basename(csv_file_path))
+    with open(csv_file_path, 'r', encoding=encoding, newline='') as src, \
+            open(utf8_path, 'w', encoding='utf-8', newline='') as dst:
+        shutil.copyfileobj(src, dst, TRANSCODE_CHUNK_CHARS)
+    return utf8_path
+
+
+def _zstd_compress_file(file_path: str, output_dir: str) -> str:
+    """
+    Comprime o arquivo com zstd (via pyarrow) em output_dir
+
+    Returns:
+        Caminho do arquivo .zst gerado
+    """
+    zst_path = os.path.join(output_dir, f"{os.path.basename(file_path)}.zst")
+    with open(file_path, 'rb') as src, pa.output_stream(zst_path, compression='zstd') as dst:
+        while True:
+            block = src.read(CSV_SHARD_READ_BLOCK)
+            if not block:
+                break
+            dst.write(block)
+    return zst_path
+
+
+def _put_uri(file_path: str) -> str:
+    """URI file:// do PUT, com separadores '/' e aspas simples escapadas"""
+    return f"file://{PurePath(file_path).as_posix()}".replace("'", "''")
+
+
+def _log_put_error(logger, put_error: Exception) -> None:
+    """Loga erro do PUT, com dicas se for erro de certificado SSL"""
+    logger.error("❌ Erro no PUT: %s", put_error)
+    if "certificate" in str(put_error).lower() or "254007" in str(put_error):
+        logger.error("🔒 Erro de certificado SSL detectado")
+        logger.error("💡 Soluções:")
+        logger.error("   1. Atualize: pip install --upgrade snowflake-connector-python")
+        logger.error("   2. Atualize certificados: sudo update-ca-certificates")
+        logger.error("   3. Verifique firewall/proxy")
+
+
+def _put_file(conn, file_path: str, stage_name: str, auto_compress: bool = True) -> None:
+    """PUT de um arquivo local no stage (um cursor por chamada, seguro entre threads)"""
+    compress = "TRUE" if auto_compress else "FALSE"
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"PUT '{_put_uri(file_path)}' {stage_name} AUTO_COMPRESS={compress} OVERWRITE=TRUE PARALLEL={PUT_PARALLEL}"
+        )
+
+
+def _copy_rows_loaded(cursor) -> int:
+    """
+    Soma a coluna rows_loaded do resultado de um COPY INTO (uma linha por arquivo)
+
+    A coluna é localizada pelo nome em cursor.description, não pela posição.
+    Sem arquivos a carregar, o COPY devolve só "status" e o total é 0.
+    """
+    columns = [column[0].lower() for column in cursor.description or ()]
+    rows = cursor.fetchall()
+    if 'rows_loaded' not in columns:
+        return 0
+    index = columns.index('rows_loaded')
+    return sum(row[index] for row in rows)
+
+
+@lru_cache(maxsize=64)
+def _build_copy_sql(table: str, columns: Tuple[str, ...], encoding: str) -> str:
+    """
+    COPY INTO (CSV) de uma tabela a partir do seu table stage (@%tabela)
+
+    Cacheado por (tabela, colunas, encoding): cargas repetidas reutilizam o
+    mesmo texto SQL, idêntico entre execuções. Só o placeholder {files}
+    fica pendente para o .format() de cada lote.
+
+    Args:
+        table: Nome da tabela de destino
+        columns: Colunas do CSV, na ordem do arquivo
+        encoding: 'UTF8' ou 'UTF16'
+    """
+    columns_list = ", ".join(f'"{col}"' for col in columns)
+    return _COPY_CSV_TEMPLATES[encoding].format(
+        table=table,
+        columns=columns_list.replace("{", "{{").replace("}", "}}"),
+        stage=f"@%{table}",
+        files="{files}"
+    )
+
+
+def _prepare_upload_files(
+        logger,
+        csv_file_path: str,
+        csv_encoding: str,
+        columns: Optional[List[str]],
+        work_dir: str,
+        shard_size_mb: int,
+        file_format: str = 'csv',
+        compression: str = 'gzip',
+        transcode_to_utf8: bool = False
+) -> Tuple[List[str], str, List[str]]:
+    """
+    Prepara os arquivos locais do PUT (arquivos intermediários ficam em work_dir)
+
+    UTF-16 é convertido para UTF-8 (se transcode_to_utf8), as colunas são lidas
+    do cabeçalho se não fornecidas e o CSV é convertido para Parquet ou dividido
+    em partes de ~shard_size_mb (só encodings compatíveis com ASCII: o corte é
+    feito nos bytes de quebra de linha). Com compression='zstd', cada parte é
+    comprimida localmente.
+
+    Returns:
+        Tupla (caminhos para o PUT, encoding final do CSV, colunas)
+    """
+    # UTF-16 -> UTF-8 local (uma passada) em vez de decodificar no Snowflake
+    if transcode_to_utf8 and _is_utf16(csv_file_path, csv_encoding):
+        source_encoding = csv_encoding if csv_encoding.lower().startswith('utf-16') else 'utf-16'
+        csv_file_path = _transcode_to_utf8(csv_file_path, source_encoding, work_dir)
+        csv_encoding = 'utf-8'
+        logger.info("🔤 CSV convertido de %s para UTF-8", source_encoding)
+
+    if not columns:
+        columns = read_csv_header(csv_file_path, csv_encoding)
+        logger.info("📋 %s colunas detectadas no CSV", len(columns))
+
+    file_size_mb = os.path.getsize(csv_file_path) / (1024 * 1024)
+    upload_paths = [csv_file_path]
+
+    if file_format == 'parquet':
+        parquet_path = os.path.join(
+            work_dir, f"{os.path.splitext(os.path.basename(csv_file_path))[0]}.parquet"
+        )
+        _csv_to_parquet(csv_file_path, csv_encoding, columns, parquet_path)
+        upload_paths = [parquet_path]
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("📦 CSV convertido para Parquet (%.2f MB)", os.path.getsize(parquet_path) / (1024 * 1024))
+
+    elif file_size_mb > shard_size_mb and "utf-16" not in csv_encoding.lower():
+        upload_paths = _split_csv_file(csv_file_path, shard_size_mb * 1024 * 1024, work_dir)
+        logger.info("✂️ CSV dividido em %s parte(s) de ~%s MB", len(upload_paths), shard_size_mb)
+
+    # Compressão zstd local (uma parte por thread; o pyarrow libera o GIL)
+    if file_format == 'csv' and compression == 'zstd':
+        with ThreadPoolExecutor(max_workers=min(len(upload_paths), os.cpu_count() or 1)) as executor:
+            upload_paths = list(executor.map(lambda path: _zstd_compress_file(path, work_dir), upload_paths))
+        logger.info("🗜️ %s arquivo(s) comprimido(s) com zstd", len(upload_paths))
+
+    return upload_paths, csv_encoding, columns
+
+
+def _put_and_copy(
+        conn,
+        cursor,
+        logger,
+        upload_paths: List[str],
+        stage_name: str,
+        copy_sql: str,
+        auto_compress: bool = True
+) -> int:
+    """
+    PUT dos arquivos no stage (em paralelo, um cursor por thread) e COPY INTO
+    dos já enviados em lotes de COPY_BATCH_FILES, enquanto o resto sobe
+
+    Args:
+        conn: Conexão Snowflake
+        cursor: Cursor usado nos COPY INTO (o da transação do chamador)
+        logger: Logger do Prefect
+        upload_paths: Arquivos locais a enviar
+        stage_name: Stage de destino (ex: '@%TABELA')
+        copy_sql: COPY INTO com o placeholder {files} para a lista de arquivos
+        auto_compress: PUT com AUTO_COMPRESS (nomes no stage ganham .gz)
+
+    Returns:
+        Total de linhas carregadas
+    """
+    rows_loaded = 0
+    ready_files: List[str] = []
+
+    with ThreadPoolExecutor(max_workers=min(len(upload_paths), os.cpu_count() or 1)) as executor:
+        futures = {
+            executor.submit(_put_file, conn, path, stage_name, auto_compress):
+                f"{os.path.basename(path)}.gz" if auto_compress else os.path.basename(path)
+            for path in upload_paths
+        }
+        for done_count, future in enumerate(as_completed(futures), start=1):
+            try:
+                future.result()
+            except Exception as put_error:
+                _log_put_error(logger, put_error)
+                raise
+            ready_files.append(futures[future])
+
+            if len(ready_files) >= COPY_BATCH_FILES or done_count == len(futures):
+                logger.info("⚡ Executando COPY INTO de %s arquivo(s)...", len(ready_files))
+                files_list = ', '.join("'{}'".format(name.replace("'", "''")) for name in ready_files)
+                cursor.execute(copy_sql.format(files=files_list))
+                rows_loaded += _copy_rows_loaded(cursor)
+                ready_files = []
+
+    return rows_loaded
+
+
 @task(cache_policy=NO_CACHE, retries=2, retry_delay_seconds=30)
 def insert_csv_file_replace(
         conn,
@@ -246,7 +946,11 @@ def insert_csv_file_replace(
         csv_file_path: str,
         csv_encoding: str = 'utf-8',
         columns: Optional[List[str]] = None,
-        max_file_size_mb: int = 5000
+        max_file_size_mb: int = 5000,
+        shard_size_mb: int = CSV_SHARD_SIZE_MB,
+        file_format: str = 'csv',
+        compression: str = 'gzip',
+        transcode_to_utf8: bool = True
 ):
     """
     Insere CSV direto no Snowflake usando COPY INTO (otimizado)
@@ -254,10 +958,15 @@ def insert_csv_file_replace(
     ATUALIZADO: Inclui retry automático e tratamento de erros SSL
 
     Processo:
-    1. TRUNCATE table
-    2. PUT CSV existente para stage interno
-    3. COPY INTO table FROM stage (paralelo)
-    4. REMOVE arquivo do stage
+    1. Prepara os arquivos: divide o CSV em partes de ~shard_size_mb (se maior
+       que isso), ou converte para Parquet com file_format='parquet'
+    2. BEGIN + TRUNCATE table: a carga inteira roda em uma transação explícita
+    3. PUT das partes para stage interno (em paralelo)
+    4. COPY INTO table FROM stage em lotes de COPY_BATCH_FILES arquivos, à
+       medida que os PUTs terminam (PURGE remove os arquivos do stage ao
+       final de cada COPY bem-sucedido)
+    5. COMMIT único; em qualquer erro, ROLLBACK devolve a tabela ao estado
+       anterior ao TRUNCATE (nunca fica truncada com só parte dos lotes)
 
     Args:
         conn: Conexão Snowflake
@@ -266,15 +975,28 @@ def insert_csv_file_replace(
         csv_encoding: Encoding do CSV (utf-8, utf-16, etc.)
         columns: Lista de colunas (opcional, lê do CSV se não fornecido)
         max_file_size_mb: Tamanho máximo do arquivo em MB (default: 5000)
+        shard_size_mb: Tamanho de cada parte enviada ao stage em MB (default: 200)
+        file_format: 'csv' (PUT do CSV com gzip) ou 'parquet' (converte localmente
+            para Parquet zstd: menos bytes no PUT e sem parse de CSV no warehouse)
+        compression: Compressão do CSV no PUT: 'gzip' (feita pelo conector) ou
+            'zstd' (feita localmente, em paralelo por parte, bem mais rápida que gzip)
+        transcode_to_utf8: Converte CSVs UTF-16 para UTF-8 antes do PUT (default: True);
+            o Snowflake carrega UTF-8 mais rápido e o arquivo pode ser dividido em partes
     """
     logger = get_run_logger()
-    import csv
 
-    try:
-        if not os.path.exists(csv_file_path):
-            raise FileNotFoundError(f"Arquivo não encontrado: {csv_file_path}")
+    if file_format not in ('csv', 'parquet'):
+        raise ValueError(f"file_format inválido: '{file_format}' (use 'csv' ou 'parquet')")
+    if compression not in ('gzip', 'zstd'):
+        raise ValueError(f"compression inválida: '{compression}' (use 'gzip' ou 'zstd')")
 
-        file_size_mb = os.path.getsize(csv_file_path) / (1024 * 1024)
+    work_dir = None
+    in_transaction = False
+    try:
+        try:
+            file_size_mb = os.stat(csv_file_path).st_size / (1024 * 1024)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Arquivo não encontrado: {csv_file_path}") from None
 
         if file_size_mb > max_file_size_mb:
             raise ValueError(
@@ -282,126 +1004,373 @@ def insert_csv_file_replace(
                 f"(máximo: {max_file_size_mb} MB)"
             )
 
-        logger.info(f"🚀 Carregando CSV ({file_size_mb:.2f} MB) em {table_name} usando COPY INTO...")
+        logger.info("🚀 Carregando CSV (%.2f MB) em %s usando COPY INTO...", file_size_mb, table_name)
 
-        # 1. TRUNCATE
         cursor = conn.cursor()
-        cursor.execute(f"TRUNCATE TABLE {table_name}")
-        logger.info(f"🗑️ Tabela {table_name} truncada")
 
-        # 2. Lê colunas do CSV se não fornecidas
-        if not columns:
-            with open(csv_file_path, 'r', encoding=csv_encoding) as f:
-                reader = csv.reader(f)
-                columns = next(reader)
-            logger.info(f"📋 {len(columns)} colunas detectadas no CSV")
+        # 1. Arquivos para o PUT: UTF-8, Parquet ou partes, zstd
+        work_dir = tempfile.mkdtemp(prefix=f"{table_name}_")
+        upload_paths, csv_encoding, columns = _prepare_upload_files(
+            logger, csv_file_path, csv_encoding, columns, work_dir, shard_size_mb,
+            file_format=file_format, compression=compression, transcode_to_utf8=transcode_to_utf8
+        )
 
-        # 3. PUT para stage interno
+        # SQL do COPY INTO montado uma vez: só a lista FILES varia por lote
         stage_name = f"@%{table_name}"
-        file_name = os.path.basename(csv_file_path)
+        if file_format == 'parquet':
+            copy_sql = _COPY_PARQUET_TEMPLATE.format(table=table_name, stage=stage_name, files='{files}')
+        else:
+            copy_sql = _build_copy_sql(
+                table_name,
+                tuple(columns),
+                'UTF16' if csv_encoding[:6].lower() == 'utf-16' else 'UTF8'
+            )
 
-        logger.info(f"⬆️ Enviando CSV para stage interno {stage_name}...")
+        # 2. TRUNCATE + COPYs em uma transação explícita (mesmo com autocommit ativo):
+        # falha em qualquer lote desfaz tudo, inclusive o TRUNCATE
+        cursor.execute("BEGIN")
+        in_transaction = True
+        cursor.execute(f"TRUNCATE TABLE {table_name}")
+        logger.info("🗑️ Tabela %s truncada (transação aberta)", table_name)
+
+        # 3. PUT para stage interno e 4. COPY INTO em lotes, enquanto o resto sobe
+        # (só o PUT com AUTO_COMPRESS gera .gz; zstd e Parquet já vão comprimidos)
+        logger.info("⬆️ Enviando CSV para stage interno %s...", stage_name)
+        rows_loaded = _put_and_copy(
+            conn, cursor, logger, upload_paths, stage_name, copy_sql,
+            auto_compress=file_format == 'csv' and compression == 'gzip'
+        )
 
-        # Converte path para formato correto
-        put_path = csv_file_path.replace('\\', '/')
-        put_sql = f"PUT 'file://{put_path}' {stage_name} AUTO_COMPRESS=TRUE OVERWRITE=TRUE"
+        logger.info("✅ %s registros carregados via COPY INTO", rows_loaded)
 
-        try:
-            cursor.execute(put_sql)
-            logger.info("✅ Arquivo enviado para stage")
-        except Exception as put_error:
-            logger.error(f"❌ Erro no PUT: {str(put_error)}")
-            if "certificate" in str(put_error).lower() or "254007" in str(put_error):
-                logger.error("🔒 Erro de certificado SSL detectado")
-                logger.error("💡 Soluções:")
-                logger.error("   1. Atualize: pip install --upgrade snowflake-connector-python")
-                logger.error("   2. Atualize certificados: sudo update-ca-certificates")
-                logger.error("   3. Verifique firewall/proxy")
-            raise
-
-        # 4. COPY INTO (carrega tudo em paralelo)
-        logger.info("⚡ Executando COPY INTO (bulk load paralelo)...")
-
-        quoted_columns = [f'"{col}"' for col in columns]
-
-        # Define encoding no FILE_FORMAT
-        encoding_param = "UTF16" if "utf-16" in csv_encoding.lower() else "UTF8"
+        # Commit único: TRUNCATE + todos os lotes
+        conn.commit()
+        in_transaction = False
+        cursor.close()
 
-        copy_sql = f"""
-        COPY INTO {table_name} ({', '.join(quoted_columns)})
-        FROM {stage_name}/{file_name}.gz
-        FILE_FORMAT = (
-            TYPE = 'CSV'
-            ENCODING = '{encoding_param}'
-            FIELD_OPTIONALLY_ENCLOSED_BY = '"'
-            SKIP_HEADER = 1
-            NULL_IF = ('NULL', 'null', '')
-            EMPTY_FIELD_AS_NULL = TRUE
-            COMPRESSION = 'AUTO'
-        )
-        ON_ERROR = 'ABORT_STATEMENT'
-        """
+        logger.info("🎉 Carga completa: %s registros em %s", rows_loaded, table_name)
+        return {"rows_inserted": rows_loaded}
+
+    except Exception as e:
+        logger.error("❌ Erro ao carregar CSV em %s: %s", table_name, e)
+        if in_transaction:
+            conn.rollback()
+            logger.info("↩️ Transação desfeita: %s mantém o conteúdo anterior", table_name)
+        raise
+
+    finally:
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+@task(cache_policy=NO_CACHE, retries=2, retry_delay_seconds=30)
+def insert_parquet_replace(conn, table_name: str, parquet_file_path: str):
+    """
+    Substitui o conteúdo da tabela por um arquivo Parquet já existente
+
+    Processo: TRUNCATE (assíncrono) + PUT sem recompressão + COPY INTO com
+    MATCH_BY_COLUMN_NAME (colunas do Parquet casadas por nome, sem parse de
+    texto no warehouse). Para CSV use insert_csv_file_replace(file_format='parquet');
+    para DataFrames, insert_dataframe.
+
+    Args:
+        conn: Conexão Snowflake
+        table_name: Nome da tabela
+        parquet_file_path: Caminho do arquivo Parquet local
 
-        cursor.execute(copy_sql)
-        result = cursor.fetchone()
+    Returns:
+        Dict com rows_inserted
+    """
+    logger = get_run_logger()
 
-        # Resultado: [file, status, rows_parsed, rows_loaded, ...]
-        rows_loaded = result[3] if result else 0
+    try:
+        try:
+            file_size_mb = os.stat(parquet_file_path).st_size / (1024 * 1024)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Arquivo não encontrado: {parquet_file_path}") from None
 
-        logger.info(f"✅ {rows_loaded} registros carregados via COPY INTO")
+        logger.info("🚀 Carregando Parquet (%.2f MB) em %s usando COPY INTO...", file_size_mb, table_name)
 
-        # 5. REMOVE arquivo do stage (limpeza)
-        logger.info("🧹 Removendo arquivo do stage...")
-        remove_sql = f"REMOVE {stage_name}/{file_name}.gz"
-        cursor.execute(remove_sql)
+        cursor = conn.cursor()
+        cursor.execute_async(f"TRUNCATE TABLE {table_name}")
+        truncate_query_id = cursor.sfqid
 
+        stage_name = f"@%{table_name}"
+        logger.info("⬆️ Enviando Parquet para stage interno %s...", stage_name)
+        _put_file(conn, parquet_file_path, stage_name, auto_compress=False)
+
+        _wait_for_query(conn, truncate_query_id)
+        logger.info("🗑️ Tabela %s truncada", table_name)
+
+        cursor.execute(_COPY_PARQUET_TEMPLATE.format(
+            table=table_name,
+            stage=stage_name,
+            files="'{}'".format(os.path.basename(parquet_file_path).replace("'", "''"))
+        ))
+        rows_loaded = _copy_rows_loaded(cursor)
         cursor.close()
-        conn.commit()
 
-        logger.info(f"🎉 Carga completa: {rows_loaded} registros em {table_name}")
+        logger.info("🎉 Carga completa: %s registros em %s", rows_loaded, table_name)
         return {"rows_inserted": rows_loaded}
 
     except Exception as e:
-        logger.error(f"❌ Erro ao carregar CSV em {table_name}: {str(e)}")
-        conn.rollback()
+        logger.error("❌ Erro ao carregar Parquet em %s: %s", table_name, e)
+        raise
+
+
+def _write_dataframe(
+        conn,
+        table_name: str,
+        df,
+        chunk_size: int,
+        parallel: Optional[int],
+        overwrite: bool
+) -> Dict[str, Any]:
+    """write_pandas (Parquet + PUT + COPY INTO) com log; overwrite trunca a tabela antes"""
+    logger = get_run_logger()
+
+    try:
+        logger.info("🚀 Carregando DataFrame (%s linhas) em %s via write_pandas...", len(df), table_name)
+
+        success, num_chunks, num_rows, _ = write_pandas(
+            conn,
+            df,
+            table_name,
+            chunk_size=chunk_size,
+            compression='snappy',
+            parallel=parallel or os.cpu_count() or 4,
+            quote_identifiers=True,
+            overwrite=overwrite,
+            use_logical_type=True
+        )
+
+        if not success:
+            raise RuntimeError(f"write_pandas não concluiu a carga em {table_name}")
+
+        logger.info("🎉 Carga completa: %s registros em %s (%s arquivo(s))", num_rows, table_name, num_chunks)
+        return {"rows_inserted": num_rows}
+
+    except Exception as e:
+        logger.error("❌ Erro ao carregar DataFrame em %s: %s", table_name, e)
         raise
 
 
+@task(cache_policy=NO_CACHE, retries=2, retry_delay_seconds=30)
+def insert_dataframe(
+        conn,
+        table_name: str,
+        df,
+        chunk_size: int = DATAFRAME_CHUNK_SIZE,
+        parallel: Optional[int] = None
+):
+    """
+    Insere um DataFrame já em memória no Snowflake via write_pandas
+
+    O conector grava o DataFrame em Parquet, faz PUT no stage e COPY INTO,
+    sem gerar CSV intermediário e sem INSERTs linha a linha.
+
+    Args:
+        conn: Conexão Snowflake
+        table_name: Nome da tabela (já existente)
+        df: pandas.DataFrame com colunas de mesmo nome da tabela
+        chunk_size: Linhas por arquivo Parquet (default: 500.000)
+        parallel: Threads de PUT (default: número de CPUs)
+
+    Returns:
+        Dict com rows_inserted
+    """
+    return _write_dataframe(conn, table_name, df, chunk_size, parallel, overwrite=False)
+
+
+@task(cache_policy=NO_CACHE, retries=2, retry_delay_seconds=30)
+def insert_dataframe_replace(
+        conn,
+        table_name: str,
+        df,
+        chunk_size: int = DATAFRAME_CHUNK_SIZE,
+        parallel: Optional[int] = None
+):
+    """
+    Substitui o conteúdo da tabela por um DataFrame (equivalente em memória
+    do insert_csv_file_replace)
+
+    Usa write_pandas com overwrite=True: a tabela é truncada e recarregada
+    via Parquet tipado, sem a ida e volta por CSV em texto.
+
+    Args:
+        conn: Conexão Snowflake
+        table_name: Nome da tabela (já existente)
+        df: pandas.DataFrame com colunas de mesmo nome da tabela
+        chunk_size: Linhas por arquivo Parquet (default: 500.000)
+        parallel: Threads de PUT (default: número de CPUs)
+
+    Returns:
+        Dict com rows_inserted
+    """
+    return _write_dataframe(conn, table_name, df, chunk_size, parallel, overwrite=True)
+
+
 @task(cache_policy=NO_CACHE)
-def execute_query(conn, query: str) -> List[Dict[str, Any]]:
+def execute_query(
+        conn,
+        query: str,
+        as_dict: bool = True
+) -> Union[List[Dict[str, Any]], Tuple[List[str], List[tuple]]]:
     """
     Executa query SQL e retorna resultados
 
     Args:
         conn: Conexão Snowflake
         query: Query SQL a ser executada
+        as_dict: Se True, uma lista de dicionários (DictCursor); se False,
+            (colunas, linhas) com as linhas como tuplas, sem montar um dict por linha
 
     Returns:
-        Lista de dicionários com os resultados
+        Lista de dicionários, ou tupla (lista de colunas, lista de tuplas) com as_dict=False
     """
     logger = get_run_logger()
 
     try:
-        logger.info(f"Executando query: {query[:100]}...")
+        logger.info("Executando query: %s...", query[:100])
 
-        cursor = conn.cursor(DictCursor)
-        cursor.execute(query)
-        results = cursor.fetchall()
-        cursor.close()
+        with conn.cursor(DictCursor) if as_dict else conn.cursor() as cursor:
+            cursor.execute(query)
+            results = cursor.fetchall()
+            columns = [column[0] for column in cursor.description]
 
-        logger.info(f"✅ Query executada com sucesso: {len(results)} linha(s) retornada(s)")
+        logger.info("✅ Query executada com sucesso: %s linha(s) retornada(s)", len(results))
 
-        return results
+        return results if as_dict else (columns, results)
 
     except Exception as e:
-        logger.error(f"❌ Erro ao executar query: {str(e)}")
+        logger.error("❌ Erro ao executar query: %s", e)
         raise
 
 
+@task(cache_policy=NO_CACHE)
+def execute_many(conn, query: str, rows: Sequence[Sequence[Any]]) -> int:
+    """
+    Executa um INSERT parametrizado para várias linhas com executemany
+
+    Em conexões com paramstyle='qmark' o bind é feito no servidor e, acima do
+    limite CLIENT_STAGE_ARRAY_BINDING_THRESHOLD, o conector envia as linhas por
+    stage automaticamente. Para arquivos ou DataFrames grandes, prefira
+    insert_csv_file_replace / insert_dataframe.
+
+    Args:
+        conn: Conexão Snowflake
+        query: INSERT com um placeholder por coluna no paramstyle da conexão
+            (ex: "INSERT INTO tabela (a, b) VALUES (?, ?)" com qmark)
+        rows: Linhas (tuplas/listas na ordem das colunas)
+
+    Returns:
+        Quantidade de linhas inseridas
+
+    Example:
+        conn = connect_snowflake(..., paramstyle='qmark')
+        execute_many(conn, "INSERT INTO tabela (a, b) VALUES (?, ?)", [(1, "x"), (2, "y")])
+    """
+    logger = get_run_logger()
+
+    if not rows:
+        return 0
+
+    try:
+        with conn.cursor() as cursor:
+            cursor.executemany(query, rows)
+            row_count = cursor.rowcount
+
+        logger.info("✅ %s linha(s) inserida(s) via executemany", row_count)
+        return row_count
+
+    except Exception as e:
+        logger.error("❌ Erro no executemany: %s", e)
+        raise
+
+
+def iter_query_batches(
+        conn,
+        query: str,
+        batch_size: int = FETCH_BATCH_SIZE
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Executa query SQL e entrega os resultados em lotes
+
+    Diferente de execute_query, não materializa o resultado inteiro: os
+    chunks Arrow do resultado são convertidos um por vez (Arrow -> dict é
+    bem mais rápido que o DictCursor). Resultados que não vêm em Arrow
+    (ex: SHOW/DESCRIBE) são lidos com fetchmany.
+
+    Args:
+        conn: Conexão Snowflake
+        query: Query SQL a ser executada
+        batch_size: Máximo de linhas por lote
+
+    Yields:
+        Listas de dicionários com até batch_size linhas
+
+    Example:
+        for batch in iter_query_batches(conn, "SELECT * FROM tabela"):
+            process(batch)
+    """
+    logger = get_run_logger()
+
+    total_rows = 0
+    with conn.cursor() as cursor:
+        cursor.execute(query)
+
+        try:
+            arrow_tables = cursor.fetch_arrow_batches()
+        except NotSupportedError:
+            arrow_tables = None
+
+        if arrow_tables is not None:
+            for table in arrow_tables:
+                for record_batch in table.to_batches(max_chunksize=batch_size):
+                    total_rows += record_batch.num_rows
+                    yield record_batch.to_pylist()
+        else:
+            columns = [column.name for column in cursor.description]
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                total_rows += len(rows)
+                yield [dict(zip(columns, row)) for row in rows]
+
+    logger.info("✅ Query executada com sucesso: %s linha(s) retornada(s) em lotes", total_rows)
+
+
+def iter_query_rows(
+        conn,
+        query: str,
+        batch_size: int = FETCH_BATCH_SIZE
+) -> Iterator[Dict[str, Any]]:
+    """
+    Versão linha a linha de iter_query_batches
+
+    Para varrer resultados grandes sem materializá-los (execute_query faz
+    fetchall). Quem precisar de lista pode usar list(iter_query_rows(...)).
+
+    Args:
+        conn: Conexão Snowflake
+        query: Query SQL a ser executada
+        batch_size: Linhas convertidas por vez
+
+    Returns:
+        Iterador com um dicionário por linha
+    """
+    return chain.from_iterable(iter_query_batches(conn, query, batch_size=batch_size))
+
+
 @task(cache_policy=NO_CACHE)
 def close_snowflake_connection(conn):
     """
-    Fecha conexão Snowflake de forma segura
+    Libera conexão Snowflake de forma segura
+
+    Conexões criadas por connect_snowflake voltam ao pool do processo (após
+    rollback, até POOL_MAX_IDLE_PER_KEY por destino); as demais são fechadas. Para fechar
+    de fato todas as conexões, use close_all_snowflake_connections.
 
     Args:
         conn: Conexão Snowflake
@@ -409,11 +1378,17 @@ def close_snowflake_connection(conn):
     logger = get_run_logger()
 
     try:
-        if conn:
-            conn.close()
+        if not conn:
+            return
+
+        if _release_connection(conn):
+            logger.info("✅ Conexão Snowflake devolvida ao pool")
+            return
+
+        conn.close()
         logger.info("✅ Conexão Snowflake fechada com sucesso")
     except Exception as e:
-        logger.warning(f"⚠️ Aviso ao fechar conexão: {str(e)}")
+        logger.warning("⚠️ Aviso ao fechar conexão: %s", e)
 
 
 @contextmanager
@@ -473,7 +1448,7 @@ def snowflake_connection(
             try:
                 close_snowflake_connection(conn)
             except Exception as e:
-                logger.warning(f"Erro ao fechar conexão: {e}")
+                logger.warning("Erro ao fechar conexão: %s", e)
 
 
 # Schemas das tabelas com prefixo BRZ_SALESFORCE_
@@ -545,6 +1520,12 @@ DECONVE_TABLES_SCHEMAS = {
     }
 }
 
+# DDL e lista de colunas entre aspas pré-montadas para as tabelas conhecidas
+for _table_schema in (*SALESFORCE_TABLES_SCHEMAS.values(), *DECONVE_TABLES_SCHEMAS.values()):
+    _table_schema["columns_ddl"] = _columns_ddl(_table_schema["columns"])
+    _table_schema["quoted_columns"] = ", ".join(f'"{col}"' for col in _table_schema["columns"])
+del _table_schema
+
 
 @task(cache_policy=NO_CACHE, retries=2, retry_delay_seconds=30)
 def merge_csv_to_snowflake(
@@ -553,7 +1534,9 @@ def merge_csv_to_snowflake(
         csv_file_path: str,
         primary_keys: List[str],
         csv_encoding: str = 'utf-8',
-        columns: Optional[List[str]] = None
+        columns: Optional[List[str]] = None,
+        shard_size_mb: int = CSV_SHARD_SIZE_MB,
+        sort_staging: bool = True
 ) -> Dict[str, Any]:
     """
     Carrega CSV no Snowflake usando MERGE (UPSERT) para evitar duplicatas
@@ -562,7 +1545,8 @@ def merge_csv_to_snowflake(
 
     Estratégia:
     1. Cria tabela staging temporária
-    2. Carrega CSV na staging (PUT + COPY INTO)
+    2. Carrega CSV na staging (PUT + COPY INTO; arquivos maiores que
+       shard_size_mb são divididos em partes enviadas em paralelo)
     3. Faz MERGE da staging para a tabela final usando primary_keys
     4. Remove staging
 
@@ -573,65 +1557,53 @@ def merge_csv_to_snowflake(
         primary_keys: Lista de colunas que formam a chave primária (pode ser composta)
         csv_encoding: Encoding do CSV (utf-8, utf-16, etc.)
         columns: Lista de colunas (opcional, lê do CSV se não fornecido)
+        shard_size_mb: Tamanho de cada parte enviada ao stage em MB (default: 200)
+        sort_staging: Ordena a staging pelas primary_keys antes do MERGE (default: True)
 
     Returns:
         Dict com estatísticas (rows_inserted, rows_updated)
     """
     logger = get_run_logger()
-    import csv as csv_module
-    import time
 
+    work_dir = None
     try:
-        if not os.path.exists(csv_file_path):
-            raise FileNotFoundError(f"Arquivo não encontrado: {csv_file_path}")
-
-        file_size_mb = os.path.getsize(csv_file_path) / (1024 * 1024)
-        logger.info(f"🚀 Carregando CSV ({file_size_mb:.2f} MB) em {table_name} usando MERGE (UPSERT)...")
+        try:
+            file_size_mb = os.stat(csv_file_path).st_size / (1024 * 1024)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Arquivo não encontrado: {csv_file_path}") from None
+        logger.info("🚀 Carregando CSV (%.2f MB) em %s usando MERGE (UPSERT)...", file_size_mb, table_name)
 
         cursor = conn.cursor()
 
-        # 1. Lê colunas do CSV se não fornecidas
-        if not columns:
-            with open(csv_file_path, 'r', encoding=csv_encoding) as f:
-                reader = csv_module.reader(f)
-                columns = next(reader)
-            logger.info(f"📋 {len(columns)} colunas detectadas no CSV")
+        # 1. Lê colunas do CSV se não fornecidas e divide arquivos grandes em partes
+        work_dir = tempfile.mkdtemp(prefix=f"{table_name}_")
+        upload_paths, csv_encoding, columns = _prepare_upload_files(
+            logger, csv_file_path, csv_encoding, columns, work_dir, shard_size_mb
+        )
 
         # 2. Cria tabela staging temporária (clone da estrutura da tabela principal)
         staging_table = f"{table_name}_STAGING_{int(time.time())}"
-        logger.info(f"🏗️ Criando tabela staging: {staging_table}")
+        logger.info("🏗️ Criando tabela staging: %s", staging_table)
 
         create_staging_sql = f"CREATE TEMPORARY TABLE {staging_table} LIKE {table_name}"
         cursor.execute(create_staging_sql)
-        logger.info(f"✅ Tabela staging criada")
+        logger.info("✅ Tabela staging criada")
 
-        # 3. PUT arquivo no stage da tabela staging
+        # 3. PUT arquivo(s) no stage da tabela staging (partes em paralelo) e
+        # 4. COPY INTO staging, em lotes à medida que os PUTs terminam
         stage_name = f"@%{staging_table}"
-        file_name = os.path.basename(csv_file_path)
-
-        logger.info(f"⬆️ Enviando CSV para stage staging {stage_name}...")
-        put_path = csv_file_path.replace('\\', '/')
-        put_sql = f"PUT 'file://{put_path}' {stage_name} AUTO_COMPRESS=TRUE OVERWRITE=TRUE"
+        logger.info("⬆️ Enviando CSV para stage staging %s...", stage_name)
 
-        try:
-            cursor.execute(put_sql)
-            logger.info("✅ Arquivo enviado para stage")
-        except Exception as put_error:
-            logger.error(f"❌ Erro no PUT: {str(put_error)}")
-            if "certificate" in str(put_error).lower() or "254007" in str(put_error):
-                logger.error("🔒 Erro de certificado SSL detectado no MERGE")
-                logger.error("💡 Aplicando mesmas soluções do insert_csv_file_replace")
-            raise
-
-        # 4. COPY INTO staging
-        logger.info("⚡ Carregando dados na staging...")
-
-        quoted_columns = [f'"{col}"' for col in columns]
+        # Lista de colunas montada uma vez: usada no COPY INTO e no INSERT do MERGE
+        quoted_columns = ", ".join(f'"{col}"' for col in columns)
         encoding_param = "UTF16" if "utf-16" in csv_encoding.lower() else "UTF8"
 
+        # COPY com placeholder {files}: chaves nos nomes de coluna são escapadas
+        copy_columns = quoted_columns.replace("{", "{{").replace("}", "}}")
         copy_sql = f"""
-        COPY INTO {staging_table} ({', '.join(quoted_columns)})
-        FROM {stage_name}/{file_name}.gz
+        COPY INTO {staging_table} ({copy_columns})
+        FROM {stage_name}
+        FILES = ({{files}})
         FILE_FORMAT = (
             TYPE = 'CSV'
             FIELD_OPTIONALLY_ENCLOSED_BY = '"'
@@ -644,22 +1616,26 @@ def merge_csv_to_snowflake(
         ON_ERROR = 'CONTINUE'
         """
 
-        cursor.execute(copy_sql)
-        copy_result = cursor.fetchone()
-        rows_loaded = copy_result[1] if copy_result else 0
+        rows_loaded = _put_and_copy(conn, cursor, logger, upload_paths, stage_name, copy_sql)
+
+        logger.info("✅ %s linhas carregadas na staging", rows_loaded)
 
-        logger.info(f"✅ {rows_loaded} linhas carregadas na staging")
+        # Reescreve a staging ordenada pelas chaves: MERGE compara faixas de
+        # chave contíguas e toca menos micro-partições da tabela final
+        if sort_staging:
+            order_by = ", ".join(f'"{pk}"' for pk in primary_keys)
+            cursor.execute(f"INSERT OVERWRITE INTO {staging_table} SELECT * FROM {staging_table} ORDER BY {order_by}")
 
         # 5. Monta condição de MATCH usando as chaves primárias
-        match_conditions = " AND ".join([f'target."{pk}" = source."{pk}"' for pk in primary_keys])
+        match_conditions = " AND ".join(f'target."{pk}" = source."{pk}"' for pk in primary_keys)
 
         # 6. Monta UPDATE SET (todas as colunas exceto as chaves primárias)
-        update_columns = [col for col in columns if col not in primary_keys]
-        update_set = ", ".join([f'target."{col}" = source."{col}"' for col in update_columns])
+        update_set = ", ".join(
+            f'target."{col}" = source."{col}"' for col in columns if col not in primary_keys
+        )
 
         # 7. Monta INSERT (todas as colunas)
-        insert_columns = ", ".join([f'"{col}"' for col in columns])
-        insert_values = ", ".join([f'source."{col}"' for col in columns])
+        insert_values = ", ".join(f'source."{col}"' for col in columns)
 
         # 8. Executa MERGE
         logger.info("🔄 Executando MERGE (UPSERT)...")
@@ -671,7 +1647,7 @@ def merge_csv_to_snowflake(
         WHEN MATCHED THEN
             UPDATE SET {update_set}
         WHEN NOT MATCHED THEN
-            INSERT ({insert_columns})
+            INSERT ({quoted_columns})
             VALUES ({insert_values})
         """
 
@@ -681,13 +1657,14 @@ def merge_csv_to_snowflake(
         rows_inserted = merge_result[0] if merge_result else 0
         rows_updated = merge_result[1] if merge_result else 0
 
-        logger.info(f"✅ MERGE concluído:")
-        logger.info(f"   📝 Inseridos: {rows_inserted}")
-        logger.info(f"   🔄 Atualizados: {rows_updated}")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("✅ MERGE concluído:")
+            logger.info("   📝 Inseridos: %s", rows_inserted)
+            logger.info("   🔄 Atualizados: %s", rows_updated)
 
         # 9. Remove staging (o stage interno é automaticamente removido junto)
         cursor.execute(f"DROP TABLE {staging_table}")
-        logger.info(f"🗑️ Staging removida")
+        logger.info("🗑️ Staging removida")
 
         cursor.close()
 
@@ -698,5 +1675,9 @@ def merge_csv_to_snowflake(
         }
 
     except Exception as e:
-        logger.error(f"❌ Erro ao fazer MERGE: {str(e)}")
+        logger.error("❌ Erro ao fazer MERGE: %s", e)
         raise
+
+    finally:
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
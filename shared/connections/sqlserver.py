@@ -1,9 +1,116 @@
-from typing import Optional
+from typing import Optional, Dict, List, Tuple, Any
 from contextlib import contextmanager
+import os
+import time
+import hashlib
+import atexit
+import threading
+from functools import lru_cache
 import pyodbc
 from prefect.logging import get_run_logger
 from prefect.blocks.system import Secret
 
+# Pool de conexões ociosas por (driver, server, database, user, hash da senha,
+# timeout): ao sair do context manager a conexão volta ao pool (após rollback)
+# em vez de ser fechada, evitando novo handshake TLS + login no próximo uso.
+# Conexões ociosas há mais de POOL_PING_AFTER_SECONDS são testadas com SELECT 1.
+POOL_MAX_IDLE_PER_KEY = 4
+POOL_PING_AFTER_SECONDS = 60
+_IDLE_CONNECTIONS: Dict[Tuple[str, str, str, str, bytes, int], List[Tuple[Any, float]]] = {}
+_IDLE_CONNECTIONS_LOCK = threading.Lock()
+
+
+@lru_cache(maxsize=64)
+def _get_secret(name: str) -> Optional[str]:
+    """
+    Valor de um Secret do Prefect, buscado uma única vez por processo
+
+    Só "secret não existe" (ValueError do Block.load) vira None e fica em cache.
+    Outras falhas (ex: erro transitório na API do Prefect) sobem sem ser
+    cacheadas: a próxima conexão tenta buscar de novo.
+
+    Returns:
+        Valor do Secret, ou None se não existir
+    """
+    try:
+        return Secret.load(name).get()
+    except ValueError:
+        return None
+
+
+def _checkout_connection(pool_key: Tuple[str, str, str, str, bytes, int]):
+    """
+    Retira uma conexão ociosa e válida do pool
+
+    Returns:
+        Conexão pyodbc, ou None se não houver conexão reutilizável
+    """
+    while True:
+        with _IDLE_CONNECTIONS_LOCK:
+            idle = _IDLE_CONNECTIONS.get(pool_key)
+            if not idle:
+                return None
+            conn, last_use = idle.pop()
+
+        if conn.closed:
+            continue
+
+        if time.monotonic() - last_use > POOL_PING_AFTER_SECONDS:
+            try:
+                conn.cursor().execute("SELECT 1").fetchall()
+            except Exception:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+                continue
+
+        return conn
+
+
+def _release_connection(pool_key: Tuple[str, str, str, str, bytes, int], conn) -> bool:
+    """
+    Devolve a conexão ao pool (desfazendo transação pendente)
+
+    Returns:
+        True se a conexão foi para o pool; False se deve ser fechada
+    """
+    if conn.closed:
+        return False
+    try:
+        conn.rollback()
+    except Exception:
+        return False
+
+    with _IDLE_CONNECTIONS_LOCK:
+        idle = _IDLE_CONNECTIONS.setdefault(pool_key, [])
+        if len(idle) >= POOL_MAX_IDLE_PER_KEY:
+            return False
+        idle.append((conn, time.monotonic()))
+    return True
+
+
+def close_all_sqlserver_connections(*_hook_args) -> None:
+    """
+    Fecha todas as conexões ociosas do pool do processo
+
+    Aceita os argumentos dos hooks do Prefect, podendo ser usada diretamente em
+    @flow(on_completion=[...], on_failure=[...], on_crashed=[...]). Também é
+    registrada no atexit.
+    """
+    with _IDLE_CONNECTIONS_LOCK:
+        idle = [conn for conns in _IDLE_CONNECTIONS.values() for conn, _ in conns]
+        _IDLE_CONNECTIONS.clear()
+
+    for conn in idle:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+atexit.register(close_all_sqlserver_connections)
+
 
 @contextmanager
 def sqlserver_connection(
@@ -16,6 +123,8 @@ def sqlserver_connection(
 ):
     """
     Context manager para conexão SQL Server.
+    Reutiliza conexões do pool do processo: ao sair, transações não
+    confirmadas são desfeitas (rollback) e a conexão volta ao pool.
     Busca credenciais na seguinte ordem:
     1. Parâmetros fornecidos
     2. Variáveis de ambiente (.env):
@@ -51,7 +160,6 @@ def sqlserver_connection(
             cur.execute("SELECT * FROM tabela")
             rows = cur.fetchall()
     """
-    import os
     logger = get_run_logger()
     conn = None
 
@@ -71,31 +179,17 @@ def sqlserver_connection(
 
         # 2. Se ainda não encontrou, tenta Secrets do Prefect
         # Para hosts específicos por database (ex: sqlserver-host-luminus-gs)
+        # (cada Secret é buscado uma vez por processo)
         if not server and database:
-            try:
-                server = Secret.load(f"sqlserver-host-{database.lower().replace('_', '-')}").get()
-            except:
-                pass
+            server = _get_secret(f"sqlserver-host-{database.lower().replace('_', '-')}")
         if not server:
-            try:
-                server = Secret.load("sqlserver-host").get()
-            except:
-                pass
+            server = _get_secret("sqlserver-host")
         if not database:
-            try:
-                database = Secret.load("sqlserver-database").get()
-            except:
-                pass
+            database = _get_secret("sqlserver-database")
         if not user:
-            try:
-                user = Secret.load("sqlserver-user").get()
-            except:
-                pass
+            user = _get_secret("sqlserver-user")
         if not password:
-            try:
-                password = Secret.load("sqlserver-password").get()
-            except:
-                pass
+            password = _get_secret("sqlserver-password")
 
         # Valida se todas as credenciais foram encontradas
         if not all([server, database, user, password]):
@@ -105,6 +199,19 @@ def sqlserver_connection(
                 "ou nos Secrets do Prefect (sqlserver-host, sqlserver-database, sqlserver-user, sqlserver-password)"
             )
 
+        # Senha entra na chave só como hash (blake2b): trocar a senha ou o
+        # timeout não reaproveita conexões abertas com os valores antigos
+        pool_key = (
+            driver, server, database, user,
+            hashlib.blake2b(password.encode(), digest_size=16).digest(),
+            timeout
+        )
+        conn = _checkout_connection(pool_key)
+        if conn is not None:
+            logger.info(f"♻️ Reutilizando conexão SQL Server: {server}/{database}")
+            yield conn
+            return
+
         logger.info(f"🔌 Conectando SQL Server: {server}/{database}")
 
         # Monta connection string
@@ -131,7 +238,10 @@ def sqlserver_connection(
     finally:
         if conn:
             try:
-                conn.close()
-                logger.info("🔒 Conexão SQL Server fechada")
+                if _release_connection(pool_key, conn):
+                    logger.info("♻️ Conexão SQL Server devolvida ao pool")
+                else:
+                    conn.close()
+                    logger.info("🔒 Conexão SQL Server fechada")
             except Exception as e:
                 logger.warning(f"⚠️ Aviso ao fechar conexão: {str(e)}")
\ No newline at end of file
@@ -4,8 +4,8 @@ Decoradores reutilizáveis para flows Prefect.
 Automatiza tarefas repetitivas como envio de alertas de sucesso/erro.
 """
 
+import time
 from functools import wraps
-from datetime import datetime
 from typing import Callable, Any, Optional, Dict
 from prefect import get_run_logger
 
@@ -59,14 +59,14 @@ def flow_alerts(
         @wraps(func)
         def wrapper(*args, **kwargs):
             logger = get_run_logger()
-            start_time = datetime.now()
+            start_time = time.monotonic()
 
             try:
                 # Executa o flow
                 result = func(*args, **kwargs)
 
                 # Calcula duração
-                duration_seconds = (datetime.now() - start_time).total_seconds()
+                duration_seconds = time.monotonic() - start_time
 
                 # Extrai resumo do resultado se função fornecida
                 summary = {}
@@ -94,7 +94,7 @@ def flow_alerts(
 
             except Exception as e:
                 # Calcula duração até o erro
-                duration_seconds = (datetime.now() - start_time).total_seconds()
+                duration_seconds = time.monotonic() - start_time
 
                 # Envia alerta de erro
                 try:
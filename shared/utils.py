@@ -1,12 +1,32 @@
-from datetime import datetime, timedelta
-from typing import Optional
-from prefect.blocks.system import Secret
-from prefect import get_run_logger
+import time
+from datetime import datetime
+from typing import Optional, Dict, Iterable
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from zoneinfo import ZoneInfo
+from contextvars import ContextVar
+
+# prefect é importado dentro das funções de secrets: quem só usa
+# get_datetime_brasilia não paga o custo de importar o Prefect
+
+# Máximo de Secrets buscados em paralelo por load_secrets
+SECRETS_MAX_WORKERS = 8
+
+# Logger do run atual (flow/task) já resolvido, junto do contexto a que pertence
+_RUN_LOGGER: ContextVar = ContextVar("_prefect_run_logger", default=(None, None))
+
+# Fuso de Brasília, resolvido uma vez no import (regras da base IANA, incluindo
+# os antigos horários de verão)
+BRASILIA_TZ = ZoneInfo("America/Sao_Paulo")
+
+# Último (segundo epoch, texto) de get_datetime_brasilia: a saída tem resolução
+# de segundos, então chamadas no mesmo segundo reaproveitam o texto pronto
+_BRASILIA_NOW_CACHE = (-1, "")
 
 
 def get_datetime_brasilia() -> str:
     """
-    Retorna a data/hora atual ajustada para o fuso horário de Brasília (UTC-3).
+    Retorna a data/hora atual no fuso horário de Brasília (America/Sao_Paulo).
 
     Returns:
         str: Data/hora formatada como 'YYYY-MM-DD HH:MM:SS'
@@ -15,13 +35,59 @@ def get_datetime_brasilia() -> str:
         get_datetime_brasilia()
         '2025-11-18 14:30:00'
     """
-    return (datetime.now() - timedelta(hours=3)).strftime('%Y-%m-%d %H:%M:%S')
+    global _BRASILIA_NOW_CACHE
+
+    epoch_second = int(time.time())
+    cached_second, cached_text = _BRASILIA_NOW_CACHE
+    if epoch_second == cached_second:
+        return cached_text
+
+    # isoformat (em C, sem parse de formato/locale) já gera 'YYYY-MM-DD HH:MM:SS';
+    # o corte em 19 caracteres remove o offset (-03:00)
+    text = datetime.fromtimestamp(epoch_second, BRASILIA_TZ).isoformat(' ', 'seconds')[:19]
+    _BRASILIA_NOW_CACHE = (epoch_second, text)
+    return text
+
+
+def _run_logger():
+    """
+    get_run_logger() resolvido uma vez por contexto de flow/task
+
+    O logger fica guardado em um ContextVar junto do contexto do run; se o
+    contexto mudou (ex: task chamada de dentro do flow), resolve de novo.
+    """
+    from prefect import get_run_logger
+    from prefect.context import FlowRunContext, TaskRunContext
+
+    run_context = TaskRunContext.get() or FlowRunContext.get()
+    cached_context, logger = _RUN_LOGGER.get()
+    if logger is None or cached_context is not run_context:
+        logger = get_run_logger()
+        _RUN_LOGGER.set((run_context, logger))
+    return logger
+
+
+@lru_cache(maxsize=128)
+def _load_secret_cached(secret_name: str) -> Optional[str]:
+    """
+    Valor de um Secret do Prefect, buscado uma única vez por processo
+
+    Falhas não ficam em cache (lru_cache só guarda retornos): a próxima
+    chamada tenta carregar de novo.
+    """
+    from prefect.blocks.system import Secret
+
+    return Secret.load(secret_name).get()
 
 
 def load_secret(secret_name: str) -> Optional[str]:
     """
     Carrega um Secret do Prefect Blocks.
 
+    O valor fica em cache no processo: chamadas seguintes com o mesmo nome não
+    voltam ao servidor Prefect. Use clear_secret_cache() para descartá-lo
+    (ex: no fim do flow ou após rotacionar o secret).
+
     Args:
         secret_name: Nome do secret no Prefect Blocks
 
@@ -35,17 +101,69 @@ def load_secret(secret_name: str) -> Optional[str]:
         api_key = load_secret("hgbrasil-weather-api-key")
         db_password = load_secret("database-password")
     """
-    logger = get_run_logger()
+    logger = _run_logger()
     try:
-        logger.info(f"🔐 Carregando secret '{secret_name}' do Prefect Blocks...")
+        logger.info("🔐 Carregando secret '%s' do Prefect Blocks...", secret_name)
 
-        secret_block = Secret.load(secret_name)
-        secret_value = secret_block.get()
+        secret_value = _load_secret_cached(secret_name)
 
-        logger.info(f"✅ Secret '{secret_name}' carregado com sucesso")
+        logger.info("✅ Secret '%s' carregado com sucesso", secret_name)
         return secret_value
 
     except Exception as e:
-        logger.error(f"❌ Erro ao carregar secret '{secret_name}': {type(e).__name__}")
-        logger.error(f"Certifique-se de que o secret '{secret_name}' existe no Prefect")
+        logger.error("❌ Erro ao carregar secret '%s': %s", secret_name, type(e).__name__)
+        logger.error("Certifique-se de que o secret '%s' existe no Prefect", secret_name)
         raise ValueError(f"Failed to load secret '{secret_name}'") from e
+
+
+def load_secrets(secret_names: Iterable[str]) -> Dict[str, Optional[str]]:
+    """
+    Carrega vários Secrets do Prefect Blocks em paralelo.
+
+    As buscas rodam ao mesmo tempo (tempo total ≈ o do secret mais lento, não a
+    soma) e usam o mesmo cache de load_secret: secrets já carregados no
+    processo não voltam ao servidor.
+
+    Args:
+        secret_names: Nomes dos secrets no Prefect Blocks
+
+    Returns:
+        Dicionário {nome_do_secret: valor}
+
+    Raises:
+        ValueError: Se algum secret não existir ou houver erro ao carregar
+
+    Example:
+        secrets = load_secrets(["rpa-postgres-user", "rpa-postgres-password"])
+        password = secrets["rpa-postgres-password"]
+    """
+    logger = _run_logger()
+    names = list(dict.fromkeys(secret_names))
+    if not names:
+        return {}
+
+    logger.info("🔐 Carregando %d secrets do Prefect Blocks...", len(names))
+
+    with ThreadPoolExecutor(max_workers=min(len(names), SECRETS_MAX_WORKERS)) as executor:
+        futures = {name: executor.submit(_load_secret_cached, name) for name in names}
+
+    secrets = {}
+    for name, future in futures.items():
+        try:
+            secrets[name] = future.result()
+        except Exception as e:
+            logger.error("❌ Erro ao carregar secret '%s': %s", name, type(e).__name__)
+            logger.error("Certifique-se de que o secret '%s' existe no Prefect", name)
+            raise ValueError(f"Failed to load secret '{name}'") from e
+
+    logger.info("✅ %d secrets carregados com sucesso", len(secrets))
+    return secrets
+
+
+def clear_secret_cache() -> None:
+    """
+    Descarta os secrets em cache de load_secret/load_secrets.
+
+    Use no fim do flow ou após rotacionar um secret no Prefect.
+    """
+    _load_secret_cached.cache_clear()